@@ -0,0 +1,262 @@
+"""A local HTTP server serving synthetic media for benchmarks and tests.
+
+Every path encodes what to serve, so nothing is stored on disk:
+
+    /file/<size>/<name>.mp4                  plain file, Range support
+    /throttle/<rate>/<size>/<name>.mp4       same, paced to <rate> bytes/s per connection
+    /flaky/<size>/<name>.mp4                 same, but every ``flaky_every``-th body is cut off halfway
+    /fail/<status>/<times>/<size>/<name>.mp4 answers <status> to its first <times> requests, then serves
+    /cut/<times>/<size>/<name>.mp4           cuts off its first <times> bodies halfway, then serves
+    /hls/<count>/<size>/<name>.m3u8          HLS playlist of <count> fragments of <size> bytes
+    /dash/<count>/<size>/<name>.mpd          DASH manifest (SegmentList) likewise
+
+File bodies are slices of one repeated pseudo-random block, so any byte
+range can be produced (and checked) without keeping files around. yt-dlp's
+generic extractor recognises all of these from the URL and Content-Type.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+
+BLOCK = random.Random(20240601).randbytes(1 << 20)
+CHUNK = 64 * 1024
+SEGMENT_SECONDS = 2
+
+
+def content(offset: int, length: int) -> bytes:
+    """Bytes ``offset``..``offset + length`` of every synthetic file."""
+    out = bytearray()
+    while length > 0:
+        start = offset % len(BLOCK)
+        piece = BLOCK[start:start + length]
+        out += piece
+        offset += len(piece)
+        length -= len(piece)
+    return bytes(out)
+
+
+def hls_playlist(name: str, count: int) -> str:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(count):
+        lines += [f"#EXTINF:{SEGMENT_SECONDS}.0,", f"{name}/seg{i}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def dash_manifest(name: str, count: int) -> str:
+    segments = "".join(f'<SegmentURL media="{name}/seg{i}.m4s"/>' for i in range(count))
+    return (
+        '<?xml version="1.0"?>\n'
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+        f'mediaPresentationDuration="PT{count * SEGMENT_SECONDS}S" minBufferTime="PT2S" '
+        'profiles="urn:mpeg:dash:profile:isoff-main:2011"><Period>'
+        '<AdaptationSet mimeType="video/mp4" contentType="video">'
+        '<Representation id="v1" bandwidth="800000" width="640" height="360" codecs="avc1.4d401f,mp4a.40.2">'
+        f'<SegmentList duration="{SEGMENT_SECONDS}" timescale="1">'
+        f'<Initialization sourceURL="{name}/init.mp4"/>{segments}</SegmentList>'
+        '</Representation></AdaptationSet></Period></MPD>\n'
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, each
+    # keep-alive request would stall ~40 ms on the client's delayed ACK
+    disable_nagle_algorithm = True
+    server: "FakeMediaSite"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._dispatch(body=False)
+
+    def do_GET(self) -> None:
+        self._dispatch(body=True)
+
+    def _dispatch(self, body: bool) -> None:
+        path = self.path.split("?", 1)[0]
+        site = self.server
+        site.count("requests")
+        m = re.fullmatch(r"/file/(\d+)/[^/]+", path)
+        if m:
+            return self._file(int(m.group(1)), body)
+        m = re.fullmatch(r"/throttle/(\d+)/(\d+)/[^/]+", path)
+        if m:
+            return self._file(int(m.group(2)), body, rate=int(m.group(1)))
+        m = re.fullmatch(r"/flaky/(\d+)/[^/]+", path)
+        if m:
+            return self._file(int(m.group(1)), body, flaky=True)
+        m = re.fullmatch(r"/fail/(\d{3})/(\d+)/(\d+)/[^/]+", path)
+        if m:
+            if site.count(f"fail:{path}") <= int(m.group(2)):
+                return self._status(int(m.group(1)))
+            return self._file(int(m.group(3)), body)
+        m = re.fullmatch(r"/cut/(\d+)/(\d+)/[^/]+", path)
+        if m:
+            return self._file(int(m.group(2)), body, cut_first=int(m.group(1)))
+        m = re.fullmatch(r"/hls/(\d+)/(\d+)/([^/]+)\.m3u8", path)
+        if m:
+            return self._text(hls_playlist(m.group(3), int(m.group(1))), "application/vnd.apple.mpegurl", body)
+        m = re.fullmatch(r"/dash/(\d+)/(\d+)/([^/]+)\.mpd", path)
+        if m:
+            return self._text(dash_manifest(m.group(3), int(m.group(1))), "application/dash+xml", body)
+        m = re.fullmatch(r"/(hls|dash)/(\d+)/(\d+)/[^/]+/(seg\d+\.(?:ts|m4s)|init\.mp4)", path)
+        if m:
+            size = 1024 if m.group(4) == "init.mp4" else int(m.group(3))
+            return self._file(size, body, content_type="video/mp2t" if m.group(1) == "hls" else "video/mp4")
+        self.send_error(404)
+
+    def _text(self, text: str, content_type: str, body: bool) -> None:
+        data = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _status(self, status: int) -> None:
+        self.server.count("failures")
+        self.send_response(status)
+        if status in (429, 503) and self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _range(self, size: int) -> Optional[Tuple[int, int]]:
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not m:
+            return None
+        start = int(m.group(1))
+        end = min(int(m.group(2)) + 1 if m.group(2) else size, size)
+        return start, end
+
+    def _file(self, size: int, body: bool, rate: int = 0, flaky: bool = False,
+              content_type: str = "video/mp4", cut_first: int = 0) -> None:
+        rng = self._range(size)
+        start, end = rng or (0, size)
+        if start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if rng else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if rng:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        # Probes and tiny ranges are left alone; only real transfers break
+        cut = flaky and end - start > CHUNK and self.server.count("flaky_bodies") % self.server.flaky_every == 0
+        if cut_first and end - start > CHUNK:
+            cut = self.server.count(f"cut:{self.path}") <= cut_first
+        stop = start + (end - start) // 2 if cut else end
+        began = time.monotonic()
+        sent = 0
+        try:
+            for pos in range(start, stop, CHUNK):
+                n = min(CHUNK, stop - pos)
+                self.wfile.write(content(pos, n))
+                sent += n
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.count("bytes_served", sent)
+        if cut:
+            self.server.count("flaky_cuts")
+            self.close_connection = True
+
+
+class FakeMediaSite(ThreadingHTTPServer):
+    """Serves the synthetic site on 127.0.0.1 from a background thread.
+
+    Use as a context manager; ``url(path)`` builds absolute URLs and
+    ``stats`` counts requests, bytes served and injected failures
+    (``fail:<path>`` and ``cut:<path>`` count the requests and bodies each
+    ``/fail/`` and ``/cut/`` path has had).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, flaky_every: int = 3) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.flaky_every = max(1, flaky_every)
+        self.retry_after: Optional[int] = 1  # seconds, sent with 429 and 503 answers
+        self.stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def count(self, key: str, n: int = 1) -> int:
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+            return self.stats[key]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def __enter__(self) -> "FakeMediaSite":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-media-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def _serve(conn, flaky_every: int) -> None:
+    with FakeMediaSite(flaky_every) as site:
+        conn.send(site.base_url)
+        conn.recv()  # any message: stop
+        conn.send(dict(site.stats))
+
+
+class SiteProcess:
+    """``FakeMediaSite`` in a child process, so serving the bytes doesn't
+    compete with the code being measured for this process's GIL."""
+
+    def __init__(self, flaky_every: int = 3) -> None:
+        self.flaky_every = flaky_every
+        self.base_url = ""
+        self.stats: Dict[str, int] = {}
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def __enter__(self) -> "SiteProcess":
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(target=_serve, args=(child, self.flaky_every), daemon=True)
+        self._process.start()
+        self.base_url = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            self._conn.send(None)
+            self.stats = self._conn.recv()
+        except (EOFError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
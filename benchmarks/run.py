@@ -0,0 +1,309 @@
+"""Offline end-to-end download benchmarks.
+
+Drives ``DownloadEngine`` (the queue behind ``QueueManager``) and
+``YTDLPDownloader`` through yt-dlp's generic extractor against a local
+synthetic media site (see ``fake_site``), and records per scenario:
+
+    throughput_mib_s      payload MiB downloaded per wall-clock second
+    latency_s             add_task -> completion per task: p50, p95, max
+    progress_batches_s    progress_batch events per second (the GUI's signal rate)
+    progress_updates_s    task updates carried by those batches per second
+    db_rows_s, db_commits_s   history writer rows and commits per second
+    peak_rss_mib          peak resident set size of the process
+
+Each scenario runs in a fresh interpreter (so peak RSS is its own) with its
+own throwaway config, history database and download directory:
+
+    python benchmarks/run.py                         # everything, JSON to stdout
+    python benchmarks/run.py -o bench.json --concurrency 1,2,4,8
+    python benchmarks/run.py -s hls,flaky --scale 0.25
+    python benchmarks/run.py -o new.json --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT / "src", Path(__file__).resolve().parent):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_site import SiteProcess
+
+
+MIB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Scenario:
+    description: str
+    tasks: int
+    payload: int  # bytes per task
+    path: Callable[[int, int], str]  # (task index, bytes) -> site path
+    connections: int = 4
+
+
+def _fragments(total: int, size: int = 256 * 1024) -> tuple:
+    count = max(1, total // size)
+    return count, size
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "range": Scenario(
+        "8 x 8 MiB files, Range support, segmented backend",
+        8, 8 * MIB, lambda i, n: f"/file/{n}/range-{i}.mp4",
+    ),
+    "range_single": Scenario(
+        "8 x 8 MiB files, one connection each (yt-dlp's HTTP downloader)",
+        8, 8 * MIB, lambda i, n: f"/file/{n}/single-{i}.mp4", connections=1,
+    ),
+    "many_small": Scenario(
+        "64 x 64 KiB files: per-task overhead",
+        64, 64 * 1024, lambda i, n: f"/file/{n}/small-{i}.mp4",
+    ),
+    "hls": Scenario(
+        "6 HLS streams of 256 KiB fragments",
+        6, 6 * MIB, lambda i, n: "/hls/{}/{}/hls-{}.m3u8".format(*_fragments(n), i),
+    ),
+    "dash": Scenario(
+        "6 DASH streams of 256 KiB fragments",
+        6, 6 * MIB, lambda i, n: "/dash/{}/{}/dash-{}.mpd".format(*_fragments(n), i),
+    ),
+    "throttled": Scenario(
+        "4 x 4 MiB files, server paces each connection to 2 MiB/s",
+        4, 4 * MIB, lambda i, n: f"/throttle/{2 * MIB}/{n}/slow-{i}.mp4",
+    ),
+    "flaky": Scenario(
+        "8 x 4 MiB files, every third transfer is cut off halfway",
+        8, 4 * MIB, lambda i, n: f"/flaky/{n}/flaky-{i}.mp4",
+    ),
+}
+
+# Metrics where a higher number is better, for --compare
+HIGHER_IS_BETTER = {"throughput_mib_s"}
+COMPARED = ("throughput_mib_s", "latency_p50_s", "latency_p95_s", "progress_batches_s", "db_rows_s", "peak_rss_mib")
+
+
+def _peak_rss_mib() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (MIB if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drive(scenario: Scenario, concurrency: int, scale: float, workdir: Path, timeout: float) -> Dict[str, Any]:
+    from core.engine import DownloadEngine
+    from utils.database import get_writer
+
+    tasks = max(1, round(scenario.tasks * scale))
+    payload = max(64 * 1024, int(scenario.payload * scale))
+    engine = DownloadEngine(concurrency=concurrency, connections=scenario.connections, progress_hz=10.0)
+    loop = asyncio.get_running_loop()
+    added: Dict[str, float] = {}
+    latency: List[float] = []
+    errors: List[str] = []
+    batches = updates = 0
+    done = asyncio.Event()
+
+    def finished(task_id: str, error: Optional[str] = None) -> None:
+        latency.append(time.perf_counter() - added.pop(task_id))
+        if error is not None:
+            errors.append(error)
+        if len(latency) == tasks:
+            done.set()
+
+    def progress(batch: list) -> None:
+        nonlocal batches, updates
+        batches += 1
+        updates += len(batch)
+
+    engine.on("task_completed", lambda tid: loop.call_soon_threadsafe(finished, tid))
+    engine.on("task_error", lambda tid, msg: loop.call_soon_threadsafe(finished, tid, msg))
+    engine.on("progress_batch", progress)
+
+    opts = {
+        "out_dir": str(workdir / "out"),
+        # No ffmpeg fixups: the synthetic media is not really decodable
+        "ytdlp_opts": {"quiet": True, "no_warnings": True, "noprogress": True, "fixup": "never"},
+    }
+    writer = get_writer()
+    rows, commits = writer.rows_written, writer.commits
+
+    with SiteProcess() as site:
+        runner = asyncio.create_task(engine.run())
+        start = time.perf_counter()
+        for i in range(tasks):
+            url = site.url(scenario.path(i, payload))
+            task_id = engine.add_task(url, dict(opts))
+            added[task_id] = time.perf_counter()
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            errors.append(f"timed out with {len(added)} task(s) unfinished")
+        elapsed = time.perf_counter() - start
+        engine.stop()
+        await runner
+    served = site.stats
+
+    writer.flush()
+    downloaded = sum(f.stat().st_size for f in (workdir / "out").glob("*") if f.is_file())
+    return {
+        "description": scenario.description,
+        "concurrency": concurrency,
+        "connections": scenario.connections,
+        "tasks": tasks,
+        "payload_bytes": payload,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "downloaded_bytes": downloaded,
+        "throughput_mib_s": round(downloaded / MIB / elapsed, 2),
+        "latency_p50_s": round(statistics.median(latency), 3) if latency else None,
+        "latency_p95_s": round(_percentile(latency, 0.95), 3),
+        "latency_max_s": round(max(latency, default=0.0), 3),
+        "progress_batches_s": round(batches / elapsed, 1),
+        "progress_updates_s": round(updates / elapsed, 1),
+        "db_rows_s": round((writer.rows_written - rows) / elapsed, 1),
+        "db_commits_s": round((writer.commits - commits) / elapsed, 1),
+        "retries": sum(engine.metrics.snapshot()["retries"].values()),
+        "server": served,
+        "peak_rss_mib": _peak_rss_mib(),
+    }
+
+
+def run_scenario(name: str, concurrency: int, scale: float = 1.0, timeout: float = 300.0) -> Dict[str, Any]:
+    """Run one scenario in this process, isolated from the user's settings."""
+    with tempfile.TemporaryDirectory(prefix="vidfetch-bench-") as tmp:
+        workdir = Path(tmp)
+        saved = {k: os.environ.get(k) for k in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME")}
+        os.environ["XDG_CONFIG_HOME"] = str(workdir / "config")
+        os.environ["XDG_CACHE_HOME"] = str(workdir / "cache")
+        from utils.database import close_db
+        close_db()
+        try:
+            return asyncio.run(_drive(SCENARIOS[name], concurrency, scale, workdir, timeout))
+        finally:
+            close_db()
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def _run_isolated(name: str, concurrency: int, scale: float, timeout: float) -> Dict[str, Any]:
+    cmd = [sys.executable, __file__, "--child", name, "--concurrency", str(concurrency),
+           "--scale", str(scale), "--timeout", str(timeout)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"errors": [f"benchmark process failed: {proc.stderr.strip()[-2000:]}"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.1) -> List[str]:
+    """Lines describing each metric's change; regressions beyond ``threshold`` are marked."""
+    lines = []
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        for metric in COMPARED:
+            new, old = result.get(metric), base.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            lines.append(f"{key:<24} {metric:<20} {old:>10} -> {new:<10} {change:+.1%}{flag}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("-s", "--scenarios", default=",".join(SCENARIOS),
+                   help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    p.add_argument("-c", "--concurrency", default="2", help="parallel downloads; a comma-separated list sweeps")
+    p.add_argument("--scale", type=float, default=1.0, help="multiply task counts and sizes")
+    p.add_argument("--timeout", type=float, default=300.0, help="seconds per scenario run")
+    p.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    p.add_argument("--compare", metavar="BASELINE", help="print changes against an earlier JSON result")
+    p.add_argument("--in-process", action="store_true", help="don't spawn a process per scenario")
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.child:
+        result = run_scenario(args.child, int(args.concurrency), args.scale, args.timeout)
+        print(json.dumps(result))
+        return 0
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        p.error(f"unknown scenario(s): {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    results = {}
+    for name in names:
+        for level in levels:
+            key = f"{name}@{level}"
+            print(f"running {key}...", file=sys.stderr, flush=True)
+            if args.in_process:
+                results[key] = run_scenario(name, level, args.scale, args.timeout)
+            else:
+                results[key] = _run_isolated(name, level, args.scale, args.timeout)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": args.scale,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+    return 1 if any(r.get("errors") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Map URLs to a stable identity (extractor + media id)."""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .scheduler import host_of
+
+
+# Query parameters that only track where a link was shared from, on any
+# site (besides utm_*): ad-click and share ids no site uses for content.
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+})
+# Short names that are share trackers on these sites (and their
+# subdomains) but may select content elsewhere, e.g. ?ref=main or ?pp=2.
+SITE_TRACKING_PARAMS: Dict[str, frozenset] = {
+    "youtube.com": frozenset({"si", "feature", "pp"}),
+    "youtu.be": frozenset({"si", "feature"}),
+    "twitter.com": frozenset({"ref_src", "ref_url", "s", "t"}),
+    "x.com": frozenset({"ref_src", "ref_url", "s", "t"}),
+    "spotify.com": frozenset({"si"}),
+}
+
+_lock = threading.Lock()
+_init_lock = threading.Lock()
+_extractors: Optional[List[type]] = None
+_patterns: str = ""
+# Per-host memo: extractors that matched URLs on that host before, tried
+# first; and hosts where a full scan found nothing, so later URLs skip the
+# ~1800 regex checks. Batch imports are usually many URLs from few hosts.
+_host_hits: Dict[str, List[type]] = {}
+_generic_hosts: Set[str] = set()
+
+
+def _all_extractors() -> List[type]:
+    global _extractors, _patterns
+    if _extractors is not None:
+        return _extractors
+    with _init_lock:
+        if _extractors is not None:
+            return _extractors
+        # Importing yt-dlp is a good part of the cost; keep it off startup
+        from yt_dlp.extractor import gen_extractor_classes
+        extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+        blob = []
+        for ie in extractors:
+            pattern = getattr(ie, "_VALID_URL", None)
+            if isinstance(pattern, str):
+                blob.append(pattern)
+            elif isinstance(pattern, (list, tuple)):
+                blob.extend(p for p in pattern if isinstance(p, str))
+        _patterns = "\n".join(blob).lower()
+        _extractors = extractors
+    return _extractors
+
+
+def warm() -> None:
+    """Import yt-dlp and build the extractor table ahead of the first
+    lookup (slow, ~1 s)."""
+    _all_extractors()
+
+
+def _named_by_extractor(host: str) -> bool:
+    """Whether some extractor pattern mentions this site's name.
+
+    Only hosts that no extractor names are memoized as generic; on a named
+    site one path may fail to match while another path matches.
+    """
+    labels = [label for label in host.split(".") if label]
+    if len(labels) < 2 or host.replace(".", "").isdigit():
+        return False
+    _all_extractors()
+    return labels[-2] in _patterns
+
+
+def _match(ie: type, url: str) -> Optional[Tuple[str, str]]:
+    if not ie.suitable(url):
+        return None
+    try:
+        media_id = ie.get_temp_id(url)
+    except Exception:
+        media_id = None
+    return ie.ie_key(), str(media_id) if media_id else ""
+
+
+def _find_extractor(url: str) -> Optional[type]:
+    host = host_of(url)
+    with _lock:
+        candidates = list(_host_hits.get(host, ()))
+        generic = host in _generic_hosts
+    for ie in candidates:
+        if ie.suitable(url):
+            return ie
+    if generic:
+        return None
+
+    for ie in _all_extractors():
+        if ie.suitable(url):
+            with _lock:
+                hits = _host_hits.setdefault(host, [])
+                if ie not in hits:
+                    # Keep yt-dlp's precedence order among memoized matches
+                    hits.append(ie)
+                    hits.sort(key=_extractors.index)
+            return ie
+    if not candidates and not _named_by_extractor(host):
+        with _lock:
+            _generic_hosts.add(host)
+    return None
+
+
+def match_extractor(url: str) -> Optional[Tuple[str, str]]:
+    """Return (extractor key, media id) for a URL, or None for generic URLs.
+
+    The media id is "" when the extractor cannot tell it from the URL alone.
+    """
+    ie = _find_extractor(url)
+    return _match(ie, url) if ie is not None else None
+
+
+def may_be_playlist(url: str) -> bool:
+    """False only when the URL's extractor always yields a single video."""
+    ie = _find_extractor(url)
+    return ie is None or getattr(ie, "_RETURN_TYPE", None) != "video"
+
+
+def _site_tracking_params(host: str) -> frozenset:
+    labels = host.split(".")
+    for i in range(len(labels) - 1):
+        params = SITE_TRACKING_PARAMS.get(".".join(labels[i:]))
+        if params is not None:
+            return params
+    return frozenset()
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme/host, drop the fragment and tracking parameters."""
+    parts = urlsplit(url.strip())
+    query = parts.query
+    if query:
+        site_params = _site_tracking_params(host_of(url))
+        pairs = [
+            (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+            if k not in TRACKING_PARAMS and k not in site_params and not k.startswith("utm_")
+        ]
+        query = urlencode(pairs)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+
+def cache_key(url: str) -> Tuple[str, str]:
+    """(key, extractor) shared by every variant of the same media URL.
+
+    The key is "Extractor:id" when the id is in the URL (so youtu.be and
+    watch?v= links agree), otherwise the normalized URL.
+    """
+    m = match_extractor(url)
+    if m and m[1]:
+        return f"{m[0]}:{m[1]}", m[0]
+    return normalize_url(url), m[0] if m else "Generic"
+
+
+def canonical_id(url: str) -> str:
+    """Identity used for duplicate suppression; see ``cache_key``."""
+    return cache_key(url)[0]
+
+
+def entry_canonical_id(entry: Dict[str, Any], url: str) -> str:
+    """``canonical_id`` for a flat playlist entry, preferring its own ids."""
+    ie_key, media_id = entry.get("ie_key"), entry.get("id")
+    if ie_key and media_id:
+        return f"{ie_key}:{media_id}"
+    return canonical_id(url)
@@ -1,30 +1,123 @@
-"""Downloader core using yt-dlp with a simple async wrapper."""
+"""Downloader core using yt-dlp with a simple async wrapper.
+
+yt-dlp is imported on first use, not with this module: it takes a large
+share of the GUI's startup time and nothing needs it before a download.
+"""
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Callable, Dict, Optional
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .ratelimit import Throttle, throttled_callback
 
-import yt_dlp
+if TYPE_CHECKING:
+    from .metadata_cache import MetadataCache
+    from .process_backend import ProcessPool
+    from .segmented import SegmentedDownloader
+    from .ydl_pool import YDLPool
 
 
 ProgressCallback = Callable[[Dict[str, Any]], None]
 
+# yt-dlp options that write files next to the download (subtitles,
+# thumbnails...); only yt-dlp's own download path honours them
+SIDECAR_OPTS = (
+    "writesubtitles", "writeautomaticsub", "writethumbnail", "writeallthumbnails",
+    "writeinfojson", "writedescription", "writeannotations", "writelink",
+    "writeurllink", "writewebloclink", "writedesktoplink",
+)
+
+# Playlist entries taken from a paged list at a time
+PAGED_CHUNK = 50
+
+# Containers ffmpeg can decode from a pipe, front to back (MP4/MOV with the
+# index at the end can't be); DASH audio is fragmented MP4, which is fine
+STREAMABLE_EXTS = {"webm", "weba", "ogg", "opus", "mp3", "aac", "flac", "wav", "mka"}
+
+
+class DirectPlan(NamedTuple):
+    """A selected format that is one plain HTTP(S) file."""
+    url: str
+    filename: str
+    headers: Dict[str, str]
+    ext: str
+    container: str
+
+    @property
+    def streamable(self) -> bool:
+        return self.ext in STREAMABLE_EXTS or self.container.endswith("_dash")
+
+
+class DownloadCancelled(Exception):
+    """Raised from a progress callback to abort the running download.
+
+    Unlike other callback exceptions, which are swallowed, this one is let
+    through so yt-dlp stops the transfer (leaving the .part file behind).
+    """
+
+
+class DownloadPaused(DownloadCancelled):
+    """Stops the running download so it can be continued later.
+
+    Handled like a cancellation by every downloader, so the partial data
+    (.part or .segpart file, finished segments, yt-dlp's fragment index)
+    stays on disk; downloading the same URL again picks up where it stopped.
+    """
+
+
+def _paged(entries: Any, chunk: int = PAGED_CHUNK) -> Iterator[Any]:
+    """Walk a yt-dlp PagedList a slice at a time, fetching pages as needed."""
+    start = 0
+    while True:
+        batch = entries.getslice(start, start + chunk)
+        yield from batch
+        if len(batch) < chunk:
+            return
+        start += chunk
+
 
 class YTDLPDownloader:
     """Thin async wrapper around yt-dlp's Python API."""
 
-    def __init__(self, ydl_opts: Optional[Dict[str, Any]] = None) -> None:
+    def __init__(
+        self,
+        ydl_opts: Optional[Dict[str, Any]] = None,
+        cache: Optional["MetadataCache"] = None,
+        pool: Optional["YDLPool"] = None,
+        process_pool: Optional["ProcessPool"] = None,
+        segmented: Optional["SegmentedDownloader"] = None,
+        segment_downloads: bool = True,
+        on_info: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
         self.ydl_opts = ydl_opts or {}
+        self.cache = cache
+        self.pool = pool
+        # When set, downloads run in worker processes instead of threads
+        self.process_pool = process_pool
+        # The aiohttp side: audio streaming needs it, and when
+        # ``segment_downloads`` is set single-file HTTP formats are fetched
+        # through it over several connections instead of by yt-dlp
+        self.segmented = segmented
+        self.segment_downloads = segment_downloads
+        # Called (from a worker thread) with each single-media info dict
+        # extracted or taken from the cache, before its download starts
+        self.on_info = on_info
 
     def _make_opts(self, out_dir: Optional[str] = None, progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         opts = dict(self.ydl_opts)
         if out_dir:
             opts.setdefault("outtmpl", f"{out_dir}/%(title)s.%(ext)s")
+        # A task resumed after a restart picks up its .part file where it
+        # stopped (yt-dlp's default, made explicit here)
+        opts.setdefault("continuedl", True)
 
         if progress_callback is not None:
             def _hook(d: Dict[str, Any]) -> None:
                 try:
                     progress_callback(d)
+                except DownloadCancelled:
+                    raise
                 except Exception:
                     # Do not allow hook exceptions to break downloads
                     pass
@@ -33,19 +126,228 @@ class YTDLPDownloader:
 
         return opts
 
+    @staticmethod
+    def _cacheable(info: Optional[Dict[str, Any]]) -> bool:
+        # Playlists are expanded per entry and live streams change under us
+        return bool(info) and info.get("_type", "video") == "video" and not info.get("is_live")
+
+    def _cached_extract(self, ydl: Any, url: str) -> Dict[str, Any]:
+        """Extract via ``ydl``, going through the metadata cache if present.
+
+        Cached dicts are sanitized the same way ``--load-info-json`` files
+        are, so feeding one back to ``process_ie_result`` is a supported path.
+        """
+        info = self.cache.get(url) if self.cache is not None else None
+        if info is None:
+            info = ydl.extract_info(url, download=False)
+            if self.cache is not None and self._cacheable(info):
+                info = ydl.sanitize_info(info, remove_private_keys=True)
+                self.cache.put(url, info)
+        if self.on_info is not None and info:
+            self.on_info(info)
+        return info
+
     def _extract_info(self, url: str) -> Dict[str, Any]:
+        if self.pool is not None:
+            with self.pool.lease({"skip_download": True}) as ydl:
+                return self._cached_extract(ydl, url)
+        import yt_dlp
         with yt_dlp.YoutubeDL({"skip_download": True}) as ydl:
-            return ydl.extract_info(url, download=False)
+            return self._cached_extract(ydl, url)
 
     async def extract_info(self, url: str) -> Dict[str, Any]:
         return await asyncio.to_thread(self._extract_info, url)
 
+    def _resolve(self, url: str) -> Optional[Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]]:
+        """Flat-extract ``url`` and split collections from single media.
+
+        Returns ``(playlist_info, entries)`` for playlists/channels, where
+        ``entries`` is a lazy iterator that fetches further pages only as it
+        is consumed. Returns None for single media, whose info is put in the
+        metadata cache so the download that follows skips extraction.
+        """
+        import yt_dlp
+        ydl = yt_dlp.YoutubeDL({
+            "quiet": True,
+            "skip_download": True,
+            "extract_flat": "in_playlist",
+            "lazy_playlist": True,
+        })
+        try:
+            info = ydl.extract_info(url, download=False, process=False)
+            if info and info.get("_type") in ("playlist", "multi_video"):
+                entries = info.pop("entries", None) or []
+                return info, self._iter_entries(ydl, entries)
+            if self.cache is not None and self._cacheable(info):
+                info = ydl.process_ie_result(info, download=False)
+                self.cache.put(url, ydl.sanitize_info(info, remove_private_keys=True))
+        except BaseException:
+            ydl.close()
+            raise
+        ydl.close()
+        return None
+
+    @staticmethod
+    def _iter_entries(ydl: Any, entries: Any) -> Iterator[Dict[str, Any]]:
+        from yt_dlp.utils import PagedList
+        try:
+            if isinstance(entries, PagedList):
+                # getslice() with no end would fetch every page up front
+                entries = _paged(entries)
+            for entry in entries:
+                if entry:
+                    yield entry
+        finally:
+            ydl.close()
+
+    async def resolve(self, url: str) -> Optional[Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]]:
+        return await asyncio.to_thread(self._resolve, url)
+
+    @staticmethod
+    def entry_url(entry: Dict[str, Any]) -> Optional[str]:
+        """Downloadable URL for a flat playlist entry."""
+        for key in ("url", "webpage_url", "original_url"):
+            value = entry.get(key)
+            if isinstance(value, str) and value.startswith(("http://", "https://")):
+                return value
+        return None
+
+    @staticmethod
+    async def take(entries: Iterator[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+        """Pull up to ``n`` entries off the loop thread (may fetch a page)."""
+        def _take() -> List[Dict[str, Any]]:
+            batch = []
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) >= n:
+                    break
+            return batch
+        return await asyncio.to_thread(_take)
+
+    def _plan_direct(self, url: str, out_dir: Optional[str], ytdlp_opts: Optional[Dict[str, Any]]) -> Optional[DirectPlan]:
+        """A ``DirectPlan`` if the format selected for ``url`` is one plain
+        HTTP(S) file that needs no further processing and no sidecar files
+        (``SIDECAR_OPTS``), else None.
+
+        The extracted info goes into the metadata cache either way, so the
+        yt-dlp fallback does not extract again.
+        """
+        opts = self._make_opts(out_dir=out_dir)
+        if ytdlp_opts:
+            opts.update(ytdlp_opts)
+        if opts.get("postprocessors") or opts.get("external_downloader") or opts.get("download_ranges"):
+            return None
+        if any(opts.get(key) for key in SIDECAR_OPTS):
+            return None
+
+        def plan(ydl: Any) -> Optional[DirectPlan]:
+            info = self._cached_extract(ydl, url)
+            if not self._cacheable(info):
+                return None
+            info = ydl.process_ie_result(info, download=False)
+            if info.get("requested_formats") or info.get("protocol") not in ("http", "https") or not info.get("url"):
+                return None
+            return DirectPlan(
+                info["url"], ydl.prepare_filename(info), dict(info.get("http_headers") or {}),
+                info.get("ext") or "", info.get("container") or "",
+            )
+
+        if self.pool is not None:
+            with self.pool.lease(opts) as ydl:
+                return plan(ydl)
+        import yt_dlp
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            return plan(ydl)
+
     def _download(self, url: str, out_dir: Optional[str], progress_callback: Optional[ProgressCallback], ytdlp_opts: Optional[Dict[str, Any]]) -> None:
+        if self.pool is not None:
+            # The pool installs its own hook and forwards to progress_callback
+            opts = self._make_opts(out_dir=out_dir)
+            if ytdlp_opts:
+                opts.update(ytdlp_opts)
+            with self.pool.lease(opts, progress_callback) as ydl:
+                self._run(ydl, url)
+            return
+
         opts = self._make_opts(out_dir=out_dir, progress_callback=progress_callback)
         if ytdlp_opts:
             opts.update(ytdlp_opts)
+        import yt_dlp
         with yt_dlp.YoutubeDL(opts) as ydl:
+            self._run(ydl, url)
+
+    def _run(self, ydl: Any, url: str) -> None:
+        if self.cache is None:
             ydl.download([url])
+            return
+        info = self._cached_extract(ydl, url)
+        if not self._cacheable(info):
+            info = ydl.sanitize_info(info, remove_private_keys=True)
+        ydl.process_ie_result(info, download=True)
 
-    async def download(self, url: str, out_dir: Optional[str] = None, progress_callback: Optional[ProgressCallback] = None, ytdlp_opts: Optional[Dict[str, Any]] = None) -> None:
+    async def download(
+        self,
+        url: str,
+        out_dir: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        ytdlp_opts: Optional[Dict[str, Any]] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> None:
+        """Download ``url``; ``throttle`` paces it (see ``core.ratelimit``)."""
+        if self.process_pool is not None:
+            await asyncio.to_thread(self.process_pool.run, url, out_dir, progress_callback, ytdlp_opts, throttle)
+            return
+        # The segmented path needs the metadata cache so that falling back to
+        # yt-dlp does not extract a second time
+        if self.segmented is not None and self.segment_downloads and self.cache is not None:
+            plan = await asyncio.to_thread(self._plan_direct, url, out_dir, ytdlp_opts)
+            if plan is not None:
+                if os.path.exists(plan.filename):
+                    # Already downloaded: report it the way yt-dlp does, so
+                    # the caller still learns which file it is
+                    if progress_callback is not None:
+                        size = os.path.getsize(plan.filename)
+                        progress_callback({
+                            "status": "finished", "filename": plan.filename,
+                            "downloaded_bytes": size, "total_bytes": size,
+                        })
+                    return
+                await self.segmented.fetch(plan.url, plan.filename, progress_callback, plan.headers, throttle)
+                return
+        if throttle is not None:
+            progress_callback = throttled_callback(progress_callback, throttle)
         await asyncio.to_thread(self._download, url, out_dir, progress_callback, ytdlp_opts)
+
+    async def stream_audio(
+        self,
+        url: str,
+        out_dir: Optional[str],
+        codec: str = "mp3",
+        quality: str = "192",
+        progress_callback: Optional[ProgressCallback] = None,
+        ytdlp_opts: Optional[Dict[str, Any]] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> Optional[str]:
+        """Pipe the selected audio format straight into an ffmpeg encoder.
+
+        Only the encoded file is written; the source stream never touches
+        the disk. Returns the output path, or None when streaming doesn't
+        apply here (no ffmpeg, no HTTP session, sidecar files such as
+        subtitles asked for, or a format that isn't one pipe-decodable HTTP
+        file), in which case nothing was downloaded and the caller should use
+        ``download`` plus a conversion.
+        """
+        from . import format_converter
+
+        if self.segmented is None or self.cache is None or not format_converter.have_ffmpeg():
+            return None
+        plan = await asyncio.to_thread(self._plan_direct, url, out_dir, ytdlp_opts)
+        if plan is None or not plan.streamable:
+            return None
+        _, ext = format_converter.audio_codec(codec)
+        output = os.path.splitext(plan.filename)[0] + "." + ext
+        if os.path.exists(output):
+            return output
+        chunks = self.segmented.stream(plan.url, output, progress_callback, plan.headers, throttle)
+        await format_converter.stream_extract_audio(chunks, output, codec, quality)
+        return output
@@ -0,0 +1,1157 @@
+"""Qt-free download engine: the queue, its consumers and the conversion stage."""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .canonical import cache_key, canonical_id, entry_canonical_id, may_be_playlist, warm as warm_canonical
+from .downloader import DownloadCancelled, DownloadPaused, YTDLPDownloader
+from .metadata_cache import MetadataCache, cache_path
+from .metrics import Metrics, MetricsFileExporter, MetricsServer, TaskSpans
+from .postprocess import PostStep, run_steps, split_postprocessors
+from .process_backend import ProcessPool
+from .progress import ProgressAggregator, ProgressUpdate
+from .ratelimit import BandwidthLimiter
+from .retry import HostBreakers, RetryPolicy, classify
+from .scheduler import Priority, Scheduler, host_of
+from .thumbnails import best_thumbnail
+from .url_import import clean_url
+from .ydl_pool import YDLPool
+from utils.database import (
+    add_download_async,
+    find_completed,
+    find_completed_many,
+    journal_add,
+    journal_add_many,
+    journal_progress,
+    journal_remove,
+    journal_started,
+    load_journal,
+    set_download_info,
+    update_download_status,
+    update_download_status_async,
+)
+
+if TYPE_CHECKING:
+    from .segmented import SegmentedDownloader
+
+
+# Seconds between journal writes of per-task byte counts
+JOURNAL_INTERVAL = 2.0
+
+
+@dataclass(slots=True, eq=False)
+class DownloadTask:
+    """One queued URL. Compared by identity, so removing it from a queue
+    doesn't compare field by field."""
+    url: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"
+    progress: int = 0
+    db_id: Optional[int] = None
+    cancelled: bool = False
+    paused: bool = False  # paused on its own, see DownloadEngine.pause_task
+    priority: int = Priority.NORMAL
+    size_hint: Optional[int] = None  # expected bytes, used by shortest-job-first
+    host: str = ""
+    parent_id: Optional[str] = None  # playlist task this entry came from
+    canonical_id: str = ""  # media identity, see core.canonical
+    output_path: Optional[str] = None  # last file the downloader finished
+    extractor: str = ""  # yt-dlp extractor name, for metrics labels
+    title: str = ""  # from the extracted info, once known
+    attempts: int = 0  # retries so far, see DownloadEngine._retry_later
+    spans: TaskSpans = field(default_factory=TaskSpans, repr=False)
+
+    def __post_init__(self) -> None:
+        if not self.host:
+            self.host = host_of(self.url)
+
+
+@dataclass(slots=True)
+class PlaylistGroup:
+    """Aggregate state of a playlist/channel task and its entry tasks."""
+    title: str
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    expanding: bool = True
+    running: Dict[str, int] = field(default_factory=dict)  # child id -> percent
+
+    def percent(self) -> int:
+        if not self.total:
+            return 0
+        finished = self.done + self.failed + sum(self.running.values()) / 100
+        return min(100, int(100 * finished / self.total))
+
+    def summary(self) -> Dict[str, Any]:
+        return {"title": self.title, "total": self.total, "done": self.done, "failed": self.failed}
+
+
+# Events a DownloadEngine reports, with their callback arguments
+EVENTS = {
+    "task_added": "task_id, url",
+    "tasks_added": "list[(task_id, url)], for tasks added with add_tasks",
+    "task_updated": "task_id, status, percent, extra_data (for \"retrying\": attempt, delay, kind, error)",
+    "task_info": "task_id, {\"title\", \"thumbnail\"} once the task's media has been extracted",
+    "progress_batch": "list[ProgressUpdate], at most progress_hz per second",
+    "task_completed": "task_id",
+    "task_error": "task_id, error_message",
+    "task_skipped": "url, existing task_id (\"\" if from history), reason",
+}
+
+Listener = Callable[..., None]
+
+
+class DownloadEngine:
+    """Download queue on a plain asyncio loop, with no GUI dependency.
+
+    State changes are reported to callbacks registered with ``on``. They run
+    on the engine's loop thread, except ``task_added`` and ``task_skipped``
+    for tasks added from another thread, which run on the caller's thread;
+    a GUI should hand them over to its own thread (``QueueManager`` does,
+    through queued Qt signals).
+
+    ``start``/``stop`` run the loop in a background thread; a program that
+    already has an event loop can ``await run()`` instead.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        progress_hz: float = 10.0,
+        policy: str = "fifo",
+        per_host_limit: int = 0,
+        backend: str = "thread",
+        connections: int = 4,
+        rate_limit: float = 0,
+        per_task_rate_limit: float = 0,
+        per_host_rate_limit: float = 0,
+        post_workers: Optional[int] = None,
+        metrics_port: int = 0,
+        metrics_file: str = "",
+        keep_finished: int = 500,
+        max_retries: int = 4,
+        retry_delay: float = 2.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.progress_interval = 1.0 / progress_hz if progress_hz > 0 else 0.1
+        self.policy = policy
+        self.per_host_limit = per_host_limit
+        self.backend = backend  # "thread" or "process"
+        self.connections = connections  # per direct-HTTP download; 1 = leave it to yt-dlp
+        self._listeners: Dict[str, List[Listener]] = {name: [] for name in EVENTS}
+        self._progress = ProgressAggregator()
+        # Shared by every consumer, thread and worker process; bytes/second
+        self._limiter = BandwidthLimiter(rate_limit, per_task_rate_limit, per_host_rate_limit)
+        # Failed downloads are retried after a backoff, unless the error is
+        # permanent; hosts that keep failing are parked by their breaker
+        self.retry = RetryPolicy(max_retries, retry_delay)
+        self.breakers = HostBreakers()
+        self._queue: Optional[Scheduler] = None
+        self._metadata_cache: Optional[MetadataCache] = None
+        self._ydl_pool: Optional[YDLPool] = None
+        self._process_pool: Optional[ProcessPool] = None
+        self._segmented: Optional["SegmentedDownloader"] = None
+        # Post-processing stage: its own queue, and a thread per core to
+        # wait on ffmpeg, so download consumers never do
+        self.post_workers = post_workers or os.cpu_count() or 2
+        self._post_queue: Optional[asyncio.Queue] = None
+        self._post_executor: Optional[ThreadPoolExecutor] = None
+        # Playlist parents, only touched from the worker loop
+        self._groups: Dict[str, PlaylistGroup] = {}
+        self._expanders: Dict[str, asyncio.Task] = {}
+        # Queued and running tasks (and playlists still expanding)...
+        self._active_tasks: Dict[str, DownloadTask] = {}
+        # ...and the last ``keep_finished`` finished ones, oldest first; the
+        # rest are only in the history database
+        self._finished: "OrderedDict[str, DownloadTask]" = OrderedDict()
+        self.keep_finished = keep_finished
+        # Tasks taken out of the queue by a pause, in the order they stopped
+        self._held: Dict[str, DownloadTask] = {}
+        # canonical id -> task id of every queued or running task
+        self._inflight: Dict[str, str] = {}
+        self._inflight_lock = threading.Lock()
+        # Tasks added while the loop is not running; run() drains them
+        self._pending_tasks: list[DownloadTask] = []
+        self._pending_lock = threading.Lock()
+
+        # Consumer pool, only touched from the worker loop
+        self._consumers: Dict[int, asyncio.Task] = {}
+        self._busy: set[int] = set()
+        self._next_worker_id = 0
+        
+        # State
+        self._paused = asyncio.Event()
+        self._paused.set()  # Set means "Running" (not paused)
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = asyncio.Event()
+        self._stopping = False
+
+        # Aggregates of finished tasks' spans, plus live gauges
+        self.metrics = Metrics()
+        self._speeds: Dict[str, float] = {}  # task id -> last reported bytes/s
+        self._register_gauges()
+        self._metrics_server: Optional[MetricsServer] = None
+        self._metrics_file: Optional[MetricsFileExporter] = None
+        self.update_metrics_export(metrics_port, metrics_file)
+
+    def on(self, event: str, callback: Listener) -> None:
+        """Call ``callback`` with the event's arguments (see ``EVENTS``)."""
+        if event not in EVENTS:
+            raise ValueError(f"Unknown event: {event}")
+        self._listeners[event].append(callback)
+
+    def _emit(self, event: str, *args: Any) -> None:
+        for callback in self._listeners[event]:
+            try:
+                callback(*args)
+            except Exception:
+                # A broken listener must not take the queue down with it
+                logging.exception(f"Error in {event} listener")
+
+    def start(self) -> None:
+        """Run the engine in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._thread_main, name="vidfetch-engine", daemon=True)
+            self._thread.start()
+
+    def _thread_main(self) -> None:
+        try:
+            asyncio.run(self.run())
+        except Exception as e:
+            logging.error(f"Worker loop error: {e}")
+
+    def stop(self) -> None:
+        """Stop the engine; waits for its thread when started with ``start``.
+
+        Consumers are unwound by ``run`` rather than having the loop
+        stopped under them.
+        """
+        self._stopping = True
+        loop = self._loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._stop_event.set)
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+            self._thread = None
+        if self._metrics_file is not None:
+            self._metrics_file.write()
+
+    def pause(self) -> None:
+        """Pause the whole queue: nothing new starts, and running downloads
+        stop at their next progress report, giving up their slots and
+        bandwidth. ``resume`` continues them from where they stopped."""
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._paused.clear)
+
+    def resume(self) -> None:
+        """Resume the queue, re-queueing downloads the pause stopped (but
+        not tasks paused on their own)."""
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._resume_on_loop)
+
+    def _resume_on_loop(self) -> None:
+        self._paused.set()
+        for task in list(self._held.values()):
+            if not task.paused:
+                self._release_hold(task)
+
+    def pause_task(self, task_id: str) -> None:
+        """Pause one task. Thread-safe.
+
+        A queued task leaves the queue; a running download stops at its next
+        progress report and keeps its partial data. Converting and playlist
+        tasks are not affected.
+        """
+        task = self._active_tasks.get(task_id)
+        if task is None or task.paused or task.id in self._groups:
+            return
+        task.paused = True
+        loop = self._loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._pause_on_loop, task)
+
+    def _pause_on_loop(self, task: DownloadTask) -> None:
+        if self._queue is not None and self._queue.remove(task):
+            self._hold(task)
+
+    def resume_task(self, task_id: str) -> None:
+        """Continue a task paused with ``pause_task``. Thread-safe."""
+        task = self._active_tasks.get(task_id)
+        if task is None or not task.paused:
+            return
+        task.paused = False
+        loop = self._loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._resume_task_on_loop, task)
+        else:
+            # Restored paused, before the loop runs: queue it for run()
+            with self._pending_lock:
+                if self._held.pop(task.id, None) is not None:
+                    self._pending_tasks.append(task)
+            journal_started(task.id, task.db_id, "queued")
+            self._emit("task_updated", task.id, "queued", task.progress, {})
+
+    def _resume_task_on_loop(self, task: DownloadTask) -> None:
+        if task.id in self._held and self._paused.is_set():
+            self._release_hold(task)
+
+    def _hold(self, task: DownloadTask) -> None:
+        """Park a paused task until it is resumed."""
+        self._held[task.id] = task
+        # Only a task paused on its own is still paused after a restart
+        journal_started(task.id, task.db_id, "paused" if task.paused else "running")
+        self._emit("task_updated", task.id, "paused", task.progress, {})
+
+    def _release_hold(self, task: DownloadTask) -> None:
+        del self._held[task.id]
+        journal_started(task.id, task.db_id, "queued")
+        self._emit("task_updated", task.id, "queued", task.progress, {})
+        self._queue.put(task)
+
+    def add_task(self, url: str, options: Dict[str, Any] = None, priority: int = Priority.NORMAL) -> Optional[str]:
+        """Add a task to the queue. Thread-safe, but it queries the history
+        and, on first use, waits about a second for yt-dlp's extractor
+        table (see ``core.canonical``): a GUI should call it, or
+        ``add_tasks``, from a worker thread.
+
+        ``priority`` only matters under the "priority" policy; an optional
+        ``options["filesize"]`` feeds shortest-job-first.
+
+        Duplicates are reported through ``task_skipped`` instead of being
+        queued: a URL for media already in flight is merged into that task
+        (its id is returned), and media already downloaded is skipped
+        (None is returned) unless ``options["allow_duplicates"]`` is set.
+        """
+        if options is None:
+            options = {}
+
+        key, extractor = cache_key(url)
+        duplicate = self._check_duplicate(url, key, options)
+        if duplicate is not None:
+            return duplicate or None
+
+        task = DownloadTask(
+            url=url, options=options, priority=priority,
+            size_hint=options.get("filesize"), canonical_id=key, extractor=extractor,
+        )
+        if not self._claim(task):
+            # Lost a race with an identical add from another thread
+            return self._check_duplicate(url, key, options) or None
+        self._journal(task)
+        self._enqueue(task)
+        self._emit("task_added", task.id, task.url)
+        return task.id
+
+    def add_tasks(
+        self,
+        urls: Iterable[str],
+        options: Dict[str, Any] = None,
+        priority: int = Priority.NORMAL,
+        batch_size: int = 5000,
+    ) -> List[str]:
+        """Queue many URLs, all with the same ``options``. Thread-safe, but
+        slow enough for large inputs that a GUI should call it from a
+        worker thread.
+
+        ``urls`` is consumed lazily, ``batch_size`` at a time. Each batch is
+        validated and canonicalized, checked for duplicates with one history
+        query, journaled in one transaction and announced with a single
+        ``tasks_added`` event (not ``task_added`` per task). Entries that are
+        not URLs or are duplicates are reported through ``task_skipped``.
+        Returns the ids of the new tasks.
+        """
+        if options is None:
+            options = {}
+        options_json = json.dumps(options, default=str)
+        ids: List[str] = []
+        it = iter(urls)
+        while True:
+            batch = list(itertools.islice(it, batch_size))
+            if not batch:
+                return ids
+            ids.extend(self._add_batch(batch, options, options_json, priority))
+
+    def _add_batch(self, raw: List[str], options: Dict[str, Any], options_json: str, priority: int) -> List[str]:
+        keyed = []
+        seen = set()
+        for text in raw:
+            url = clean_url(text)
+            if url is None:
+                self._emit("task_skipped", text, "", "not a URL")
+                continue
+            key, extractor = cache_key(url)
+            with self._inflight_lock:
+                existing = self._inflight.get(key)
+            if existing is not None:
+                self._emit("task_skipped", url, existing, "already in queue")
+            elif key in seen:
+                self._emit("task_skipped", url, "", "repeated in the list")
+            else:
+                seen.add(key)
+                keyed.append((url, key, extractor))
+
+        completed = set() if options.get("allow_duplicates") else find_completed_many(list(seen))
+        tasks = []
+        for url, key, extractor in keyed:
+            if key in completed:
+                self._emit("task_skipped", url, "", "already downloaded")
+                continue
+            task = DownloadTask(
+                url=url, options=options, priority=priority,
+                size_hint=options.get("filesize"), canonical_id=key, extractor=extractor,
+            )
+            if self._claim(task):
+                tasks.append(task)
+            else:
+                # Lost a race with an identical add from another thread
+                self._check_duplicate(url, key, options)
+        if not tasks:
+            return []
+
+        journal_add_many([
+            (t.id, t.url, options_json, int(priority), t.size_hint, t.canonical_id, None)
+            for t in tasks
+        ])
+        self._enqueue_many(tasks)
+        self._emit("tasks_added", [(t.id, t.url) for t in tasks])
+        return [t.id for t in tasks]
+
+    def restore(self) -> int:
+        """Re-queue the tasks journaled by a previous run; returns how many.
+
+        Call once at startup, from any thread (it takes about a second on
+        first use, see ``add_task``); a task added meanwhile for the same
+        media wins over the journaled one. Tasks that were running go
+        first, so their .part files are continued soon. Playlist entries
+        are not restored on their own: their playlist is resolved again and
+        re-creates them, skipping entries already downloaded.
+        """
+        rows = load_journal()
+        journaled = {r["task_id"] for r in rows}
+        orphans = [r["task_id"] for r in rows if r["parent_id"] in journaled]
+        if orphans:
+            journal_remove(orphans)
+        rows = [r for r in rows if r["parent_id"] not in journaled]
+        rows.sort(key=lambda r: r["status"] in ("queued", "paused"))
+
+        restored = 0
+        for r in rows:
+            task = DownloadTask(
+                url=r["url"], options=r["options"], id=r["task_id"],
+                db_id=r["db_id"], priority=r["priority"], size_hint=r["size_hint"],
+                canonical_id=r["canonical_id"] or canonical_id(r["url"]),
+                extractor=cache_key(r["url"])[1],
+            )
+            if not self._claim(task):
+                journal_remove([task.id])
+                continue
+            if r["downloaded_bytes"] and r["total_bytes"]:
+                task.progress = min(100, int(100 * r["downloaded_bytes"] / r["total_bytes"]))
+            if r["status"] == "paused":
+                task.paused = True
+                self._active_tasks[task.id] = task
+                self._held[task.id] = task
+                self._emit("task_added", task.id, task.url)
+                self._emit("task_updated", task.id, "paused", task.progress, {"resumed": True})
+            else:
+                self._enqueue(task)
+                self._emit("task_added", task.id, task.url)
+                if task.progress:
+                    self._emit("task_updated", task.id, "queued", task.progress, {"resumed": True})
+            restored += 1
+        return restored
+
+    def _enqueue(self, task: DownloadTask) -> None:
+        self._active_tasks[task.id] = task
+        with self._pending_lock:
+            if self._loop and self._loop.is_running() and self._queue:
+                self._loop.call_soon_threadsafe(self._queue.put, task)
+            else:
+                self._pending_tasks.append(task)
+
+    def _enqueue_many(self, tasks: List[DownloadTask]) -> None:
+        for task in tasks:
+            self._active_tasks[task.id] = task
+        with self._pending_lock:
+            if self._loop and self._loop.is_running() and self._queue:
+                self._loop.call_soon_threadsafe(self._queue.put_many, tasks)
+            else:
+                self._pending_tasks.extend(tasks)
+
+    @staticmethod
+    def _journal(task: DownloadTask) -> None:
+        journal_add(
+            task.id, task.url, task.options, task.priority,
+            task.size_hint, task.canonical_id, task.parent_id,
+        )
+
+    def _check_duplicate(
+        self, url: str, key: str, options: Dict[str, Any], completed: Optional[Set[str]] = None,
+    ) -> Optional[str]:
+        """Report a duplicate and return the task id it merged into ("" if
+        skipped because of history), or None if ``url`` should be queued.
+
+        ``completed``, if given, is the ``find_completed_many`` answer for a
+        batch that ``key`` belongs to; otherwise the history is queried.
+        """
+        with self._inflight_lock:
+            existing = self._inflight.get(key)
+        if existing is not None:
+            self._emit("task_skipped", url, existing, "already in queue")
+            return existing
+        if options.get("allow_duplicates"):
+            return None
+        downloaded = key in completed if completed is not None else find_completed(key) is not None
+        if downloaded:
+            self._emit("task_skipped", url, "", "already downloaded")
+            return ""
+        return None
+
+    @staticmethod
+    def _identify_entries(
+        batch: List[Dict[str, Any]], options: Dict[str, Any],
+    ) -> Tuple[List[Tuple[Dict[str, Any], str, str]], Set[str]]:
+        """(entry, url, canonical id) for the playlist entries that have a
+        URL, and which of those ids were already downloaded."""
+        keyed = []
+        for entry in batch:
+            url = YTDLPDownloader.entry_url(entry)
+            if url:
+                keyed.append((entry, url, entry_canonical_id(entry, url)))
+        if options.get("allow_duplicates"):
+            return keyed, set()
+        return keyed, find_completed_many([key for _, _, key in keyed])
+
+    def _claim(self, task: DownloadTask) -> bool:
+        with self._inflight_lock:
+            if task.canonical_id in self._inflight:
+                return False
+            self._inflight[task.canonical_id] = task.id
+            return True
+
+    def _release(self, task: DownloadTask) -> None:
+        with self._inflight_lock:
+            if self._inflight.get(task.canonical_id) == task.id:
+                del self._inflight[task.canonical_id]
+
+    def get_task(self, task_id: str) -> Optional[DownloadTask]:
+        """A queued, running or recently finished task, if still in memory."""
+        task = self._active_tasks.get(task_id)
+        return task if task is not None else self._finished.get(task_id)
+
+    def cancel_task(self, task_id: str) -> None:
+        """Cancel a task (and, for playlists, all its entries). Thread-safe.
+
+        Queued tasks are taken out of the queue at once; running ones stop
+        at their next progress report.
+        """
+        task = self._active_tasks.get(task_id)
+        if task is None:
+            return
+        task.cancelled = True
+        with self._pending_lock:
+            loop = self._loop if self._loop and self._loop.is_running() else None
+            if loop is not None:
+                loop.call_soon_threadsafe(self._cancel_on_loop, task)
+                return
+            pending = len(self._pending_tasks)
+            self._pending_tasks = [t for t in self._pending_tasks if t is not task]
+            dropped = len(self._pending_tasks) < pending or self._held.pop(task.id, None) is not None
+        if dropped:
+            # No loop yet: finish it from the caller's thread
+            if task.db_id:
+                update_download_status(task.db_id, "cancelled")
+            self._emit("task_error", task.id, "Cancelled by user")
+            self._task_finished(task, ok=False)
+
+    def _cancel_on_loop(self, task: DownloadTask) -> None:
+        task.cancelled = True
+        held = self._held.pop(task.id, None) is not None
+        if held or (self._queue is not None and self._queue.remove(task)):
+            asyncio.ensure_future(self._drop_cancelled(task))
+        if task.id in self._groups:
+            for child in list(self._active_tasks.values()):
+                if child.parent_id == task.id and not child.cancelled:
+                    self._cancel_on_loop(child)
+
+    async def _drop_cancelled(self, task: DownloadTask) -> None:
+        """Finish a task cancelled before it started."""
+        if task.db_id:
+            await self._db(task, update_download_status_async(task.db_id, "cancelled"))
+        self._emit("task_error", task.id, "Cancelled by user")
+        self._task_finished(task, ok=False)
+
+    async def run(self) -> None:
+        """Process the queue until ``stop`` is called."""
+        self._stop_event = asyncio.Event()
+        queue = Scheduler(self.policy, self.per_host_limit, self.breakers)
+        with self._pending_lock:
+            queue.put_many(self._pending_tasks)
+            self._pending_tasks.clear()
+            self._queue = queue
+            self._loop = asyncio.get_running_loop()
+        if self._stopping:
+            # stop() ran before the loop was up
+            self._stop_event.set()
+        if self._metadata_cache is None:
+            try:
+                self._metadata_cache = MetadataCache()
+            except Exception as e:
+                logging.error(f"Metadata cache unavailable: {e}")
+        self._ydl_pool = YDLPool()
+        # aiohttp is slow to import; this runs on the engine's thread, not
+        # the GUI's
+        from .segmented import SegmentedDownloader
+        self._segmented = SegmentedDownloader(self.connections)
+        self._post_queue = asyncio.Queue()
+        self._post_executor = ThreadPoolExecutor(self.post_workers, thread_name_prefix="vidfetch-post")
+        
+        self._paused.set()
+        
+        # Build the URL -> extractor table off the caller's thread before the
+        # first add_task needs it
+        asyncio.get_running_loop().run_in_executor(None, warm_canonical)
+
+        # Start consumers
+        self._resize_pool()
+        flusher = asyncio.create_task(self._flush_progress())
+        post_workers = [asyncio.create_task(self._post_worker()) for _ in range(self.post_workers)]
+        
+        # Keep the loop alive until stop is called
+        await self._stop_event.wait()
+
+        consumers = list(self._consumers.values()) + list(self._expanders.values()) + post_workers + [flusher]
+        self._consumers.clear()
+        self._expanders.clear()
+        for c in consumers:
+            c.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        self._ydl_pool.close()
+        await self._segmented.close()
+        self._post_executor.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            await asyncio.to_thread(self._process_pool.close)
+            self._process_pool = None
+        with self._pending_lock:
+            self._loop = None
+            self._queue = None
+        self._stopping = False
+
+    def _resize_pool(self) -> None:
+        """Match the number of consumers to self.concurrency.
+
+        Growing starts consumers immediately. Shrinking cancels idle
+        consumers (they are only waiting on the queue, so nothing is lost);
+        busy ones retire on their own once their current task is done.
+        """
+        if self._process_pool is not None:
+            self._process_pool.max_workers = self.concurrency
+
+        while len(self._consumers) < self.concurrency:
+            worker_id = self._next_worker_id
+            self._next_worker_id += 1
+            self._consumers[worker_id] = asyncio.create_task(self._consumer(worker_id))
+
+        excess = len(self._consumers) - self.concurrency
+        for worker_id, consumer in list(self._consumers.items()):
+            if excess <= 0:
+                break
+            if worker_id not in self._busy:
+                del self._consumers[worker_id]
+                consumer.cancel()
+                excess -= 1
+
+    def _should_retire(self, worker_id: int) -> bool:
+        if len(self._consumers) > self.concurrency:
+            self._consumers.pop(worker_id, None)
+            return True
+        return False
+
+    async def _flush_progress(self):
+        """Emit coalesced progress at most once per progress_interval.
+
+        Byte counts are also journaled, less often, so a restart knows how
+        far each task got.
+        """
+        unjournaled: Dict[str, ProgressUpdate] = {}
+        loop = asyncio.get_running_loop()
+        next_journal = loop.time() + JOURNAL_INTERVAL
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            updates = self._progress.drain()
+            if updates:
+                self._emit("progress_batch", updates + self._group_progress(updates))
+                for u in updates:
+                    unjournaled[u.task_id] = u
+                    task = self._active_tasks.get(u.task_id)
+                    if task is not None:
+                        task.progress = u.percent
+                        self._speeds[u.task_id] = u.speed or 0.0
+            if unjournaled and loop.time() >= next_journal:
+                journal_progress([
+                    (u.downloaded_bytes, u.total_bytes, u.filename, u.task_id)
+                    for u in unjournaled.values()
+                    if u.task_id in self._active_tasks
+                ])
+                unjournaled.clear()
+                next_journal = loop.time() + JOURNAL_INTERVAL
+
+    def _group_progress(self, updates: list) -> list:
+        """Roll entry progress up into one record per affected playlist."""
+        touched = {}
+        for u in updates:
+            task = self._active_tasks.get(u.task_id)
+            group = self._groups.get(task.parent_id) if task and task.parent_id else None
+            if group is not None:
+                group.running[u.task_id] = u.percent
+                touched[task.parent_id] = group
+        return [
+            ProgressUpdate(parent_id, "downloading", group.percent())
+            for parent_id, group in touched.items()
+        ]
+        
+    async def _consumer(self, worker_id: int):
+        loop = asyncio.get_running_loop()
+        while not self._should_retire(worker_id):
+            # Wait if paused
+            await self._paused.wait()
+            
+            task: DownloadTask = await self._queue.get()
+            self._busy.add(worker_id)
+            task.spans.mark("started")
+            
+            # Cancelled or paused between being taken off the queue and getting here
+            if task.cancelled or task.paused:
+                if task.cancelled:
+                    await self._drop_cancelled(task)
+                else:
+                    self._hold(task)
+                self.breakers.finished(task.host, task.id)
+                self._queue.task_done(task)
+                self._busy.discard(worker_id)
+                continue
+
+            try:
+                downloader = YTDLPDownloader(
+                    cache=self._metadata_cache,
+                    pool=self._ydl_pool,
+                    process_pool=self._get_process_pool(),
+                    segmented=self._segmented,
+                    segment_downloads=self.connections > 1,
+                    # Extraction runs on a worker thread; listeners expect the loop's
+                    on_info=lambda info, task=task: loop.call_soon_threadsafe(self._on_info, task, info),
+                )
+
+                # Playlists and channels are expanded into one task per entry
+                # instead of occupying this consumer for the whole list.
+                if task.options.get("expand_playlists", True) and await asyncio.to_thread(may_be_playlist, task.url):
+                    playlist = await downloader.resolve(task.url)
+                    self.breakers.record_success(task.host)
+                    if playlist is not None:
+                        await self._start_group(task, *playlist)
+                        continue
+
+                # Log to DB (group-committed by the writer thread)
+                if task.db_id:
+                    await self._db(task, update_download_status_async(task.db_id, "downloading"))
+                else:
+                    task.db_id = await self._db(task, add_download_async(task.url, task.url, "downloading", task.canonical_id))
+                journal_started(task.id, task.db_id)
+                
+                self._emit("task_updated", task.id, "downloading", 0, {})
+                
+                spans = task.spans
+                files_done = 0  # bytes of the files (e.g. video, then audio) already finished
+
+                def progress_cb(status: dict):
+                    nonlocal files_done
+                    if task.cancelled:
+                        raise DownloadCancelled("Cancelled by user")
+                    # Pausing is checked here, on the transfer path, so it
+                    # takes effect within one chunk
+                    if task.paused or not self._paused.is_set():
+                        raise DownloadPaused("Paused")
+                    spans.mark_once("transfer")
+                    got = status.get("downloaded_bytes") or 0
+                    spans.bytes = files_done + got
+                    if status.get("status") == "finished":
+                        files_done += got or status.get("total_bytes") or 0
+                        spans.bytes = files_done
+                        if status.get("filename"):
+                            task.output_path = status["filename"]
+                    self._on_progress(task.id, status)
+
+                # Execute download
+                out_dir = task.options.get("out_dir", ".")
+                # Merge user options with defaults; ffmpeg steps we run
+                # ourselves are taken out of yt-dlp's hands
+                ytdlp_opts, post_steps = split_postprocessors(task.options.get("ytdlp_opts", {}))
+                throttle = self._limiter.throttle_for(task.id, task.host)
+
+                # Audio-only: pipe the download into ffmpeg when the format
+                # allows, so the source file never hits the disk
+                streamed = None
+                if self._streams_audio(task, post_steps):
+                    step = post_steps[0].options
+                    streamed = await downloader.stream_audio(
+                        task.url, out_dir,
+                        codec=step.get("preferredcodec") or "mp3",
+                        quality=str(step.get("preferredquality") or "5"),
+                        progress_callback=progress_cb,
+                        ytdlp_opts=ytdlp_opts,
+                        throttle=throttle,
+                    )
+                if streamed:
+                    task.output_path, post_steps = streamed, []
+                else:
+                    await downloader.download(
+                        task.url, 
+                        out_dir=out_dir,
+                        progress_callback=progress_cb,
+                        ytdlp_opts=ytdlp_opts,
+                        throttle=throttle,
+                    )
+                
+                self.breakers.record_success(task.host)
+                self._progress.discard(task.id)
+                spans.mark("downloaded")
+                if post_steps:
+                    if not task.output_path:
+                        # Completing it would silently skip the conversion
+                        raise RuntimeError("The downloader did not report the downloaded file; cannot convert it")
+                    await self._hand_off(task, post_steps)
+                else:
+                    await self._complete(task)
+                
+            except DownloadPaused:
+                self._suspend(task)
+            except Exception as e:
+                await self._fail(task, e, retry=True)
+            finally:
+                self.breakers.finished(task.host, task.id)
+                self._queue.task_done(task)
+                self._busy.discard(worker_id)
+
+    def _on_info(self, task: DownloadTask, info: Dict[str, Any]) -> None:
+        """Extracted info for a running task: record and report its title
+        and thumbnail, once."""
+        if task.title:
+            return
+        task.title = info.get("title") or task.url
+        thumbnail = best_thumbnail(info) or ""
+        if task.db_id:
+            set_download_info(task.db_id, task.title, thumbnail or None)
+        self._emit("task_info", task.id, {"title": task.title, "thumbnail": thumbnail})
+
+    def _streams_audio(self, task: DownloadTask, steps: List[PostStep]) -> bool:
+        return (
+            self.backend == "thread"
+            and task.options.get("stream_audio", True)
+            and len(steps) == 1
+            and steps[0].key == "FFmpegExtractAudio"
+            and not steps[0].options.get("keepvideo")
+        )
+
+    async def _db(self, task: DownloadTask, write: Awaitable[Any]) -> Any:
+        """Await a history write, charging the wait to the task's spans."""
+        start = time.monotonic()
+        try:
+            return await write
+        finally:
+            task.spans.db_seconds += time.monotonic() - start
+
+    def _suspend(self, task: DownloadTask) -> None:
+        """Park a download stopped by a pause; its partial data stays on disk."""
+        self._progress.discard(task.id)
+        self._speeds.pop(task.id, None)
+        self._limiter.release(task.id)
+        if task.cancelled:
+            # Cancelled while pausing
+            asyncio.ensure_future(self._drop_cancelled(task))
+        elif task.paused or not self._paused.is_set():
+            self._hold(task)
+        else:
+            # Resumed before the download noticed the pause
+            self._queue.put(task)
+
+    async def _complete(self, task: DownloadTask) -> None:
+        await self._db(task, update_download_status_async(task.db_id, "completed", task.output_path))
+        self._emit("task_completed", task.id)
+        self._task_finished(task, ok=True)
+
+    async def _fail(self, task: DownloadTask, e: Exception, retry: bool = False) -> None:
+        """Finish a failed task, or with ``retry``, queue it again after a
+        backoff if the error is one that may go away."""
+        cancelled = task.cancelled or isinstance(e, DownloadCancelled)
+        if retry and not cancelled and self._retry_later(task, e):
+            return
+        status_str = "cancelled" if cancelled or "Cancelled" in str(e) else "error"
+        self._progress.discard(task.id)
+        if task.db_id:
+            await self._db(task, update_download_status_async(task.db_id, status_str))
+        self._emit("task_error", task.id, str(e))
+        self._task_finished(task, ok=False)
+
+    def _retry_later(self, task: DownloadTask, e: Exception) -> bool:
+        failure = classify(e)
+        self.breakers.record_failure(task.host, failure)
+        delay = self.retry.delay(task.attempts + 1, failure)
+        if delay is None:
+            return False
+        task.attempts += 1
+        self.metrics.inc("vidfetch_retries_total", kind=failure.kind.value)
+        self._progress.discard(task.id)
+        self._speeds.pop(task.id, None)
+        self._limiter.release(task.id)
+        logging.info(f"Retrying {task.url} in {delay:.1f}s (attempt {task.attempts}, {failure.kind.value}): {e}")
+        journal_started(task.id, task.db_id, "queued")
+        self._emit("task_updated", task.id, "retrying", task.progress, {
+            "attempt": task.attempts, "delay": delay, "kind": failure.kind.value, "error": str(e),
+        })
+        self._queue.put_later(task, delay)
+        return True
+
+    async def _hand_off(self, task: DownloadTask, steps: List[PostStep]) -> None:
+        """Queue a downloaded file for conversion and free the download slot."""
+        await self._db(task, update_download_status_async(task.db_id, "converting"))
+        journal_started(task.id, task.db_id, "converting")
+        self._emit("task_updated", task.id, "converting", 100, {"file": task.output_path})
+        self._post_queue.put_nowait((task, steps))
+
+    async def _post_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            task, steps = await self._post_queue.get()
+            task.spans.mark("converting")
+            error: Optional[Exception] = None
+            try:
+                if task.cancelled:
+                    raise DownloadCancelled("Cancelled by user")
+                task.output_path = await loop.run_in_executor(
+                    self._post_executor, run_steps, task.output_path, steps
+                )
+            except Exception as e:
+                error = e
+            try:
+                if error is not None:
+                    await self._fail(task, error)
+                else:
+                    await self._complete(task)
+            except Exception:
+                # e.g. a history write failed; this worker must stay for the next task
+                logging.exception(f"Could not finish converted task {task.url}")
+            finally:
+                self._post_queue.task_done()
+
+    async def _start_group(self, parent: DownloadTask, info: Dict[str, Any], entries: Iterator[Dict[str, Any]]) -> None:
+        group = PlaylistGroup(title=info.get("title") or parent.url)
+        self._groups[parent.id] = group
+        if parent.db_id:
+            await update_download_status_async(parent.db_id, "downloading")
+        else:
+            parent.db_id = await add_download_async(parent.url, group.title, "downloading")
+        journal_started(parent.id, parent.db_id, "expanding")
+        self._emit("task_updated", parent.id, "expanding", 0, group.summary())
+        self._expanders[parent.id] = asyncio.create_task(self._expand(parent, group, entries))
+
+    async def _expand(self, parent: DownloadTask, group: PlaylistGroup, entries: Iterator[Dict[str, Any]]) -> None:
+        """Stream playlist entries into the queue while later pages load."""
+        try:
+            while not parent.cancelled:
+                batch = await YTDLPDownloader.take(entries, 50)
+                if not batch:
+                    break
+                # Identities and one history query for the whole batch,
+                # off the loop
+                keyed, completed = await asyncio.to_thread(self._identify_entries, batch, parent.options)
+                for entry, url, key in keyed:
+                    if self._check_duplicate(url, key, parent.options, completed) is not None:
+                        continue
+                    child = DownloadTask(
+                        url=url,
+                        options=parent.options,  # shared, never mutated
+                        priority=parent.priority,
+                        size_hint=entry.get("filesize") or entry.get("filesize_approx"),
+                        parent_id=parent.id,
+                        canonical_id=key,
+                        extractor=entry.get("ie_key") or parent.extractor,
+                    )
+                    if not self._claim(child):
+                        continue
+                    self._journal(child)
+                    self._active_tasks[child.id] = child
+                    group.total += 1
+                    self._queue.put(child)
+                    self._emit("task_added", child.id, child.url)
+                self._emit("task_updated", parent.id, "downloading", group.percent(), group.summary())
+        except Exception as e:
+            logging.error(f"Playlist expansion failed for {parent.url}: {e}")
+            group.failed += 1
+            group.total += 1
+        finally:
+            try:
+                entries.close()
+            except Exception:
+                pass
+            self._expanders.pop(parent.id, None)
+            group.expanding = False
+            await self._maybe_finish_group(parent, group)
+
+    def _task_finished(self, task: DownloadTask, ok: bool) -> None:
+        """Release a finished task's identity, record its metrics and
+        update its playlist, if any."""
+        self._release(task)
+        self._limiter.release(task.id)
+        journal_remove([task.id])
+        self._speeds.pop(task.id, None)
+        task.spans.mark("finished")
+        outcome = "completed" if ok else "cancelled" if task.cancelled else "error"
+        self.metrics.record_task(task.spans, outcome, task.extractor or "Generic")
+        self._retire(task)
+        group = self._groups.get(task.parent_id) if task.parent_id else None
+        if group is None:
+            return
+        group.running.pop(task.id, None)
+        if ok:
+            group.done += 1
+        else:
+            group.failed += 1
+        parent = self._active_tasks[task.parent_id]
+        self._emit("task_updated", parent.id, "downloading", group.percent(), group.summary())
+        if not group.expanding and group.done + group.failed >= group.total:
+            asyncio.ensure_future(self._maybe_finish_group(parent, group))
+
+    def _retire(self, task: DownloadTask) -> None:
+        """Move a finished task to the bounded archive of finished tasks."""
+        self._active_tasks.pop(task.id, None)
+        self._finished[task.id] = task
+        self._trim_finished()
+
+    def _trim_finished(self) -> None:
+        while len(self._finished) > max(0, self.keep_finished):
+            self._finished.popitem(last=False)
+
+    def update_retention(self, keep_finished: int) -> None:
+        """How many finished tasks ``get_task`` can still return."""
+        self.keep_finished = keep_finished
+        loop = self._loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._trim_finished)
+        else:
+            self._trim_finished()
+
+    async def _maybe_finish_group(self, parent: DownloadTask, group: PlaylistGroup) -> None:
+        if group.expanding or group.done + group.failed < group.total:
+            return
+        if self._groups.pop(parent.id, None) is None:
+            return  # already finished
+        if parent.cancelled:
+            status, message = "cancelled", "Cancelled by user"
+        elif group.failed:
+            status, message = "error", f"{group.failed} of {group.total} entries failed"
+        else:
+            status, message = "completed", None
+        if parent.db_id:
+            await update_download_status_async(parent.db_id, status)
+        if message is None:
+            self._emit("task_completed", parent.id)
+        else:
+            self._emit("task_error", parent.id, message)
+        self._task_finished(parent, ok=message is None)
+
+    def _get_process_pool(self) -> Optional[ProcessPool]:
+        """Process pool for the "process" backend, created on first use."""
+        if self.backend != "process":
+            return None
+        if self._process_pool is None:
+            self._process_pool = ProcessPool(max_workers=self.concurrency, cache_path=cache_path())
+        return self._process_pool
+
+    def update_backend(self, backend: str) -> None:
+        """Switch between "thread" and "process" execution for tasks started from now on."""
+        self.backend = backend
+
+    def update_bandwidth(self, rate_limit: float, per_task_rate_limit: float = 0, per_host_rate_limit: float = 0) -> None:
+        """Change the caps (bytes/second, 0 = none); running downloads follow at once."""
+        self._limiter.configure(rate_limit, per_task_rate_limit, per_host_rate_limit)
+
+    def update_connections(self, n: int) -> None:
+        """Connections per direct-HTTP download, for downloads started from now on."""
+        self.connections = max(1, n)
+        if self._segmented is not None:
+            self._segmented.connections = self.connections
+
+    def _register_gauges(self) -> None:
+        m = self.metrics
+        m.describe("vidfetch_tasks_total", "Finished tasks by outcome and extractor.")
+        m.describe("vidfetch_downloaded_bytes_total", "Bytes downloaded by finished tasks.")
+        m.describe("vidfetch_task_phase_seconds", "Time finished tasks spent in each phase.")
+        m.describe("vidfetch_task_throughput_bytes_per_second", "Average transfer rate of finished tasks.")
+        m.describe("vidfetch_retries_total", "Failed downloads queued again, by error kind.")
+        m.gauge("vidfetch_queue_depth", lambda: self._queue.qsize() if self._queue else len(self._pending_tasks),
+                "Tasks waiting for a download slot.")
+        m.gauge("vidfetch_active_consumers", lambda: len(self._busy), "Consumers working on a task.")
+        m.gauge("vidfetch_consumers", lambda: len(self._consumers), "Consumers running.")
+        m.gauge("vidfetch_inflight_tasks", lambda: len(self._inflight), "Tasks queued or running.")
+        m.gauge("vidfetch_post_queue_depth", lambda: self._post_queue.qsize() if self._post_queue else 0,
+                "Downloads waiting for post-processing.")
+        m.gauge("vidfetch_download_speed_bytes_per_second", lambda: sum(self._speeds.values()),
+                "Combined speed of running downloads, as of the last progress flush.")
+        m.gauge("vidfetch_open_circuit_breakers", lambda: self.breakers.open_hosts(),
+                "Hosts whose tasks are parked after repeated failures.")
+
+    def update_metrics_export(self, port: int = 0, path: str = "", interval: float = 15.0) -> None:
+        """Serve metrics on 127.0.0.1:``port`` and/or rewrite them to ``path``
+        every ``interval`` seconds (0 / "" turns each off)."""
+        server = self._metrics_server
+        if server is not None and server.port != port:
+            server.close()
+            self._metrics_server = server = None
+        if server is None and port:
+            try:
+                self._metrics_server = MetricsServer(self.metrics, port)
+            except OSError as e:
+                logging.error(f"Cannot serve metrics on port {port}: {e}")
+        exporter = self._metrics_file
+        if exporter is not None and (exporter.path != path or exporter.interval != interval):
+            exporter.close()
+            self._metrics_file = exporter = None
+        if exporter is None and path:
+            self._metrics_file = MetricsFileExporter(self.metrics, path, interval)
+
+    def _on_progress(self, task_id: str, status: dict):
+        """Callback from downloader (worker thread); coalesced until the next flush."""
+        self._progress.push(task_id, status)
+
+    def update_scheduling(self, policy: str, per_host_limit: int = 0) -> None:
+        """Switch scheduling policy and per-host cap at runtime. Thread-safe."""
+        self.policy = policy
+        self.per_host_limit = per_host_limit
+        loop = self._loop
+        if loop and loop.is_running() and self._queue:
+            loop.call_soon_threadsafe(self._queue.set_policy, policy, per_host_limit)
+
+    def update_retries(self, max_retries: int) -> None:
+        """How many times a download failing with a transient error is retried."""
+        self.retry.max_retries = max(0, max_retries)
+
+    def update_concurrency(self, n: int):
+        """Grow or shrink the consumer pool at runtime. Thread-safe."""
+        self.concurrency = max(1, n)
+        loop = self._loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(self._resize_pool)
\ No newline at end of file
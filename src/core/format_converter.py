@@ -1,12 +1,116 @@
 """FFmpeg helper utilities for format conversion."""
 from __future__ import annotations
 
-import ffmpeg
+import asyncio
+import os
+import shutil
+from typing import Any, AsyncIterator, Dict, Tuple
 
 
-def convert_to_mp3(input_path: str, output_path: str, bitrate: str = "192k") -> None:
+# yt-dlp's preferredcodec names -> (ffmpeg encoder, file extension)
+AUDIO_CODECS = {
+    "mp3": ("libmp3lame", "mp3"),
+    "aac": ("aac", "m4a"),
+    "m4a": ("aac", "m4a"),
+    "opus": ("libopus", "opus"),
+    "vorbis": ("libvorbis", "ogg"),
+    "flac": ("flac", "flac"),
+    "wav": ("pcm_s16le", "wav"),
+}
+
+
+def have_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def audio_codec(codec: str) -> Tuple[str, str]:
+    """(ffmpeg encoder, file extension) for a yt-dlp codec name; mp3 if unknown."""
+    return AUDIO_CODECS.get(codec, AUDIO_CODECS["mp3"])
+
+
+def _audio_kwargs(codec: str, quality: str) -> Dict[str, Any]:
+    """``quality`` follows yt-dlp's convention: 0-10 is a VBR level,
+    anything larger a bitrate in kbit/s."""
+    encoder, _ = audio_codec(codec)
+    kwargs: Dict[str, Any] = {"vn": None, "acodec": encoder}
+    if encoder not in ("flac", "pcm_s16le"):
+        q = float(quality or 5)
+        if q <= 10:
+            kwargs["q:a"] = quality
+        else:
+            kwargs["audio_bitrate"] = f"{int(q)}k"
+    return kwargs
+
+
+def extract_audio(input_path: str, output_path: str, codec: str = "mp3", quality: str = "192") -> None:
+    """Encode the audio track of ``input_path`` to ``output_path``."""
+    import ffmpeg  # ffmpeg-python, only loaded once there is work for it
     (ffmpeg
         .input(input_path)
-        .output(output_path, audio_bitrate=bitrate, vn=None)
-        .run(overwrite_output=True)
+        .output(output_path, **_audio_kwargs(codec, quality))
+        .run(overwrite_output=True, quiet=True)
+    )
+
+
+def convert_to_mp3(input_path: str, output_path: str, bitrate: str = "192k") -> None:
+    extract_audio(input_path, output_path, "mp3", bitrate.rstrip("k"))
+
+
+async def stream_extract_audio(
+    chunks: AsyncIterator[bytes],
+    output_path: str,
+    codec: str = "mp3",
+    quality: str = "192",
+) -> None:
+    """Encode audio fed as a byte stream, writing only ``output_path``.
+
+    The source bytes go to ffmpeg's stdin as they arrive, so nothing but
+    the encoded file is written. Output goes to a temporary name first; on
+    any failure (including cancellation) ffmpeg is killed and it is removed.
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    base, ext = os.path.splitext(output_path)
+    tmp = f"{base}.part{ext}"  # ffmpeg picks the muxer from the extension
+    import ffmpeg
+    args = (ffmpeg
+        .input("pipe:0")
+        .output(tmp, **_audio_kwargs(codec, quality))
+        .global_args("-nostdin", "-nostats", "-loglevel", "error")
+        .overwrite_output()
+        .compile()
+    )
+    # -nostdin only stops ffmpeg reading keyboard commands; pipe:0 still works
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
     )
+    try:
+        try:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg gave up; its exit status and stderr say why
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            if not proc.stdin.is_closing():
+                proc.stdin.close()
+        _, err = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {err.decode(errors='replace').strip()[-500:]}")
+        os.replace(tmp, output_path)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,176 @@
+"""Two-tier cache for yt-dlp info dicts: in-memory LRU over an SQLite file."""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .canonical import cache_key
+from utils.database import db_path
+
+
+# Seconds an info dict stays usable, per extractor key. Stream URLs inside
+# YouTube info dicts are signed and expire after about six hours.
+EXTRACTOR_TTLS: Dict[str, float] = {
+    "Youtube": 5 * 3600,
+    "Generic": 3600,
+}
+DEFAULT_TTL = 12 * 3600
+# Reads record access times in memory; they are written with the next put,
+# or once this many have piled up
+ACCESS_BATCH = 64
+
+
+def cache_path() -> Path:
+    return db_path().with_name("metadata_cache.db")
+
+
+class MetadataCache:
+    """Info dicts keyed by extractor + media id, so URL variants share entries.
+
+    Thread-safe. Disk entries are zlib-compressed JSON; the disk tier is
+    trimmed to ``max_disk_bytes`` by least-recent access. A ``get`` does no
+    write of its own: access times are batched (see ``ACCESS_BATCH``) and
+    expired rows are dropped by the next ``put``.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_memory_entries: int = 256,
+        max_disk_bytes: int = 200 * 1024 * 1024,
+    ) -> None:
+        self.path = path or cache_path()
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._accessed: Dict[str, float] = {}  # key -> last_access not yet written
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS info_cache (
+                key TEXT PRIMARY KEY,
+                extractor TEXT,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_info_cache_access ON info_cache(last_access)")
+        self._conn.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def ttl_for(extractor: str) -> float:
+        return EXTRACTOR_TTLS.get(extractor, DEFAULT_TTL)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        key, _ = cache_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._touch(key, now)
+                    self.memory_hits += 1
+                    return json.loads(json.dumps(entry[1]))
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM info_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            self._touch(key, now)
+            info = json.loads(zlib.decompress(row[0]))
+            self._remember(key, row[1], info)
+            self.disk_hits += 1
+            # Hand out a copy: yt-dlp mutates info dicts while processing
+            return json.loads(json.dumps(info))
+
+    def put(self, url: str, info: Dict[str, Any]) -> None:
+        """Store a JSON-safe info dict (see ``YoutubeDL.sanitize_info``)."""
+        key, extractor = cache_key(url)
+        extractor = info.get("extractor_key") or extractor
+        now = time.time()
+        expires_at = now + self.ttl_for(extractor)
+        blob = zlib.compress(json.dumps(info).encode("utf-8"))
+        with self._lock:
+            self._remember(key, expires_at, info)
+            self._accessed.pop(key, None)
+            self._write_access()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO info_cache (key, extractor, data, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, extractor, blob, len(blob), expires_at, now),
+            )
+            self._evict_disk()
+            self._conn.commit()
+
+    def _touch(self, key: str, now: float) -> None:
+        self._accessed[key] = now
+        if len(self._accessed) >= ACCESS_BATCH:
+            self._write_access()
+            self._conn.commit()
+
+    def _write_access(self) -> None:
+        """Write the batched access times (the caller commits)."""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE info_cache SET last_access = ? WHERE key = ?",
+                [(t, key) for key, t in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _remember(self, key: str, expires_at: float, info: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self) -> None:
+        self._conn.execute("DELETE FROM info_cache WHERE expires_at <= ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM info_cache").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        excess = total - self.max_disk_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM info_cache ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM info_cache WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_access()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,301 @@
+"""Per-task timing spans and process-wide download metrics.
+
+Each ``DownloadTask`` carries ``TaskSpans``: when it entered each phase and
+how many bytes it moved. When a task ends its spans are folded into the
+engine's ``Metrics``: counters by outcome and extractor, and histograms of
+phase durations and throughput. Gauges (queue depth, busy consumers...) are
+read from the engine at collection time.
+
+``Metrics.render()`` produces the Prometheus text format, served over HTTP
+by ``MetricsServer`` or written to a file by ``MetricsFileExporter`` (e.g.
+for node_exporter's textfile collector); ``snapshot()`` is what the GUI's
+stats panel shows.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Phase boundaries, in the order a task normally crosses them. A task that
+# fails or streams straight into ffmpeg skips some.
+#   queued      added to the queue
+#   started     a consumer picked it up
+#   transfer    first bytes arrived (extraction and format selection before)
+#   downloaded  the downloader returned
+#   converting  a post-processing worker picked it up
+#   finished    completed, failed or cancelled
+PHASES = ("queued", "started", "transfer", "downloaded", "converting", "finished")
+
+# (name, from, to) spans derived from the phase marks
+SPANS = (
+    ("queue_wait", "queued", "started"),
+    ("extraction", "started", "transfer"),
+    ("transfer", "transfer", "downloaded"),
+    ("post_wait", "downloaded", "converting"),
+    ("post_processing", "converting", "finished"),
+    ("total", "queued", "finished"),
+)
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(2 ** i * 1024 for i in range(4, 18, 2))  # 16 KiB/s .. 64 MiB/s
+
+
+class TaskSpans:
+    """Phase timestamps (``time.monotonic``) and byte count of one task."""
+
+    __slots__ = ("marks", "bytes", "db_seconds")
+
+    def __init__(self) -> None:
+        self.marks: Dict[str, float] = {"queued": time.monotonic()}
+        self.bytes = 0
+        self.db_seconds = 0.0
+
+    def mark(self, phase: str) -> None:
+        self.marks[phase] = time.monotonic()
+
+    def mark_once(self, phase: str) -> None:
+        if phase not in self.marks:
+            self.marks[phase] = time.monotonic()
+
+    def durations(self) -> Dict[str, float]:
+        """Seconds spent in each span the task went through, plus "db"."""
+        out = {}
+        for name, start, end in SPANS:
+            if start in self.marks and end in self.marks:
+                out[name] = max(0.0, self.marks[end] - self.marks[start])
+        if self.db_seconds:
+            out["db"] = self.db_seconds
+        return out
+
+    def throughput(self) -> Optional[float]:
+        """Bytes/second over the transfer span, if there was one."""
+        seconds = self.durations().get("transfer")
+        return self.bytes / seconds if self.bytes and seconds else None
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    # Exact, unlike "%g", which would round byte counters to 6 digits
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """Thread-safe counters, histograms and gauges for one engine."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DURATION_BUCKETS, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def gauge(self, name: str, read: Callable[[], float], help: str = "") -> None:
+        """Register a gauge whose value is read when metrics are collected."""
+        self._gauges[name] = read
+        if help:
+            self._help[name] = help
+
+    def record_task(self, spans: TaskSpans, outcome: str, extractor: str) -> None:
+        """Fold a finished task's spans into the aggregates."""
+        self.inc("vidfetch_tasks_total", outcome=outcome, extractor=extractor)
+        if spans.bytes:
+            self.inc("vidfetch_downloaded_bytes_total", spans.bytes)
+        for span, seconds in spans.durations().items():
+            self.observe("vidfetch_task_phase_seconds", seconds, phase=span)
+        rate = spans.throughput()
+        if rate is not None:
+            self.observe("vidfetch_task_throughput_bytes_per_second", rate, THROUGHPUT_BUCKETS)
+
+    def _read_gauges(self) -> Dict[str, float]:
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                values[name] = float(read())
+            except Exception:
+                pass  # the engine may be between runs
+        return values
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+        lines: List[str] = []
+        seen = set()
+
+        def header(name: str, kind: str) -> None:
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, value in sorted(self._read_gauges().items()):
+            header(name, "gauge")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """Plain-dict summary for display: gauges, totals, mean phase times,
+        error rate per extractor and retries per error kind."""
+        with self._lock:
+            counters = dict(self._counters)
+            phases = {
+                dict(labels)["phase"]: h.sum / h.count
+                for (name, labels), h in self._histograms.items()
+                if name == "vidfetch_task_phase_seconds" and h.count
+            }
+        outcomes: Dict[str, float] = {}
+        by_extractor: Dict[str, Dict[str, float]] = {}
+        retries: Dict[str, float] = {}
+        for (name, labels), value in counters.items():
+            if name == "vidfetch_retries_total":
+                retries[dict(labels)["kind"]] = value
+            if name != "vidfetch_tasks_total":
+                continue
+            label = dict(labels)
+            outcomes[label["outcome"]] = outcomes.get(label["outcome"], 0) + value
+            counts = by_extractor.setdefault(label["extractor"], {})
+            counts[label["outcome"]] = counts.get(label["outcome"], 0) + value
+        error_rates = {
+            extractor: counts.get("error", 0) / sum(counts.values())
+            for extractor, counts in by_extractor.items()
+        }
+        return {
+            "gauges": self._read_gauges(),
+            "tasks": outcomes,
+            "bytes": counters.get(("vidfetch_downloaded_bytes_total", ()), 0),
+            "mean_phase_seconds": phases,
+            "error_rate_by_extractor": error_rates,
+            "retries": retries,
+        }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves ``/metrics`` for Prometheus from a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1") -> None:
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+        self._thread = threading.Thread(target=self.serve_forever, name="vidfetch-metrics-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class MetricsFileExporter:
+    """Rewrites ``path`` with ``render()`` every ``interval`` seconds.
+
+    The file is replaced atomically so readers never see half of it.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 15.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vidfetch-metrics-file", daemon=True)
+        self._thread.start()
+
+    def write(self) -> None:
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.metrics.render())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error(f"Cannot write metrics to {self.path}: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
@@ -0,0 +1,41 @@
+"""Task options shared by the GUI and the command line."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+
+def task_options(
+    out_dir: str,
+    quality: str = "1080p",
+    audio_only: bool = False,
+    subtitles: bool = False,
+    thumbnail: bool = False,
+) -> Dict[str, Any]:
+    """Options dict for ``DownloadEngine.add_task``."""
+    ytdlp_opts: Dict[str, Any] = {}
+
+    if audio_only:
+        ytdlp_opts.update({
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        })
+
+    if subtitles:
+        ytdlp_opts.update({
+            'writesubtitles': True,
+            'writeautomaticsub': True,
+            'subtitleslangs': ['en', 'all'],  # Default to English/Auto
+        })
+
+    if thumbnail:
+        ytdlp_opts['writethumbnail'] = True
+
+    return {
+        "out_dir": out_dir,
+        "quality": quality,
+        "ytdlp_opts": ytdlp_opts,
+    }
@@ -0,0 +1,80 @@
+"""Post-download processing as its own pipeline stage.
+
+Audio extraction used to run inside yt-dlp (``FFmpegExtractAudio``), in the
+consumer that had just downloaded the file, so the download slot idled
+while ffmpeg used the CPU. The download engine now takes such steps out of
+the yt-dlp options with ``split_postprocessors`` and hands the finished
+file to a separate pool of conversion workers sized to the CPU count.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from . import format_converter
+
+
+# yt-dlp postprocessor keys this stage runs itself
+STAGED_KEYS = {"FFmpegExtractAudio"}
+
+
+@dataclass(frozen=True)
+class PostStep:
+    key: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"key": self.key, **self.options}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "PostStep":
+        d = dict(d)
+        return cls(d.pop("key"), d)
+
+
+def split_postprocessors(ytdlp_opts: Dict[str, Any]) -> Tuple[Dict[str, Any], List[PostStep]]:
+    """Return yt-dlp options without the staged postprocessors, and those steps."""
+    pps = ytdlp_opts.get("postprocessors") or []
+    staged = [PostStep.from_dict(pp) for pp in pps if pp.get("key") in STAGED_KEYS]
+    if not staged:
+        return ytdlp_opts, []
+    rest = [pp for pp in pps if pp.get("key") not in STAGED_KEYS]
+    opts = dict(ytdlp_opts)
+    if rest:
+        opts["postprocessors"] = rest
+    else:
+        opts.pop("postprocessors", None)
+    return opts, staged
+
+
+def _extract_audio(path: str, options: Dict[str, Any]) -> str:
+    codec = options.get("preferredcodec") or "mp3"
+    _, ext = format_converter.audio_codec(codec)
+    out = os.path.splitext(path)[0] + "." + ext
+    if out == path:
+        return path  # already in the wanted format
+    format_converter.extract_audio(path, out, codec, str(options.get("preferredquality") or "5"))
+    if not options.get("keepvideo"):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.debug(f"Could not remove {path} after conversion: {e}")
+    return out
+
+
+_RUNNERS = {
+    "FFmpegExtractAudio": _extract_audio,
+}
+
+
+def run_steps(path: str, steps: List[PostStep]) -> str:
+    """Apply ``steps`` to the downloaded file in order; returns the final path.
+
+    Blocking: ffmpeg runs as a child process, so callers run this in a
+    worker thread.
+    """
+    for step in steps:
+        path = _RUNNERS[step.key](path, step.options)
+    return path
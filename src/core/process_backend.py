@@ -0,0 +1,232 @@
+"""Process-pool execution backend for downloads.
+
+yt-dlp's extraction, signature deciphering and fragment bookkeeping are
+CPU-heavy Python; with many parallel tasks in one process they serialise on
+the GIL. ``ProcessPool`` runs each download in one of a bounded set of
+long-lived worker processes and streams progress back over a pipe into the
+usual ``progress_callback`` contract.
+
+Bandwidth limits are enforced in the parent: when a job is throttled the
+worker waits, after each progress message, for the pause the parent's
+limiter assigns and sleeps it off before reading more.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .downloader import DownloadCancelled, ProgressCallback
+from .ratelimit import ByteMeter, Throttle
+from .retry import WorkerError, describe
+
+
+# Minimum seconds between "downloading" progress messages sent by a worker;
+# status changes (finished, error) are always sent.
+PROGRESS_INTERVAL = 0.05
+_PLAIN = (str, int, float, bool, type(None))
+
+
+def _worker_main(conn: Connection, cancel: Any, cache_path: Optional[str]) -> None:
+    """Worker process loop: run download jobs until told to exit."""
+    from .downloader import YTDLPDownloader
+    from .ydl_pool import YDLPool
+
+    cache = None
+    if cache_path:
+        try:
+            from .metadata_cache import MetadataCache
+            cache = MetadataCache(Path(cache_path))
+        except Exception as e:
+            logging.error(f"Metadata cache unavailable in worker: {e}")
+    downloader = YTDLPDownloader(cache=cache, pool=YDLPool(max_idle_per_key=1))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        url, out_dir, ytdlp_opts, throttled = job
+        last_sent = 0.0
+
+        def hook(d: Dict[str, Any]) -> None:
+            nonlocal last_sent
+            if cancel.is_set():
+                raise DownloadCancelled("Cancelled by user")
+            now = time.monotonic()
+            if d.get("status") == "downloading" and now - last_sent < PROGRESS_INTERVAL:
+                return
+            last_sent = now
+            # Only plain values cross the pipe (info_dict is large, and not
+            # every value in it pickles)
+            conn.send(("progress", {k: v for k, v in d.items() if isinstance(v, _PLAIN)}))
+            if throttled:
+                delay = conn.recv()
+                if delay and cancel.wait(delay):
+                    raise DownloadCancelled("Cancelled by user")
+
+        try:
+            downloader._download(url, out_dir, hook, ytdlp_opts)
+        except DownloadCancelled as e:
+            conn.send(("cancelled", str(e)))
+        except Exception as e:
+            # Sent as plain values: the exception itself may not pickle, and
+            # its text alone loses what retrying needs (type, Retry-After)
+            conn.send(("error", describe(e)))
+        else:
+            conn.send(("done", None))
+        cancel.clear()
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "cancel")
+
+    def __init__(self, ctx: Any, cache_path: Optional[str]) -> None:
+        parent, child = ctx.Pipe()
+        self.conn = parent
+        self.cancel = ctx.Event()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child, self.cancel, cache_path),
+            name="vidfetch-download-worker", daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class ProcessPool:
+    """Bounded pool of download worker processes.
+
+    ``run`` blocks the calling thread (use ``asyncio.to_thread``) while the
+    job runs in a worker. If ``progress_callback`` raises
+    ``DownloadCancelled`` the worker is told to abort at its next progress
+    hook; the same exception is then raised from ``run``. Other failures
+    in the worker are raised as ``core.retry.WorkerError``. ``throttle``
+    (see ``core.ratelimit``) paces the worker from this side.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_path: Optional[Path] = None) -> None:
+        self.max_workers = max_workers
+        self.cache_path = str(cache_path) if cache_path else None
+        # spawn: fork is unsafe with the Qt and asyncio threads in the parent
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._workers: List[_Worker] = []
+        self._closed = False
+
+    def _acquire(self) -> _Worker:
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Process pool is closed")
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    worker = None
+                    if len(self._workers) < self.max_workers:
+                        worker = _Worker(self._ctx, self.cache_path)
+                        self._workers.append(worker)
+            if worker is None:
+                try:
+                    worker = self._idle.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            if worker.alive():
+                return worker
+            self._discard(worker)
+
+    def _release(self, worker: _Worker) -> None:
+        # A cancel that raced with the job finishing must not hit the next job
+        worker.cancel.clear()
+        with self._lock:
+            surplus = self._closed or len(self._workers) > self.max_workers
+            if not surplus:
+                self._idle.put(worker)
+                return
+            self._workers.remove(worker)
+        worker.stop()
+
+    def _discard(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+
+    def run(
+        self,
+        url: str,
+        out_dir: Optional[str],
+        progress_callback: Optional[ProgressCallback],
+        ytdlp_opts: Optional[Dict[str, Any]],
+        throttle: Optional[Throttle] = None,
+    ) -> None:
+        worker = self._acquire()
+        cancelled: Optional[DownloadCancelled] = None
+        meter = ByteMeter()
+        try:
+            worker.conn.send((url, out_dir, ytdlp_opts, throttle is not None))
+            while True:
+                try:
+                    kind, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    raise RuntimeError("Download worker exited unexpectedly")
+                if kind == "progress":
+                    if throttle is not None:
+                        # The worker blocks until it gets its pause
+                        delay = throttle(meter.update(payload)) if payload.get("status") == "downloading" else 0.0
+                        try:
+                            worker.conn.send(delay)
+                        except OSError:
+                            raise RuntimeError("Download worker exited unexpectedly")
+                    if progress_callback is None or cancelled is not None:
+                        continue
+                    try:
+                        progress_callback(payload)
+                    except DownloadCancelled as e:
+                        cancelled = e
+                        worker.cancel.set()
+                    except Exception:
+                        # Do not allow hook exceptions to break downloads
+                        pass
+                elif kind == "done":
+                    break
+                elif kind == "cancelled":
+                    raise cancelled or DownloadCancelled(payload)
+                else:
+                    raise WorkerError(payload)
+        except RuntimeError:
+            if not worker.alive():
+                self._discard(worker)
+                worker = None
+            raise
+        finally:
+            if worker is not None:
+                self._release(worker)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for w in workers:
+            w.stop()
@@ -0,0 +1,68 @@
+"""Coalescing of per-chunk yt-dlp progress into periodic batches."""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class ProgressUpdate:
+    """Compact progress record for one task, safe to pass across threads."""
+    task_id: str
+    status: str
+    percent: int
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None
+    eta: Optional[int] = None
+    filename: Optional[str] = None
+
+    @classmethod
+    def from_status(cls, task_id: str, d: Dict[str, Any]) -> "ProgressUpdate":
+        """Build a record from a raw yt-dlp progress hook dict."""
+        downloaded = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        percent = int(100 * downloaded / total) if total else 0
+        eta = d.get("eta")
+        return cls(
+            task_id=task_id,
+            status=d.get("status", "downloading"),
+            percent=min(percent, 100),
+            downloaded_bytes=int(downloaded),
+            total_bytes=int(total) if total else None,
+            speed=d.get("speed"),
+            eta=int(eta) if eta is not None else None,
+            filename=d.get("filename"),
+        )
+
+
+class ProgressAggregator:
+    """Keeps only the latest progress per task until it is drained.
+
+    ``push`` is called from download threads on every hook invocation and
+    only replaces a dict entry; ``drain`` is called at the flush rate and
+    hands back one record per task that changed since the last drain.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest: Dict[str, ProgressUpdate] = {}
+
+    def push(self, task_id: str, status: Dict[str, Any]) -> None:
+        update = ProgressUpdate.from_status(task_id, status)
+        with self._lock:
+            self._latest[task_id] = update
+
+    def discard(self, task_id: str) -> None:
+        """Drop a pending update, e.g. once the task has finished."""
+        with self._lock:
+            self._latest.pop(task_id, None)
+
+    def drain(self) -> List[ProgressUpdate]:
+        with self._lock:
+            if not self._latest:
+                return []
+            updates = list(self._latest.values())
+            self._latest = {}
+        return updates
@@ -0,0 +1,160 @@
+"""Shared bandwidth limiting for every running download.
+
+``BandwidthLimiter`` combines a global token bucket with optional per-host
+and per-task buckets. Downloads report the bytes they just received and get
+back how long to pause; buckets run into debt instead of blocking, so
+callers on any thread (or event loop, or on behalf of a worker process)
+share one budget. A task that goes idle stops drawing from the global
+bucket, so its share goes to the tasks that are still running.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from .downloader import ProgressCallback
+
+
+# Seconds of traffic a bucket may save up while idle. Kept short so a
+# download that resumes can't burst far above its cap.
+BURST_SECONDS = 0.25
+MIN_BURST = 64 * 1024
+
+# Longest single sleep while throttling, so cancellation is noticed quickly
+SLEEP_SLICE = 0.25
+
+Throttle = Callable[[int], float]  # bytes received -> seconds to pause
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` is bytes/second, 0 means unlimited."""
+
+    def __init__(self, rate: float = 0) -> None:
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            self.burst = max(MIN_BURST, self.rate * BURST_SECONDS)
+            self._tokens = self.burst
+
+    def reserve(self, n: int) -> float:
+        """Take ``n`` tokens, going into debt if needed; returns the pause owed."""
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class BandwidthLimiter:
+    """Global, per-host and per-task caps in bytes/second (0 = no cap).
+
+    Owned by ``DownloadEngine``; ``configure`` may be called from any thread
+    and applies to transfers already running. A host's bucket lives while
+    some task draws on it: it goes with the last such task's ``release``.
+    """
+
+    def __init__(self, global_rate: float = 0, per_task_rate: float = 0, per_host_rate: float = 0) -> None:
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate)
+        self._hosts: Dict[str, TokenBucket] = {}
+        self._host_users: Dict[str, int] = {}  # host -> tasks drawing on its bucket
+        self._tasks: Dict[str, TokenBucket] = {}
+        self._task_hosts: Dict[str, str] = {}
+        self.per_task_rate = per_task_rate
+        self.per_host_rate = per_host_rate
+
+    def configure(self, global_rate: float, per_task_rate: float = 0, per_host_rate: float = 0) -> None:
+        self._global.set_rate(global_rate)
+        with self._lock:
+            self.per_task_rate = per_task_rate
+            self.per_host_rate = per_host_rate
+            for bucket in self._tasks.values():
+                bucket.set_rate(per_task_rate)
+            for bucket in self._hosts.values():
+                bucket.set_rate(per_host_rate)
+
+    def reserve(self, task_id: str, host: str, n: int) -> float:
+        """Account ``n`` bytes for a task and return how long it should pause."""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                task = self._tasks[task_id] = TokenBucket(self.per_task_rate)
+                self._task_hosts[task_id] = host
+                self._host_users[host] = self._host_users.get(host, 0) + 1
+            bucket = self._hosts.get(host)
+            if bucket is None:
+                bucket = self._hosts[host] = TokenBucket(self.per_host_rate)
+        return max(self._global.reserve(n), bucket.reserve(n), task.reserve(n))
+
+    def throttle_for(self, task_id: str, host: str) -> Throttle:
+        return lambda n: self.reserve(task_id, host, n)
+
+    def release(self, task_id: str) -> None:
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            host = self._task_hosts.pop(task_id, None)
+            if host is None:
+                return
+            users = self._host_users[host] - 1
+            if users:
+                self._host_users[host] = users
+            else:
+                del self._host_users[host]
+                self._hosts.pop(host, None)
+
+
+class ByteMeter:
+    """Turns cumulative ``downloaded_bytes`` from progress hooks into deltas.
+
+    A new file (separate video and audio streams, say) restarts the count.
+    """
+
+    __slots__ = ("_file", "_seen")
+
+    def __init__(self) -> None:
+        self._file: Optional[str] = None
+        self._seen = 0
+
+    def update(self, d: Dict[str, Any]) -> int:
+        name = d.get("tmpfilename") or d.get("filename")
+        done = d.get("downloaded_bytes") or 0
+        if name != self._file or done < self._seen:
+            self._file, self._seen = name, 0
+        delta = done - self._seen
+        self._seen = done
+        return max(0, delta)
+
+
+def throttled_callback(progress_callback: Optional["ProgressCallback"], throttle: Throttle) -> "ProgressCallback":
+    """Wrap a progress callback so the calling (download) thread sleeps off
+    its share of the budget.
+
+    yt-dlp calls progress hooks after every block it reads, so pausing there
+    paces the transfer itself. The sleep is sliced and the wrapped callback
+    re-invoked in between, so a ``DownloadCancelled`` still gets through.
+    """
+    meter = ByteMeter()
+
+    def callback(d: Dict[str, Any]) -> None:
+        if progress_callback is not None:
+            progress_callback(d)
+        if d.get("status") != "downloading":
+            return
+        delay = throttle(meter.update(d))
+        deadline = time.monotonic() + delay
+        while delay > 0:
+            time.sleep(min(delay, SLEEP_SLICE))
+            if progress_callback is not None:
+                progress_callback(d)
+            delay = deadline - time.monotonic()
+
+    return callback
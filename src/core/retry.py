@@ -0,0 +1,299 @@
+"""Retrying failed downloads: error classes, backoff and per-host breakers.
+
+``classify`` sorts a download's exception into transient (timeouts, dropped
+connections, 5xx), rate limited (429, or 503 with a Retry-After) and
+permanent (other 4xx, unsupported URLs, local errors). ``RetryPolicy``
+turns the attempt number into a jittered exponential delay, after which
+the engine puts the task back through the scheduler.
+
+``HostBreakers`` keeps one circuit breaker per host. After ``threshold``
+transient failures in a row, or any rate-limit answer, the host's breaker
+opens: the scheduler passes over its tasks (other hosts keep the download
+slots) until the cooldown ends. Then one task goes through as a probe; its
+success closes the breaker, its failure reopens it for twice as long.
+
+Exceptions are recognised by class name and message, so neither aiohttp
+nor yt-dlp is imported here. An error raised in a worker process crosses
+the pipe as ``describe``'s plain values and comes back as a ``WorkerError``,
+which ``classify`` takes at its word.
+"""
+from __future__ import annotations
+
+import email.utils
+import random
+import re
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional
+
+
+# Longest Retry-After honoured; a server asking for more gets retried sooner
+MAX_RETRY_AFTER = 3600.0
+
+
+class ErrorKind(Enum):
+    TRANSIENT = "transient"
+    RATE_LIMITED = "rate_limited"
+    PERMANENT = "permanent"
+
+
+class Failure(NamedTuple):
+    kind: ErrorKind
+    status: Optional[int] = None  # HTTP status, if the error was an HTTP answer
+    retry_after: Optional[float] = None  # seconds the server asked us to wait
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind is not ErrorKind.PERMANENT
+
+
+# Exception classes (or any of their bases) that mean a network hiccup:
+# builtins, aiohttp (ServerDisconnectedError, ClientOSError... derive from
+# ClientConnectionError), yt-dlp's networking errors and http.client
+_TRANSIENT_TYPES = {
+    "TimeoutError", "ConnectionError", "ClientConnectionError", "ClientPayloadError",
+    "TransportError", "IncompleteRead", "ContentTooShortError", "RemoteDisconnected",
+}
+# ...except these, which retrying won't fix
+_PERMANENT_TYPES = {"CertificateVerifyError", "SSLCertVerificationError", "ClientConnectorCertificateError"}
+
+# For errors that only survive as text
+_HTTP_STATUS_RE = re.compile(r"HTTP Error (\d{3})")
+_TRANSIENT_RE = re.compile(
+    r"timed out|timeout|connection (?:reset|refused|aborted)|remote end closed|"
+    r"temporary failure in name resolution|payload is not completed|"
+    r"did not get any data blocks|giving up after \d+ retries",
+    re.IGNORECASE,
+)
+
+
+def _causes(exc: BaseException) -> Iterator[BaseException]:
+    """``exc`` and what it wraps, outermost first (yt-dlp keeps the cause
+    of a DownloadError in ``exc_info``)."""
+    seen = set()
+    e: Optional[BaseException] = exc
+    while e is not None and id(e) not in seen and len(seen) < 16:
+        seen.add(id(e))
+        yield e
+        exc_info = getattr(e, "exc_info", None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        e = e.__cause__ or wrapped or e.__context__
+
+
+def _http_status(e: BaseException) -> Optional[int]:
+    # urllib's and yt-dlp's HTTPError, aiohttp's ClientResponseError
+    if type(e).__name__ not in ("HTTPError", "ClientResponseError"):
+        return None
+    status = getattr(e, "status", None) or getattr(e, "code", None)
+    return status if isinstance(status, int) and 100 <= status < 600 else None
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return min(max(0.0, when - (time.time() if now is None else now)), MAX_RETRY_AFTER)
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(e, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(e, "response", None), "headers", None)
+    try:
+        return parse_retry_after(headers.get("Retry-After")) if headers is not None else None
+    except AttributeError:
+        return None
+
+
+def _from_status(status: int, retry_after: Optional[float] = None) -> Failure:
+    if status == 429 or (status == 503 and retry_after is not None):
+        return Failure(ErrorKind.RATE_LIMITED, status, retry_after)
+    if status >= 500 or status in (408, 425):
+        return Failure(ErrorKind.TRANSIENT, status, retry_after)
+    return Failure(ErrorKind.PERMANENT, status)
+
+
+class WorkerError(RuntimeError):
+    """An error raised in a worker process, rebuilt from ``describe``.
+
+    ``types`` are the class names along the original's cause chain,
+    outermost first; ``kind``, ``status`` and ``retry_after`` are what
+    ``classify`` made of it there, where the exception objects still were.
+    """
+
+    def __init__(self, description: Dict[str, Any]) -> None:
+        super().__init__(description.get("message") or "Download failed in a worker process")
+        self.types = tuple(description.get("types") or ())
+        self.kind = ErrorKind(description.get("kind", ErrorKind.PERMANENT.value))
+        self.status: Optional[int] = description.get("status")
+        self.retry_after: Optional[float] = description.get("retry_after")
+
+
+def describe(exc: BaseException) -> Dict[str, Any]:
+    """``exc`` as plain (picklable) values, for ``WorkerError``."""
+    failure = classify(exc)
+    return {
+        "message": str(exc),
+        "types": [type(e).__name__ for e in _causes(exc)],
+        "kind": failure.kind.value,
+        "status": failure.status,
+        "retry_after": failure.retry_after,
+    }
+
+
+def classify(exc: BaseException) -> Failure:
+    """How a failed download should be treated; unknown errors are permanent."""
+    if isinstance(exc, WorkerError):
+        return Failure(exc.kind, exc.status, exc.retry_after)
+    causes = [(e, {c.__name__ for c in type(e).__mro__}) for e in _causes(exc)]
+    # An HTTP answer anywhere in the chain says the most
+    for e, names in causes:
+        if names & _PERMANENT_TYPES:
+            return Failure(ErrorKind.PERMANENT)
+        status = _http_status(e)
+        if status is not None:
+            return _from_status(status, _retry_after(e))
+    if any(names & _TRANSIENT_TYPES for _, names in causes):
+        return Failure(ErrorKind.TRANSIENT)
+    if any(getattr(e, "expected", False) is True for e, _ in causes):
+        # yt-dlp's ExtractorError for "video unavailable" and the like
+        return Failure(ErrorKind.PERMANENT)
+    message = str(exc)
+    m = _HTTP_STATUS_RE.search(message)
+    if m:
+        return _from_status(int(m.group(1)))
+    if _TRANSIENT_RE.search(message):
+        return Failure(ErrorKind.TRANSIENT)
+    return Failure(ErrorKind.PERMANENT)
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter: retry ``n`` waits between half and
+    all of ``base_delay * 2 ** (n - 1)``, capped at ``max_delay``.
+
+    The jitter spreads out retries of tasks that failed together (e.g. a
+    whole playlist hitting one outage), and a floor of half the step keeps
+    the backoff from collapsing to immediate retries.
+    """
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 2.0, max_delay: float = 300.0,
+                 rng: Optional[random.Random] = None) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int, failure: Failure) -> Optional[float]:
+        """Seconds to wait before retry ``attempt`` (1 for the first), or
+        None if the task should fail now."""
+        if not failure.retryable or attempt > self.max_retries:
+            return None
+        step = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = self._rng.uniform(step / 2, step)
+        if failure.retry_after is not None:
+            delay = max(delay, failure.retry_after)
+        return delay
+
+
+class _Breaker:
+    __slots__ = ("failures", "until", "cooldown", "probe")
+
+    def __init__(self, cooldown: float) -> None:
+        self.failures = 0
+        self.until = 0.0  # open until then (monotonic); 0 = closed
+        self.cooldown = cooldown
+        self.probe: Optional[str] = None  # id of the task testing a half-open breaker
+
+
+class HostBreakers:
+    """Per-host circuit breakers, shared by the scheduler (which asks
+    ``allow``) and the engine (which reports outcomes). Thread-safe."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _Breaker] = {}
+
+    def state(self, host: str) -> str:
+        """"closed", "open" or "half_open"."""
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is None or not b.until:
+                return "closed"
+            return "open" if self._clock() < b.until else "half_open"
+
+    def allow(self, host: str) -> bool:
+        """Whether a task for ``host`` may start now."""
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is None or not b.until:
+                return True
+            return self._clock() >= b.until and b.probe is None
+
+    def started(self, host: str, task_id: str) -> None:
+        """A task for ``host`` started; on a half-open breaker it is the probe."""
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is not None and b.until and b.probe is None and self._clock() >= b.until:
+                b.probe = task_id
+
+    def finished(self, host: str, task_id: str) -> None:
+        """A task ended without telling anything about the host (cancelled,
+        paused, failed locally): let another task probe it."""
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is not None and b.probe == task_id:
+                b.probe = None
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host: str, failure: Failure) -> None:
+        """Count a transient or rate-limit failure; permanent ones say
+        nothing about the host and are ignored."""
+        if not failure.retryable:
+            return
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is None:
+                b = self._hosts[host] = _Breaker(self.cooldown)
+            now = self._clock()
+            if b.probe is not None:
+                # The probe failed: back off for longer
+                b.probe = None
+                b.cooldown = min(self.max_cooldown, b.cooldown * 2)
+                b.until = now + b.cooldown
+            elif b.until and now < b.until:
+                pass  # already open; a download started before it opened
+            else:
+                b.failures += 1
+                if b.failures >= self.threshold or failure.kind is ErrorKind.RATE_LIMITED:
+                    b.failures = 0
+                    b.until = now + b.cooldown
+            if failure.retry_after is not None:
+                b.until = max(b.until, now + failure.retry_after)
+
+    def next_change(self) -> Optional[float]:
+        """Clock time at which the next open breaker lets a probe through."""
+        with self._lock:
+            now = self._clock()
+            times = [b.until for b in self._hosts.values() if b.until > now]
+        return min(times) if times else None
+
+    def open_hosts(self) -> int:
+        with self._lock:
+            now = self._clock()
+            return sum(1 for b in self._hosts.values() if b.until > now)
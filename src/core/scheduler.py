@@ -0,0 +1,324 @@
+"""Pluggable scheduling policies for the download queue.
+
+A ``Scheduler`` replaces the plain FIFO ``asyncio.Queue``: consumers
+``await get()`` the next task chosen by the active policy, skipping hosts
+that already have ``per_host_limit`` downloads running (or whose circuit
+breaker is open, see ``core.retry``), and report back with ``task_done()``
+so the host slot is released. ``put_later`` holds a task back for a delay,
+e.g. before a retry.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    from .retry import HostBreakers
+
+
+class Priority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+
+def host_of(url: str) -> str:
+    """Host used for fairness and per-host caps ('' if it can't be parsed)."""
+    try:
+        host = urlparse(url).hostname or ""
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+CanRun = Callable[[Any], bool]
+
+
+class SchedulingPolicy(ABC):
+    """Ordering strategy for queued tasks.
+
+    Tasks only need ``id``, ``host``, ``priority`` and ``size_hint``
+    attributes. ``pop`` must return the best task for which ``can_run``
+    is true, or None. ``can_run`` depends only on the task's host, so a
+    policy may ask it about one task per host and pass over the rest.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def push(self, task: Any) -> None: ...
+
+    @abstractmethod
+    def pop(self, can_run: CanRun) -> Optional[Any]: ...
+
+    @abstractmethod
+    def remove(self, task: Any) -> bool: ...
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[Any]: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+
+class _HeapPolicy(SchedulingPolicy):
+    """Min-heap on ``_key(task)``; ties are broken by arrival order.
+
+    There is one heap per host. ``pop`` compares the hosts' best entries
+    and asks ``can_run`` only about those, so tasks parked behind a
+    per-host cap or an open breaker cost nothing per ``get``, however many
+    there are.
+    """
+
+    def __init__(self) -> None:
+        self._heaps: Dict[str, List[Tuple[Any, int, Any]]] = {}
+        self._count = 0
+        self._seq = itertools.count()
+
+    @abstractmethod
+    def _key(self, task: Any) -> Any: ...
+
+    def push(self, task: Any) -> None:
+        heapq.heappush(self._heaps.setdefault(task.host, []), (self._key(task), next(self._seq), task))
+        self._count += 1
+
+    def pop(self, can_run: CanRun) -> Optional[Any]:
+        best: Optional[Tuple[Any, int, Any]] = None
+        for heap in self._heaps.values():
+            top = heap[0]
+            if (best is None or (top[0], top[1]) < (best[0], best[1])) and can_run(top[2]):
+                best = top
+        if best is None:
+            return None
+        task = best[2]
+        heap = self._heaps[task.host]
+        heapq.heappop(heap)
+        if not heap:
+            del self._heaps[task.host]
+        self._count -= 1
+        return task
+
+    def remove(self, task: Any) -> bool:
+        heap = self._heaps.get(task.host)
+        if heap is None:
+            return False
+        for i, entry in enumerate(heap):
+            if entry[2] is task:
+                heap[i] = heap[-1]
+                heap.pop()
+                if heap:
+                    heapq.heapify(heap)
+                else:
+                    del self._heaps[task.host]
+                self._count -= 1
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[Any]:
+        entries = [entry for heap in self._heaps.values() for entry in heap]
+        return iter([entry[2] for entry in sorted(entries, key=lambda e: (e[0], e[1]))])
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class FIFOPolicy(_HeapPolicy):
+    """Arrival order."""
+    name = "fifo"
+
+    def _key(self, task: Any) -> Any:
+        return 0
+
+
+class PriorityPolicy(_HeapPolicy):
+    """Higher ``Priority`` first, FIFO within a class."""
+    name = "priority"
+
+    def _key(self, task: Any) -> Any:
+        return -int(task.priority)
+
+
+class ShortestJobFirstPolicy(_HeapPolicy):
+    """Smallest known ``size_hint`` first; unknown sizes go last, in FIFO order."""
+    name = "sjf"
+
+    def _key(self, task: Any) -> Any:
+        size = task.size_hint
+        return (size is None, size or 0)
+
+
+class HostRoundRobinPolicy(SchedulingPolicy):
+    """Takes one task per host in turn, so a large playlist can't starve others."""
+    name = "round_robin"
+
+    def __init__(self) -> None:
+        self._hosts: "OrderedDict[str, Deque[Any]]" = OrderedDict()
+        self._count = 0
+
+    def push(self, task: Any) -> None:
+        self._hosts.setdefault(task.host, deque()).append(task)
+        self._count += 1
+
+    def pop(self, can_run: CanRun) -> Optional[Any]:
+        for host in list(self._hosts):
+            items = self._hosts[host]
+            if not can_run(items[0]):
+                continue
+            task = items.popleft()
+            # Rotate: this host goes to the back of the line
+            del self._hosts[host]
+            if items:
+                self._hosts[host] = items
+            self._count -= 1
+            return task
+        return None
+
+    def remove(self, task: Any) -> bool:
+        items = self._hosts.get(task.host)
+        if not items:
+            return False
+        try:
+            items.remove(task)
+        except ValueError:
+            return False
+        if not items:
+            del self._hosts[task.host]
+        self._count -= 1
+        return True
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter([t for items in self._hosts.values() for t in items])
+
+    def __len__(self) -> int:
+        return self._count
+
+
+POLICIES: Dict[str, Type[SchedulingPolicy]] = {
+    p.name: p for p in (FIFOPolicy, PriorityPolicy, ShortestJobFirstPolicy, HostRoundRobinPolicy)
+}
+
+
+class Scheduler:
+    """Async queue front-end for a ``SchedulingPolicy`` with per-host caps.
+
+    Must be created and used from the worker event loop. With ``breakers``,
+    tasks for hosts whose breaker is open stay queued until it lets them
+    through; delayed tasks and breakers are timed with ``time.monotonic``.
+    """
+
+    def __init__(self, policy: str = "fifo", per_host_limit: int = 0,
+                 breakers: Optional["HostBreakers"] = None) -> None:
+        self._policy: SchedulingPolicy = POLICIES.get(policy, FIFOPolicy)()
+        self.per_host_limit = per_host_limit
+        self.breakers = breakers
+        self._running: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        # Tasks waiting out a delay: (due time, seq, task) min-heap
+        self._later: List[Tuple[float, int, Any]] = []
+        self._seq = itertools.count()
+
+    @property
+    def policy(self) -> str:
+        return self._policy.name
+
+    def set_policy(self, policy: str, per_host_limit: Optional[int] = None) -> None:
+        """Switch policy, carrying queued tasks over in their current order."""
+        if policy != self._policy.name:
+            new = POLICIES.get(policy, FIFOPolicy)()
+            for task in self._policy:
+                new.push(task)
+            self._policy = new
+        if per_host_limit is not None:
+            self.per_host_limit = per_host_limit
+        self._notify()
+
+    def put(self, task: Any) -> None:
+        self._policy.push(task)
+        self._notify()
+
+    def put_many(self, tasks: Iterable[Any]) -> None:
+        for task in tasks:
+            self._policy.push(task)
+        self._notify()
+
+    def put_later(self, task: Any, delay: float) -> None:
+        """Queue ``task`` once ``delay`` seconds have passed."""
+        heapq.heappush(self._later, (time.monotonic() + delay, next(self._seq), task))
+        self._notify()
+
+    def remove(self, task: Any) -> bool:
+        """Drop a queued (or delayed) task; returns False if it was not queued."""
+        if self._policy.remove(task):
+            return True
+        for i, entry in enumerate(self._later):
+            if entry[2] is task:
+                self._later[i] = self._later[-1]
+                self._later.pop()
+                heapq.heapify(self._later)
+                return True
+        return False
+
+    async def get(self) -> Any:
+        """Wait for the next runnable task and claim its host slot.
+
+        Cancellation-safe: a task is only taken from the policy after the
+        wait completes, so cancelling a waiting consumer loses nothing.
+        """
+        while True:
+            self._release_due()
+            task = self._policy.pop(self._can_run)
+            if task is not None:
+                self._running[task.host] = self._running.get(task.host, 0) + 1
+                if self.breakers is not None:
+                    self.breakers.started(task.host, task.id)
+                return task
+            wakeup = self._wakeup
+            timeout = self._next_due()
+            if timeout is None:
+                await wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    def task_done(self, task: Any) -> None:
+        n = self._running.get(task.host, 0) - 1
+        if n > 0:
+            self._running[task.host] = n
+        else:
+            self._running.pop(task.host, None)
+        self._notify()
+
+    def qsize(self) -> int:
+        return len(self._policy) + len(self._later)
+
+    def _can_run(self, task: Any) -> bool:
+        if self.per_host_limit and self._running.get(task.host, 0) >= self.per_host_limit:
+            return False
+        return self.breakers is None or self.breakers.allow(task.host)
+
+    def _release_due(self) -> None:
+        now = time.monotonic()
+        while self._later and self._later[0][0] <= now:
+            self._policy.push(heapq.heappop(self._later)[2])
+
+    def _next_due(self) -> Optional[float]:
+        """Seconds until a delayed task is due or a breaker lets a probe through."""
+        times = [self._later[0][0]] if self._later else []
+        reopen = self.breakers.next_change() if self.breakers is not None else None
+        if reopen is not None:
+            times.append(reopen)
+        return max(0.0, min(times) - time.monotonic()) if times else None
+
+    def _notify(self) -> None:
+        # Wake every waiting consumer; each retries pop() against the new state.
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
@@ -0,0 +1,494 @@
+"""Multi-connection HTTP downloader for direct media URLs.
+
+A single TCP connection is often capped well below the link speed by the
+server or by latency. ``SegmentedDownloader`` fetches one file over several
+concurrent HTTP Range requests on a shared aiohttp session, writing each
+segment straight into a preallocated ``.segpart`` file at its offset.
+
+Segments are handed out from a list of unfetched byte ranges, sized from
+each connection's measured throughput (about ``target_seconds`` of data),
+so fast connections take bigger pieces and the tail of the file stays
+balanced. Finished ranges are recorded in a small ``.segpart.segments``
+file, so an interrupted download continues where it stopped.
+
+The temporary file is not yt-dlp's ``.part``: it has the final size from
+the start, with holes where segments are missing. If the same file is
+later downloaded by yt-dlp (e.g. with ``connections`` back at 1), yt-dlp
+would "continue" such a file from its end and accept the holes.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .downloader import DownloadCancelled, ProgressCallback
+
+
+READ_CHUNK = 256 * 1024
+# Suffix of the file being written; see the module docstring
+TMP_SUFFIX = ".segpart"
+# Finished ranges are recorded at most this often (and when the download stops)
+SAVE_INTERVAL = 1.0
+
+Range = Tuple[int, int]  # [start, end)
+
+
+def _write_at(fd: int, data: bytes, offset: int) -> None:
+    if hasattr(os, "pwrite"):
+        os.pwrite(fd, data, offset)
+    else:
+        # A download's writes run one at a time (see _Disk), so seek+write can't interleave
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+
+def _preallocate(fd: int, size: int) -> None:
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # Not supported here (Windows, some filesystems): a sparse file will do
+        os.ftruncate(fd, size)
+
+
+def _merge(ranges: List[Range]) -> List[Range]:
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _RangeNotSupported(Exception):
+    pass
+
+
+class _Disk:
+    """One download's file I/O, run in order on a thread of its own so the
+    event loop never waits for the disk.
+
+    A write whose caller was cancelled may still be running; ``finish``
+    queues the closing call behind it rather than racing it, and waits for
+    it even while the download is being cancelled, so a resume never reads
+    a half-written state.
+    """
+
+    def __init__(self) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vidfetch-disk")
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> "asyncio.Future[Any]":
+        """Queue ``fn(*args)`` and return an awaitable for its result. The
+        call runs even if the awaiting task is cancelled meanwhile."""
+        return asyncio.shield(asyncio.wrap_future(self._pool.submit(fn, *args)))
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        return self._pool.submit(fn, *args)
+
+    async def finish(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Run ``fn`` after every queued call, then let the thread exit."""
+        future = self._pool.submit(fn, *args)
+        self._pool.shutdown(wait=False)
+        await asyncio.shield(asyncio.wrap_future(future))
+
+
+class _Job:
+    """Shared state of one file download: unfetched ranges and progress."""
+
+    def __init__(
+        self,
+        total: int,
+        done: List[Range],
+        filename: str,
+        tmpfilename: str,
+        progress_callback: Optional[ProgressCallback],
+        throttle: Optional[Callable[[int], float]] = None,
+    ) -> None:
+        self.total = total
+        self.done = _merge(done)
+        self.holes: List[Range] = []
+        cursor = 0
+        for start, end in self.done:
+            if start > cursor:
+                self.holes.append((cursor, start))
+            cursor = end
+        if cursor < total:
+            self.holes.append((cursor, total))
+        self.downloaded = sum(end - start for start, end in self.done)
+        self.filename = filename
+        self.tmpfilename = tmpfilename
+        self.callback = progress_callback
+        self.throttle = throttle
+        self._started = time.monotonic()
+        self._resumed_from = self.downloaded
+        self.saved_at = self._started
+
+    def remaining(self) -> int:
+        return sum(end - start for start, end in self.holes)
+
+    def next_segment(self, size: int) -> Optional[Range]:
+        if not self.holes:
+            return None
+        start, end = self.holes[0]
+        cut = min(end, start + size)
+        if cut == end:
+            self.holes.pop(0)
+        else:
+            self.holes[0] = (cut, end)
+        return start, cut
+
+    def give_back(self, start: int, end: int) -> None:
+        """Return the unfetched rest of a failed segment."""
+        if start < end:
+            self.holes.append((start, end))
+            self.holes.sort()
+
+    def completed(self, start: int, end: int) -> None:
+        self.done = _merge(self.done + [(start, end)])
+
+    async def advance(self, n: int) -> None:
+        self.downloaded += n
+        self._report("downloading")
+        if self.throttle is not None:
+            delay = self.throttle(n)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def _report(self, status: str) -> None:
+        if self.callback is None:
+            return
+        elapsed = time.monotonic() - self._started
+        fetched = self.downloaded - self._resumed_from
+        speed = fetched / elapsed if elapsed > 0 else None
+        eta = int(max(0, self.total - self.downloaded) / speed) if speed and self.total else None
+        # Same keys as yt-dlp's progress hooks
+        try:
+            self.callback({
+                "status": status,
+                "downloaded_bytes": self.downloaded,
+                "total_bytes": self.total or None,
+                "speed": speed,
+                "eta": eta,
+                "filename": self.filename,
+                "tmpfilename": self.tmpfilename,
+                "elapsed": elapsed,
+            })
+        except DownloadCancelled:
+            raise
+        except Exception:
+            # Do not allow hook exceptions to break downloads
+            pass
+
+
+class SegmentedDownloader:
+    """Downloads direct URLs over ``connections`` parallel Range requests.
+
+    Create and use from one event loop; the aiohttp session (and its
+    keep-alive connection pool) is shared by every download until
+    ``close()``. Files too small to be worth splitting are fetched as
+    ranges over a single connection. Servers that don't honour Range
+    requests are streamed whole, and a download from one that was
+    interrupted starts again from byte 0.
+    """
+
+    def __init__(
+        self,
+        connections: int = 4,
+        min_segment: int = 1024 * 1024,
+        max_segment: int = 32 * 1024 * 1024,
+        target_seconds: float = 2.0,
+        retries: int = 3,
+        timeout: float = 30.0,
+    ) -> None:
+        self.connections = max(1, connections)
+        self.min_segment = min_segment
+        self.max_segment = max_segment
+        self.target_seconds = target_seconds
+        self.retries = retries
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout),
+                # Media is stored exactly as served
+                auto_decompress=False,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(
+        self,
+        url: str,
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        headers: Optional[Dict[str, str]] = None,
+        throttle: Optional[Callable[[int], float]] = None,
+    ) -> None:
+        """Download ``url`` to ``filename`` via ``filename + TMP_SUFFIX``.
+
+        A ``DownloadCancelled`` raised by ``progress_callback`` aborts the
+        transfer and propagates, leaving that file for a later resume.
+        ``throttle`` (see ``core.ratelimit``) is told about every chunk and
+        returns how long to pause before reading more.
+        """
+        headers = dict(headers or {})
+        session = self._get_session()
+        tmpfilename = filename + TMP_SUFFIX
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Probe with a one-byte Range request. A server that ignores it
+        # answers with the whole file, which is then simply streamed.
+        job = None
+        async with session.get(url, headers={**headers, "Range": "bytes=0-0"}) as resp:
+            resp.raise_for_status()
+            if resp.status == 206:
+                size = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                total = int(size) if size.isdigit() else None
+            else:
+                job = await self._stream(resp, resp.content_length, filename, tmpfilename, progress_callback, throttle)
+
+        if job is None:
+            if total:
+                # A small file isn't worth splitting, but fetched as ranges
+                # over one connection it still resumes from its last byte
+                connections = self.connections if total >= 2 * self.min_segment else 1
+                try:
+                    job = await self._fetch_segmented(
+                        session, url, headers, total, filename, tmpfilename, progress_callback, throttle, connections,
+                    )
+                except _RangeNotSupported:
+                    logging.debug(f"Range requests not honoured by {url}; using one connection")
+                    job = await self._fetch_single(session, url, headers, total, filename, tmpfilename, progress_callback, throttle)
+            else:
+                job = await self._fetch_single(session, url, headers, total, filename, tmpfilename, progress_callback, throttle)
+
+        os.replace(tmpfilename, filename)
+        try:
+            os.remove(tmpfilename + ".segments")
+        except FileNotFoundError:
+            pass
+        job._report("finished")
+
+    async def stream(
+        self,
+        url: str,
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        headers: Optional[Dict[str, str]] = None,
+        throttle: Optional[Callable[[int], float]] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield ``url``'s body in order over one connection, for piping.
+
+        Progress is reported against ``filename`` (the file the consumer
+        eventually writes), with the usual cancellation and throttling.
+        """
+        session = self._get_session()
+        async with session.get(url, headers=dict(headers or {})) as resp:
+            resp.raise_for_status()
+            job = _Job(resp.content_length or 0, [], filename, filename, progress_callback, throttle)
+            async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                yield chunk
+                await job.advance(len(chunk))
+        if not job.total:
+            job.total = job.downloaded
+        job._report("finished")
+
+    def _load_done(self, tmpfilename: str, total: int) -> List[Range]:
+        try:
+            with open(tmpfilename + ".segments") as f:
+                state = json.load(f)
+            if state.get("total") == total and os.path.getsize(tmpfilename) == total:
+                return [tuple(r) for r in state["done"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return []
+
+    @staticmethod
+    def _save_done(path: str, total: int, done: List[Range]) -> None:
+        try:
+            with open(path, "w") as f:
+                json.dump({"total": total, "done": done}, f)
+        except OSError as e:
+            logging.debug(f"Could not record finished segments: {e}")
+
+    async def _fetch_segmented(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        total: int,
+        filename: str,
+        tmpfilename: str,
+        progress_callback: Optional[ProgressCallback],
+        throttle: Optional[Callable[[int], float]],
+        connections: int,
+    ) -> _Job:
+        done = self._load_done(tmpfilename, total) if os.path.exists(tmpfilename) else []
+        job = _Job(total, done, filename, tmpfilename, progress_callback, throttle)
+        disk = _Disk()
+        fd = os.open(tmpfilename, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            if not done:
+                await disk.run(_preallocate, fd, total)
+            workers = [
+                asyncio.create_task(self._segment_worker(session, url, headers, fd, disk, job, connections))
+                for _ in range(connections)
+            ]
+            try:
+                finished, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            for w in finished:
+                if w.exception() is not None:
+                    raise w.exception()
+            if job.holes:
+                raise aiohttp.ClientPayloadError("Download ended with missing segments")
+        finally:
+            if job.holes:
+                disk.submit(self._save_done, tmpfilename + ".segments", job.total, list(job.done))
+            await disk.finish(os.close, fd)
+        return job
+
+    async def _segment_worker(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        fd: int,
+        disk: _Disk,
+        job: _Job,
+        connections: int,
+    ) -> None:
+        size = self.min_segment
+        while True:
+            # Keep the tail balanced: no segment bigger than a fair share of what's left
+            fair = max(self.min_segment, job.remaining() // connections)
+            segment = job.next_segment(min(size, fair))
+            if segment is None:
+                return
+            start, end = segment
+            began = time.monotonic()
+            await self._fetch_range(session, url, headers, fd, disk, job, start, end)
+            now = time.monotonic()
+            if now - job.saved_at >= SAVE_INTERVAL:
+                job.saved_at = now
+                await disk.run(self._save_done, job.tmpfilename + ".segments", job.total, list(job.done))
+            elapsed = now - began
+            rate = (end - start) / elapsed if elapsed > 0 else self.max_segment
+            size = int(min(self.max_segment, max(self.min_segment, rate * self.target_seconds)))
+
+    async def _fetch_range(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        fd: int,
+        disk: _Disk,
+        job: _Job,
+        start: int,
+        end: int,
+    ) -> None:
+        """Fetch [start, end) into ``fd``, retrying from where it broke off.
+
+        However it ends (done, failed, cancelled or paused), the bytes that
+        arrived are recorded as done and the rest goes back to the holes, so
+        a resumed download continues from the exact byte.
+        """
+        pos = start
+        attempt = 0
+        try:
+            while pos < end:
+                try:
+                    async with session.get(url, headers={**headers, "Range": f"bytes={pos}-{end - 1}"}) as resp:
+                        if resp.status == 200:
+                            raise _RangeNotSupported()
+                        resp.raise_for_status()
+                        async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                            chunk = chunk[:end - pos]
+                            # Counted once queued: it is written even if a
+                            # pause cancels this task while waiting for it
+                            write = disk.run(_write_at, fd, chunk, pos)
+                            pos += len(chunk)
+                            try:
+                                await write
+                            except OSError:
+                                pos -= len(chunk)
+                                raise
+                            await job.advance(len(chunk))
+                            if pos >= end:
+                                break
+                    if pos < end:
+                        raise aiohttp.ClientPayloadError(f"Connection closed at byte {pos} of segment ending at {end}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status < 500 and e.status != 429:
+                        raise
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise
+                    logging.debug(f"Segment {pos}-{end} failed ({e}); retry {attempt}")
+                    await asyncio.sleep(min(4.0, 0.25 * 2 ** attempt))
+        finally:
+            if pos > start:
+                job.completed(start, pos)
+            if pos < end:
+                job.give_back(pos, end)
+
+    async def _fetch_single(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        total: Optional[int],
+        filename: str,
+        tmpfilename: str,
+        progress_callback: Optional[ProgressCallback],
+        throttle: Optional[Callable[[int], float]],
+    ) -> _Job:
+        async with session.get(url, headers=headers) as resp:
+            resp.raise_for_status()
+            return await self._stream(resp, total or resp.content_length, filename, tmpfilename, progress_callback, throttle)
+
+    @staticmethod
+    async def _stream(
+        resp: aiohttp.ClientResponse,
+        total: Optional[int],
+        filename: str,
+        tmpfilename: str,
+        progress_callback: Optional[ProgressCallback],
+        throttle: Optional[Callable[[int], float]],
+    ) -> _Job:
+        """Write a whole-file response to ``tmpfilename``.
+
+        Only used when ranges can't be asked for, so there is nothing to
+        resume from: an interrupted download starts again at byte 0.
+        """
+        job = _Job(total or 0, [], filename, tmpfilename, progress_callback, throttle)
+        disk = _Disk()
+        f = open(tmpfilename, "wb")
+        try:
+            async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                await disk.run(f.write, chunk)
+                await job.advance(len(chunk))
+        finally:
+            await disk.finish(f.close)
+        if not job.total:
+            job.total = job.downloaded
+        return job
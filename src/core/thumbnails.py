@@ -0,0 +1,204 @@
+"""Small preview images for the download and history lists.
+
+``ThumbnailStore`` fetches the thumbnail named in a task's extracted info,
+decodes and downscales it with Pillow and keeps the result as a small JPEG
+in a directory trimmed to ``max_bytes`` by least-recent use. Its calls
+block and are meant for worker threads (see ``gui.thumbnail_loader``): the
+full-size image only ever exists there.
+
+Pillow is imported on first use, like yt-dlp, to stay off startup.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from utils.database import db_path
+
+
+PREVIEW_SIZE = (128, 72)  # fits 16:9 sources exactly; 2x the list's row height
+MAX_SOURCE_BYTES = 8 * 1024 * 1024
+FETCH_TIMEOUT = 10  # seconds
+USER_AGENT = "Mozilla/5.0 (compatible; VidFetch)"
+
+
+def cache_dir() -> Path:
+    return db_path().with_name("thumbnails")
+
+
+def best_thumbnail(info: Dict[str, Any]) -> Optional[str]:
+    """URL of the image to preview an info dict with, or None.
+
+    Prefers the smallest listed thumbnail that still covers ``PREVIEW_SIZE``
+    (less to download and decode than the full-size "thumbnail").
+    """
+    thumbs = [
+        t for t in info.get("thumbnails") or ()
+        if isinstance(t, dict) and str(t.get("url", "")).startswith(("http://", "https://"))
+    ]
+    large_enough = [t for t in thumbs if (t.get("width") or 0) >= PREVIEW_SIZE[0]]
+    if large_enough:
+        return min(large_enough, key=lambda t: t["width"])["url"]
+    url = info.get("thumbnail")
+    if isinstance(url, str) and url.startswith(("http://", "https://")):
+        return url
+    # yt-dlp lists thumbnails from worst to best
+    return thumbs[-1]["url"] if thumbs else None
+
+
+def shrink(data: bytes, size: Tuple[int, int] = PREVIEW_SIZE) -> bytes:
+    """Decode an image and re-encode it as a JPEG no larger than ``size``."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEGs decode straight at 1/2..1/8 scale, never at full size
+        img.draft("RGB", size)
+        img.thumbnail(size)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+
+class ThumbnailStore:
+    """Downscaled previews on disk, keyed by source URL. Thread-safe.
+
+    The directory is indexed on first use (oldest access first, from file
+    mtimes, which hits refresh) and trimmed after each write, so it stays
+    near ``max_bytes`` however many rows the history has.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: int = 100 * 1024 * 1024,
+        size: Tuple[int, int] = PREVIEW_SIZE,
+    ) -> None:
+        self.path = path or cache_dir()
+        self.max_bytes = max_bytes
+        self.size = size
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None  # file name -> bytes, LRU first
+        self._total = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _name(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".jpg"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            files = []
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.name.endswith(".jpg") and entry.is_file():
+                        st = entry.stat()
+                        files.append((st.st_mtime, entry.name, st.st_size))
+            files.sort()
+            self._index = OrderedDict((name, size) for _, name, size in files)
+            self._total = sum(self._index.values())
+        return self._index
+
+    def cached(self, url: str) -> Optional[str]:
+        """Path of the preview for ``url`` if it is on disk."""
+        name = self._name(url)
+        with self._lock:
+            index = self._load_index()
+            if name not in index:
+                return None
+            index.move_to_end(name)
+        path = self.path / name
+        try:
+            os.utime(path)  # recency survives restarts
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)
+            return None
+        return str(path)
+
+    def get(self, url: str) -> Optional[str]:
+        """Path of the preview for ``url``, fetching and shrinking it first
+        if needed; None if the image can't be had."""
+        path = self.cached(url)
+        if path is not None:
+            self.hits += 1
+            return path
+        self.misses += 1
+        try:
+            data = shrink(self._fetch(url), self.size)
+        except Exception as e:
+            # Previews are cosmetic: dead links and odd formats are common
+            logging.debug(f"No thumbnail from {url}: {e}")
+            return None
+        return self._put(self._name(url), data)
+
+    @staticmethod
+    def _fetch(url: str) -> bytes:
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as r:
+            data = r.read(MAX_SOURCE_BYTES + 1)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError("image too large")
+        return data
+
+    def _put(self, name: str, data: bytes) -> Optional[str]:
+        path = self.path / name
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error(f"Cannot write thumbnail {path}: {e}")
+            return None
+        with self._lock:
+            index = self._load_index()
+            self._total += len(data) - index.get(name, 0)
+            index[name] = len(data)
+            index.move_to_end(name)
+            self._evict()
+            if name not in index:
+                return None  # bigger than the whole budget
+        return str(path)
+
+    def _forget(self, name: str) -> None:
+        size = self._index.pop(name, None) if self._index is not None else None
+        if size is not None:
+            self._total -= size
+
+    def _evict(self) -> None:
+        index = self._load_index()
+        while index and self._total > self.max_bytes:
+            name, size = index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path / name)
+            except FileNotFoundError:
+                pass
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._index or ()),
+                "bytes": self._total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
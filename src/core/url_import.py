@@ -0,0 +1,113 @@
+"""Reading URL lists: plain text, CSV and JSON lines, streamed line by line.
+
+``read_urls`` yields raw entries lazily, so a file of any size can be
+piped into ``DownloadEngine.add_tasks`` without being loaded first;
+``clean_url`` is what ``add_tasks`` uses to reject entries that are not
+URLs.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import os
+import sys
+from typing import IO, Iterator, Optional
+from urllib.parse import urlsplit
+
+
+FORMATS = ("txt", "csv", "jsonl")
+# Column / key holding the URL in CSV and JSON-lines files
+URL_FIELDS = ("url", "link", "webpage_url", "href")
+
+
+def clean_url(text: str) -> Optional[str]:
+    """``text`` as a URL to queue, or None if it isn't one.
+
+    Bare "host/path" gets https://; other schemes are kept, since yt-dlp
+    also takes pseudo-URLs such as "ytsearch5:query".
+    """
+    url = text.strip()
+    if not url or any(c.isspace() for c in url):
+        return None
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme in ("http", "https"):
+        return url if parts.netloc else None
+    if not parts.scheme:
+        host = url.split("/", 1)[0]
+        return "https://" + url if "." in host and not host.startswith(".") else None
+    return url
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return "txt"
+
+
+def read_urls(path: str, fmt: Optional[str] = None) -> Iterator[str]:
+    """Entries of a URL list file ('-' for stdin), one at a time.
+
+    ``fmt`` is one of ``FORMATS``, by default guessed from the extension.
+    Text files have one URL per line (blank lines and # comments are
+    skipped); CSV files a "url" column, or the URL in the first column if
+    there is no such header; JSON-lines files a string or an object with a
+    "url" key per line.
+    """
+    fmt = fmt or ("txt" if path == "-" else detect_format(path))
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown URL list format: {fmt}")
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        yield from {"txt": _read_text, "csv": _read_csv, "jsonl": _read_jsonl}[fmt](f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _read_text(f: IO[str]) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def _read_csv(f: IO[str]) -> Iterator[str]:
+    rows = csv.reader(f)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = [h.strip().lower() for h in header]
+    column = next((names.index(n) for n in URL_FIELDS if n in names), None)
+    if column is None:
+        # No header: the first row is data
+        column = 0
+        if header and header[0].strip():
+            yield header[0].strip()
+    for row in rows:
+        if len(row) > column and row[column].strip():
+            yield row[column].strip()
+
+
+def _read_jsonl(f: IO[str]) -> Iterator[str]:
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            logging.warning(f"Line {n}: not JSON, skipped")
+            continue
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            url = next((item[k] for k in URL_FIELDS if isinstance(item.get(k), str)), None)
+            if url:
+                yield url
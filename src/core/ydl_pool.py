@@ -0,0 +1,137 @@
+"""Pool of warm ``YoutubeDL`` instances keyed by an options fingerprint."""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .downloader import DownloadCancelled
+
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def fingerprint(opts: Dict[str, Any]) -> str:
+    """Stable key for an options dict; hooks are installed by the pool."""
+    clean = {k: v for k, v in opts.items() if k != "progress_hooks"}
+    return json.dumps(clean, sort_keys=True, default=repr)
+
+
+class _PooledYDL:
+    """A ``YoutubeDL`` whose single progress hook forwards to the current lessee."""
+
+    __slots__ = ("ydl", "callback")
+
+    def __init__(self, opts: Dict[str, Any]) -> None:
+        self.callback: Optional[ProgressCallback] = None
+        opts = dict(opts)
+        opts["progress_hooks"] = [self._hook]
+        import yt_dlp  # deferred with core.downloader's
+        self.ydl = yt_dlp.YoutubeDL(opts)
+
+    def _hook(self, d: Dict[str, Any]) -> None:
+        cb = self.callback
+        if cb is None:
+            return
+        try:
+            cb(d)
+        except DownloadCancelled:
+            raise
+        except Exception:
+            # Do not allow hook exceptions to break downloads
+            pass
+
+    def reset(self) -> None:
+        """Clear per-download counters so the next task starts clean."""
+        self.callback = None
+        ydl = self.ydl
+        for attr in ("_num_downloads", "_download_retcode"):
+            if hasattr(ydl, attr):
+                setattr(ydl, attr, 0)
+
+    def close(self) -> None:
+        try:
+            self.ydl.close()
+        except Exception as e:
+            logging.debug(f"Closing pooled YoutubeDL failed: {e}")
+
+
+class YDLPool:
+    """Leases ``YoutubeDL`` instances so consecutive tasks reuse them.
+
+    Reuse keeps extractor instances initialised and keeps the HTTP request
+    director (keep-alive connections, cookie jar) alive between downloads
+    from the same site. Each lease is exclusive; an instance whose task
+    raised is closed instead of being returned, in case it was left in a
+    bad state.
+    """
+
+    def __init__(self, max_idle_per_key: int = 4, max_keys: int = 8) -> None:
+        self.max_idle_per_key = max_idle_per_key
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[str, List[_PooledYDL]]" = OrderedDict()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def lease(self, opts: Dict[str, Any], progress_callback: Optional[ProgressCallback] = None) -> Iterator[Any]:
+        key = fingerprint(opts)
+        entry = self._acquire(key)
+        if entry is None:
+            entry = _PooledYDL(opts)
+            with self._lock:
+                self.created += 1
+        entry.callback = progress_callback
+        try:
+            yield entry.ydl
+        except BaseException:
+            entry.close()
+            raise
+        else:
+            self._release(key, entry)
+
+    def _acquire(self, key: str) -> Optional[_PooledYDL]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if not idle:
+                return None
+            self._idle.move_to_end(key)
+            self.reused += 1
+            return idle.pop()
+
+    def _release(self, key: str, entry: _PooledYDL) -> None:
+        entry.reset()
+        evicted: List[_PooledYDL] = []
+        with self._lock:
+            if self._closed:
+                evicted.append(entry)
+            else:
+                idle = self._idle.setdefault(key, [])
+                self._idle.move_to_end(key)
+                if len(idle) < self.max_idle_per_key:
+                    idle.append(entry)
+                else:
+                    evicted.append(entry)
+                while len(self._idle) > self.max_keys:
+                    _, old = self._idle.popitem(last=False)
+                    evicted.extend(old)
+        for e in evicted:
+            e.close()
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._idle.values())
+
+    def close(self) -> None:
+        """Close idle instances; leased ones are closed when returned."""
+        with self._lock:
+            self._closed = True
+            entries = [e for idle in self._idle.values() for e in idle]
+            self._idle.clear()
+        for e in entries:
+            e.close()
@@ -0,0 +1,259 @@
+"""Model/view download list that only pays for visible rows."""
+from __future__ import annotations
+
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QPoint, QRect, QSize, Qt, QTimer
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtWidgets import (
+    QApplication,
+    QStyle,
+    QStyledItemDelegate,
+    QStyleOptionProgressBar,
+    QStyleOptionViewItem,
+)
+
+if TYPE_CHECKING:
+    from gui.thumbnail_loader import ThumbnailLoader
+
+
+# Custom roles; UserRole keeps carrying the task id as the old list did.
+TaskIdRole = Qt.ItemDataRole.UserRole
+StatusRole = Qt.ItemDataRole.UserRole + 1
+PercentRole = Qt.ItemDataRole.UserRole + 2
+
+
+class _Row:
+    __slots__ = ("task_id", "url", "title", "thumbnail", "status", "percent", "message")
+
+    def __init__(self, task_id: str, url: str) -> None:
+        self.task_id = task_id
+        self.url = url
+        self.title = ""
+        self.thumbnail = ""
+        self.status = "Queued"
+        self.percent = 0
+        self.message: Optional[str] = None
+
+
+class DownloadListModel(QAbstractListModel):
+    """Flat list of download rows keyed by task id.
+
+    Rows added in quick succession are buffered and inserted with a single
+    ``beginInsertRows`` on the next event-loop turn, and batched status
+    updates are reported as one ``dataChanged`` range.
+
+    Only the last ``max_finished`` rows passed to ``mark_finished`` are
+    kept; older ones are removed in batches, so a long session's list
+    stays bounded.
+
+    With a ``ThumbnailLoader``, rows whose task reported a thumbnail (see
+    ``set_info``) get a preview as their DecorationRole, loaded when the
+    row is first painted.
+    """
+
+    def __init__(self, parent=None, max_finished: int = 500, thumbnails: Optional["ThumbnailLoader"] = None) -> None:
+        super().__init__(parent)
+        self._rows: List[_Row] = []
+        self._index: Dict[str, int] = {}
+        self._pending: List[_Row] = []
+        self.max_finished = max_finished
+        self._finished: Deque[str] = deque()
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(0)
+        self._flush_timer.timeout.connect(self._flush_pending)
+        self._thumbnails = thumbnails
+        self._by_thumbnail: Dict[str, str] = {}  # thumbnail url -> task id
+        if thumbnails is not None:
+            thumbnails.ready.connect(self._on_thumbnail_ready)
+
+    # --- Qt model API ---
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row.title or row.url
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._thumbnails.image(row.thumbnail) if self._thumbnails and row.thumbnail else None
+        if role == TaskIdRole:
+            return row.task_id
+        if role == StatusRole:
+            return row.status
+        if role == PercentRole:
+            return row.percent
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return row.message or (f"{row.title}\n{row.url}" if row.title else row.url)
+        return None
+
+    # --- Mutation helpers ---
+
+    def add_task(self, task_id: str, url: str) -> None:
+        self._pending.append(_Row(task_id, url))
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def add_tasks(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Add (task_id, url) rows, e.g. one ``tasks_added`` batch."""
+        self._pending.extend(_Row(task_id, url) for task_id, url in pairs)
+        if self._pending and not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        first = len(self._rows)
+        last = first + len(self._pending) - 1
+        self.beginInsertRows(QModelIndex(), first, last)
+        for offset, row in enumerate(self._pending):
+            self._index[row.task_id] = first + offset
+            self._rows.append(row)
+        self._pending = []
+        self.endInsertRows()
+
+    def set_info(self, task_id: str, title: str, thumbnail: str = "") -> None:
+        """Show a task's real title and thumbnail once it has been extracted."""
+        self._flush_pending()
+        i = self._index.get(task_id)
+        if i is None:
+            return
+        row = self._rows[i]
+        row.title = title
+        row.thumbnail = thumbnail
+        if thumbnail:
+            self._by_thumbnail[thumbnail] = task_id
+        self.dataChanged.emit(self.index(i), self.index(i), [
+            Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.DecorationRole, Qt.ItemDataRole.ToolTipRole,
+        ])
+
+    def _on_thumbnail_ready(self, url: str) -> None:
+        i = self._index.get(self._by_thumbnail.get(url, ""))
+        if i is not None:
+            self.dataChanged.emit(self.index(i), self.index(i), [Qt.ItemDataRole.DecorationRole])
+
+    def set_status(self, task_id: str, status: str, percent: int, message: Optional[str] = None) -> None:
+        self.update_many([(task_id, status, percent, message)])
+
+    def update_many(self, updates: Iterable[Tuple[str, str, int, Optional[str]]]) -> None:
+        """Apply (task_id, status, percent, message) updates, then emit one range."""
+        self._flush_pending()
+        lo = hi = -1
+        for task_id, status, percent, message in updates:
+            i = self._index.get(task_id)
+            if i is None:
+                continue
+            row = self._rows[i]
+            row.status = status
+            row.percent = percent
+            row.message = message
+            lo = i if lo < 0 else min(lo, i)
+            hi = max(hi, i)
+        if lo >= 0:
+            self.dataChanged.emit(
+                self.index(lo), self.index(hi),
+                [StatusRole, PercentRole, Qt.ItemDataRole.ToolTipRole],
+            )
+
+
+    def mark_finished(self, task_id: str) -> None:
+        """Make a row eligible for removal once enough newer ones finish."""
+        self._finished.append(task_id)
+        # Let some slack build up so removal (and re-indexing) is amortized
+        if len(self._finished) > self.max_finished + max(16, self.max_finished // 8):
+            self._prune()
+
+    def set_max_finished(self, n: int) -> None:
+        self.max_finished = max(0, n)
+        if len(self._finished) > self.max_finished:
+            self._prune()
+
+    def _prune(self) -> None:
+        self._flush_pending()
+        drop = set()
+        while len(self._finished) > self.max_finished:
+            drop.add(self._finished.popleft())
+        rows = sorted((self._index[t] for t in drop if t in self._index), reverse=True)
+        # Remove runs of adjacent rows bottom-up, so earlier indexes stay valid
+        i = 0
+        while i < len(rows):
+            last = first = rows[i]
+            i += 1
+            while i < len(rows) and rows[i] == first - 1:
+                first = rows[i]
+                i += 1
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for row in self._rows[first:last + 1]:
+                self._by_thumbnail.pop(row.thumbnail, None)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        self._index = {row.task_id: i for i, row in enumerate(self._rows)}
+
+
+class DownloadItemDelegate(QStyledItemDelegate):
+    """Paints a row as: [thumbnail] title | status | progress bar, with no
+    child widgets. Rows are taller when ``thumbnails`` is set."""
+
+    STATUS_WIDTH = 120
+    BAR_WIDTH = 80
+    MARGIN = 5
+    THUMB_SIZE = QSize(64, 36)
+
+    def __init__(self, parent=None, thumbnails: bool = False) -> None:
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        height = option.fontMetrics.height() + 4
+        if self.thumbnails:
+            height = max(height, self.THUMB_SIZE.height())
+        return QSize(200, height + 2 * self.MARGIN)
+
+    def paint(self, painter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawPrimitive(QStyle.PrimitiveElement.PE_PanelItemViewItem, option, painter, option.widget)
+
+        r = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        if self.thumbnails:
+            thumb_rect = QRect(QPoint(), self.THUMB_SIZE)
+            thumb_rect.moveCenter(QPoint(r.left() + self.THUMB_SIZE.width() // 2, r.center().y()))
+            image = index.data(Qt.ItemDataRole.DecorationRole)
+            if isinstance(image, QImage) and not image.isNull():
+                size = image.deviceIndependentSize().toSize().scaled(self.THUMB_SIZE, Qt.AspectRatioMode.KeepAspectRatio)
+                target = QRect(QPoint(), size)
+                target.moveCenter(thumb_rect.center())
+                painter.save()
+                painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+                painter.drawImage(target, image)
+                painter.restore()
+            r.setLeft(thumb_rect.right() + 1 + self.MARGIN)
+        bar_rect = QRect(r.right() - self.BAR_WIDTH, r.top(), self.BAR_WIDTH, r.height())
+        status_rect = QRect(bar_rect.left() - self.MARGIN - self.STATUS_WIDTH, r.top(), self.STATUS_WIDTH, r.height())
+        title_rect = QRect(r.left(), r.top(), status_rect.left() - self.MARGIN - r.left(), r.height())
+
+        selected = bool(option.state & QStyle.StateFlag.State_Selected)
+        painter.save()
+        if selected:
+            painter.setPen(option.palette.highlightedText().color())
+        fm = option.fontMetrics
+        align = Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft
+        title = index.data(Qt.ItemDataRole.DisplayRole) or ""
+        status = index.data(StatusRole) or ""
+        painter.drawText(title_rect, align, fm.elidedText(title, Qt.TextElideMode.ElideRight, title_rect.width()))
+        painter.drawText(status_rect, align, fm.elidedText(status, Qt.TextElideMode.ElideRight, status_rect.width()))
+        painter.restore()
+
+        bar = QStyleOptionProgressBar()
+        bar.rect = bar_rect
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = int(index.data(PercentRole) or 0)
+        bar.text = f"{bar.progress}%"
+        bar.textVisible = True
+        bar.state = QStyle.StateFlag.State_Enabled | QStyle.StateFlag.State_Horizontal
+        style.drawControl(QStyle.ControlElement.CE_ProgressBar, bar, painter, option.widget)
@@ -0,0 +1,170 @@
+"""Lazily paged table model over the history database."""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import (
+    QAbstractTableModel,
+    QModelIndex,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    Qt,
+    pyqtSignal,
+)
+
+from utils.database import search_history
+
+if TYPE_CHECKING:
+    from gui.thumbnail_loader import ThumbnailLoader
+
+
+COLUMNS = [("Date", "created_at"), ("Status", "status"), ("URL", "url"), ("Title", "title")]
+TITLE_COLUMN = 3
+
+
+class _PageSignals(QObject):
+    loaded = pyqtSignal(int, list)  # generation, rows
+
+
+class _PageQuery(QRunnable):
+    """Runs one ``search_history`` page on the thread pool."""
+
+    def __init__(self, signals: _PageSignals, generation: int, query: str, limit: int, **page: Any) -> None:
+        super().__init__()
+        self._signals = signals
+        self._generation = generation
+        self._query = query
+        self._limit = limit
+        self._page = page  # sort and cursor, see search_history
+
+    def run(self) -> None:
+        try:
+            rows = search_history(self._query, limit=self._limit, **self._page)
+        except Exception as e:
+            logging.error(f"History query failed: {e}")
+            rows = []
+        self._signals.loaded.emit(self._generation, rows)
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """History rows, fetched a page at a time as the view scrolls.
+
+    Queries run on ``QThreadPool``; results from a superseded query (the
+    search text or sort order changed meanwhile) are dropped by comparing
+    generations. Sorting by a column re-queries in that order, so paging
+    keeps working on sorted lists.
+
+    With a ``ThumbnailLoader``, the title cell of rows that have a
+    ``thumbnail_url`` shows its preview, loaded when the cell is painted.
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, parent=None, thumbnails: Optional["ThumbnailLoader"] = None) -> None:
+        super().__init__(parent)
+        self._rows: List[Dict[str, Any]] = []
+        self._query = ""
+        self._sort: Optional[str] = None  # None: newest first
+        self._descending = True
+        self._generation = 0
+        self._loading = False
+        self._exhausted = False
+        self._signals = _PageSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        self._pool = QThreadPool.globalInstance()
+        self._thumbnails = thumbnails
+        self._by_thumbnail: Dict[str, int] = {}  # thumbnail url -> row
+        if thumbnails is not None:
+            thumbnails.ready.connect(self._on_thumbnail_ready)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DecorationRole and index.column() == TITLE_COLUMN and self._thumbnails:
+            return self._thumbnails.image(self._rows[index.row()].get("thumbnail_url"))
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        value = self._rows[index.row()].get(COLUMNS[index.column()][1])
+        if index.column() == 1 and not value:
+            return "Unknown"
+        return "" if value is None else str(value)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid() or self._loading or self._exhausted:
+            return
+        page: Dict[str, Any] = {}
+        if self._sort is None:
+            page["before_id"] = self._rows[-1]["id"] if self._rows else None
+        else:
+            page.update(sort=self._sort, descending=self._descending, after=self._cursor())
+        self._loading = True
+        self._pool.start(_PageQuery(self._signals, self._generation, self._query, self.PAGE_SIZE, **page))
+
+    def _cursor(self) -> Optional[Tuple[str, int]]:
+        if not self._rows:
+            return None
+        last = self._rows[-1]
+        return last.get(self._sort) or "", last["id"]
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder) -> None:
+        """Order by ``column``; the database sorts, one page at a time."""
+        descending = order == Qt.SortOrder.DescendingOrder
+        key = COLUMNS[column][1]
+        # Newest first is insertion order, which needs no sort column
+        sort = None if key == "created_at" and descending else key
+        if (sort, descending) == (self._sort, self._descending):
+            return
+        self._sort, self._descending = sort, descending
+        self.reload()
+
+    def set_query(self, query: str) -> None:
+        """Restart from the first page with a new search filter."""
+        self._query = query
+        self.reload()
+
+    def reload(self) -> None:
+        self.beginResetModel()
+        self._generation += 1
+        self._rows = []
+        self._by_thumbnail = {}
+        self._loading = False
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def _on_loaded(self, generation: int, rows: list) -> None:
+        if generation != self._generation:
+            return
+        self._loading = False
+        if len(rows) < self.PAGE_SIZE:
+            self._exhausted = True
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            for i, row in enumerate(rows, first):
+                if row.get("thumbnail_url"):
+                    self._by_thumbnail[row["thumbnail_url"]] = i
+            self.endInsertRows()
+
+    def _on_thumbnail_ready(self, url: str) -> None:
+        i = self._by_thumbnail.get(url)
+        if i is not None:
+            index = self.index(i, TITLE_COLUMN)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
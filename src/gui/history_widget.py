@@ -1,22 +1,28 @@
 """Widget for displaying download history."""
-from typing import List, Dict, Any
-
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QTableView,
     QPushButton, QHBoxLayout, QHeaderView, QLineEdit
 )
 
-from utils.database import get_history
+from gui.history_model import HistoryTableModel
 
 
 class HistoryWidget(QWidget):
-    def __init__(self, parent=None):
+    SEARCH_DEBOUNCE_MS = 250
+
+    def __init__(self, parent=None, thumbnails=None):
+        """``thumbnails`` is an optional ``ThumbnailLoader`` for title previews."""
         super().__init__(parent)
-        self._history_data = []  # Cache data for filtering
+        self.model = HistoryTableModel(self, thumbnails)
+        self._show_thumbnails = thumbnails is not None
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self._search_timer.timeout.connect(self._run_search)
         self._build_ui()
-        self.refresh()
+        # The first query runs when the tab is first shown, not at startup
 
     def _build_ui(self) -> None:
         layout = QVBoxLayout(self)
@@ -35,45 +41,28 @@ class HistoryWidget(QWidget):
 
         layout.addLayout(toolbar)
 
-        # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Date", "Status", "URL", "Title"])
-        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        # Table; rows are paged in by the model as the view scrolls
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().hide()
+        # Fixed sizes: content-based sizing would measure every loaded row
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        if self._show_thumbnails:
+            self.table.verticalHeader().setDefaultSectionSize(42)
+        self.table.setColumnWidth(0, 150)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        # Click a header to sort; newest first (the model's order) until then
+        self.table.horizontalHeader().setSortIndicator(0, Qt.SortOrder.DescendingOrder)
+        self.table.setSortingEnabled(True)
         layout.addWidget(self.table)
 
     def refresh(self) -> None:
         """Reload history from database."""
-        self._history_data = get_history(limit=100)
-        self._update_table(self._history_data)
+        self.model.set_query(self.search_input.text())
 
     def _on_search_changed(self, text: str) -> None:
-        """Filter the displayed history."""
-        text = text.lower()
-        if not text:
-            self._update_table(self._history_data)
-            return
-
-        filtered = [
-            row for row in self._history_data
-            if text in row["title"].lower() or text in row["url"].lower()
-        ]
-        self._update_table(filtered)
+        """Restart the debounce timer; the query runs once typing pauses."""
+        self._search_timer.start()
 
-    def _update_table(self, data: List[Dict[str, Any]]) -> None:
-        self.table.setRowCount(len(data))
-        self.table.setSortingEnabled(False) # Disable sorting while updating
-
-        for row_idx, item in enumerate(data):
-            date_str = str(item["created_at"])
-            status = item["status"] or "Unknown"
-            url = item["url"]
-            title = item["title"] or ""
-
-            self.table.setItem(row_idx, 0, QTableWidgetItem(date_str))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(status))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(url))
-            self.table.setItem(row_idx, 3, QTableWidgetItem(title))
-
-        self.table.setSortingEnabled(True)
+    def _run_search(self) -> None:
+        self.model.set_query(self.search_input.text())
@@ -1,5 +1,7 @@
 """Main window with queue management, progress tracking, and settings."""
 import asyncio
+import logging
+import threading
 from pathlib import Path
 from typing import Dict, Optional
 
@@ -9,8 +11,8 @@ from PyQt6.QtWidgets import (
     QHBoxLayout,
     QLabel,
     QLineEdit,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
+    QAbstractItemView,
     QPushButton,
     QSpinBox,
     QTabWidget,
@@ -26,49 +28,27 @@ from PyQt6.QtWidgets import (
     QSystemTrayIcon,
     QMenu,
     QStyle,
+    QStatusBar,
 )
 from PyQt6.QtGui import QAction, QIcon
 
+from core.options import task_options
 from core.queue_manager import QueueManager
+from core.thumbnails import ThumbnailStore
+from core.url_import import read_urls
+from gui.download_model import DownloadItemDelegate, DownloadListModel, TaskIdRole
 from gui.history_widget import HistoryWidget
+from gui.stats_widget import StatsWidget
+from gui.thumbnail_loader import ThumbnailLoader
 from utils.config import load_settings, save_settings
 
 
-class DownloadItemWidget(QWidget):
-    """Compact row showing one download's progress."""
-
-    def __init__(self, url: str, parent=None):
-        super().__init__(parent)
-        self.url = url
-        self.status = "queued"
-        self.percent = 0
-
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-
-        # Show title or URL
-        self.title_label = QLabel(self._truncate(url, 50))
-        layout.addWidget(self.title_label, stretch=1)
-
-        # Status badge
-        self.status_label = QLabel("Queued")
-        self.status_label.setMaximumWidth(120)  # Increased for error msgs
-        layout.addWidget(self.status_label)
-
-        # Percent
-        self.percent_label = QLabel("0%")
-        self.percent_label.setMaximumWidth(40)
-        layout.addWidget(self.percent_label)
-
-    def set_status(self, status: str, percent: int = 0) -> None:
-        self.status = status
-        self.percent = percent
-        self.status_label.setText(status)
-        self.percent_label.setText(f"{percent}%")
-
-    @staticmethod
-    def _truncate(s: str, n: int) -> str:
-        return s if len(s) <= n else s[: n - 3] + "..."
+SCHEDULING_POLICIES = [
+    ("fifo", "First In, First Out"),
+    ("priority", "Priority"),
+    ("sjf", "Smallest First"),
+    ("round_robin", "Round-Robin by Host"),
+]
 
 
 class SettingsDialog(QDialog):
@@ -118,6 +98,108 @@ class SettingsDialog(QDialog):
         qual_layout.addStretch()
         layout.addLayout(qual_layout)
 
+        # Scheduling
+        sched_layout = QHBoxLayout()
+        sched_layout.addWidget(QLabel("Scheduling:"))
+        self.policy_combo = QComboBox()
+        for key, label in SCHEDULING_POLICIES:
+            self.policy_combo.addItem(label, key)
+        idx = self.policy_combo.findData(self.settings.scheduling_policy)
+        if idx >= 0:
+            self.policy_combo.setCurrentIndex(idx)
+        sched_layout.addWidget(self.policy_combo)
+        sched_layout.addWidget(QLabel("Max per Host:"))
+        self.host_limit_spin = QSpinBox()
+        self.host_limit_spin.setMinimum(0)
+        self.host_limit_spin.setMaximum(10)
+        self.host_limit_spin.setSpecialValueText("Unlimited")
+        self.host_limit_spin.setValue(self.settings.per_host_limit)
+        sched_layout.addWidget(self.host_limit_spin)
+        sched_layout.addStretch()
+        layout.addLayout(sched_layout)
+
+        # Execution backend
+        backend_layout = QHBoxLayout()
+        backend_layout.addWidget(QLabel("Run Downloads In:"))
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItem("Threads", "thread")
+        self.backend_combo.addItem("Worker Processes", "process")
+        idx = self.backend_combo.findData(self.settings.execution_backend)
+        if idx >= 0:
+            self.backend_combo.setCurrentIndex(idx)
+        backend_layout.addWidget(self.backend_combo)
+        backend_layout.addStretch()
+        layout.addLayout(backend_layout)
+
+        # Connections per file
+        conn_layout = QHBoxLayout()
+        conn_layout.addWidget(QLabel("Connections per File:"))
+        self.connections_spin = QSpinBox()
+        self.connections_spin.setMinimum(1)
+        self.connections_spin.setMaximum(16)
+        self.connections_spin.setValue(self.settings.download_connections)
+        self.connections_spin.setToolTip("Parallel range requests for direct HTTP downloads")
+        conn_layout.addWidget(self.connections_spin)
+        conn_layout.addWidget(QLabel("Retries:"))
+        self.retries_spin = QSpinBox()
+        self.retries_spin.setRange(0, 20)
+        self.retries_spin.setSpecialValueText("Off")
+        self.retries_spin.setValue(self.settings.max_retries)
+        self.retries_spin.setToolTip("Times a download is retried after a timeout, server error or rate limit")
+        conn_layout.addWidget(self.retries_spin)
+        conn_layout.addStretch()
+        layout.addLayout(conn_layout)
+
+        # Bandwidth limits (KiB/s, 0 = unlimited)
+        rate_layout = QHBoxLayout()
+        rate_layout.addWidget(QLabel("Bandwidth Limit (KiB/s):"))
+        self.rate_spin = self._rate_spin(self.settings.rate_limit_kib)
+        rate_layout.addWidget(self.rate_spin)
+        rate_layout.addWidget(QLabel("Per Download:"))
+        self.task_rate_spin = self._rate_spin(self.settings.per_task_rate_limit_kib)
+        rate_layout.addWidget(self.task_rate_spin)
+        rate_layout.addWidget(QLabel("Per Site:"))
+        self.host_rate_spin = self._rate_spin(self.settings.per_host_rate_limit_kib)
+        rate_layout.addWidget(self.host_rate_spin)
+        rate_layout.addStretch()
+        layout.addLayout(rate_layout)
+
+        # Finished downloads kept in the list (the rest are in History)
+        kept_layout = QHBoxLayout()
+        kept_layout.addWidget(QLabel("Finished Downloads Listed:"))
+        self.kept_spin = QSpinBox()
+        self.kept_spin.setRange(0, 100_000)
+        self.kept_spin.setSingleStep(100)
+        self.kept_spin.setValue(self.settings.finished_tasks_kept)
+        self.kept_spin.setToolTip("Older finished downloads are removed from the list; History keeps them")
+        kept_layout.addWidget(self.kept_spin)
+        kept_layout.addWidget(QLabel("Thumbnail Cache (MB):"))
+        self.thumb_cache_spin = QSpinBox()
+        self.thumb_cache_spin.setRange(0, 10_000)
+        self.thumb_cache_spin.setSingleStep(50)
+        self.thumb_cache_spin.setSpecialValueText("No Thumbnails")
+        self.thumb_cache_spin.setValue(self.settings.thumbnail_cache_mb)
+        self.thumb_cache_spin.setToolTip("Disk space for list previews; the least recently shown are removed first")
+        kept_layout.addWidget(self.thumb_cache_spin)
+        kept_layout.addStretch()
+        layout.addLayout(kept_layout)
+
+        # Metrics export for Prometheus (port and/or textfile)
+        metrics_layout = QHBoxLayout()
+        metrics_layout.addWidget(QLabel("Metrics Port:"))
+        self.metrics_port_spin = QSpinBox()
+        self.metrics_port_spin.setRange(0, 65535)
+        self.metrics_port_spin.setSpecialValueText("Off")
+        self.metrics_port_spin.setValue(self.settings.metrics_port)
+        self.metrics_port_spin.setToolTip("Serve /metrics on 127.0.0.1 at this port")
+        metrics_layout.addWidget(self.metrics_port_spin)
+        metrics_layout.addWidget(QLabel("File:"))
+        self.metrics_file_input = QLineEdit(self.settings.metrics_file)
+        self.metrics_file_input.setPlaceholderText("Off")
+        self.metrics_file_input.setToolTip("Rewrite metrics to this file every 15 seconds")
+        metrics_layout.addWidget(self.metrics_file_input)
+        layout.addLayout(metrics_layout)
+
         # Minimize to tray
         self.tray_chk = QCheckBox("Minimize to Tray on Close")
         self.tray_chk.setChecked(self.settings.minimize_to_tray)
@@ -136,6 +218,15 @@ class SettingsDialog(QDialog):
         btn_layout.addWidget(close_btn)
         layout.addLayout(btn_layout)
 
+    @staticmethod
+    def _rate_spin(value: int) -> QSpinBox:
+        spin = QSpinBox()
+        spin.setRange(0, 10_000_000)
+        spin.setSingleStep(128)
+        spin.setSpecialValueText("Unlimited")
+        spin.setValue(value)
+        return spin
+
     def _on_browse(self) -> None:
         d = QFileDialog.getExistingDirectory(self, "Select Download Directory")
         if d:
@@ -146,6 +237,18 @@ class SettingsDialog(QDialog):
         self.settings.parallel_downloads = self.parallel_spin.value()
         self.settings.default_quality = self.quality_combo.currentText()
         self.settings.minimize_to_tray = self.tray_chk.isChecked()
+        self.settings.scheduling_policy = self.policy_combo.currentData()
+        self.settings.per_host_limit = self.host_limit_spin.value()
+        self.settings.execution_backend = self.backend_combo.currentData()
+        self.settings.download_connections = self.connections_spin.value()
+        self.settings.max_retries = self.retries_spin.value()
+        self.settings.rate_limit_kib = self.rate_spin.value()
+        self.settings.per_task_rate_limit_kib = self.task_rate_spin.value()
+        self.settings.per_host_rate_limit_kib = self.host_rate_spin.value()
+        self.settings.finished_tasks_kept = self.kept_spin.value()
+        self.settings.thumbnail_cache_mb = self.thumb_cache_spin.value()
+        self.settings.metrics_port = self.metrics_port_spin.value()
+        self.settings.metrics_file = self.metrics_file_input.text().strip()
         save_settings(self.settings)
         self.accept()
 
@@ -157,17 +260,38 @@ class MainWindow(QWidget):
         self.resize(900, 600)
 
         self.settings = load_settings()
-        # Map Task ID -> Widget
-        self._downloads: Dict[str, DownloadItemWidget] = {}
+        self.thumbnails = ThumbnailLoader(ThumbnailStore(max_bytes=self.settings.thumbnail_cache_mb * 1024 * 1024), self)
+        self.download_model = DownloadListModel(
+            self, max_finished=self.settings.finished_tasks_kept, thumbnails=self.thumbnails,
+        )
         
         # Initialize QueueManager
-        self.qm = QueueManager(concurrency=self.settings.parallel_downloads)
+        self.qm = QueueManager(
+            concurrency=self.settings.parallel_downloads,
+            progress_hz=self.settings.progress_hz,
+            policy=self.settings.scheduling_policy,
+            per_host_limit=self.settings.per_host_limit,
+            backend=self.settings.execution_backend,
+            connections=self.settings.download_connections,
+            rate_limit=self.settings.rate_limit_kib * 1024,
+            per_task_rate_limit=self.settings.per_task_rate_limit_kib * 1024,
+            per_host_rate_limit=self.settings.per_host_rate_limit_kib * 1024,
+            metrics_port=self.settings.metrics_port,
+            metrics_file=self.settings.metrics_file,
+            keep_finished=self.settings.finished_tasks_kept,
+            max_retries=self.settings.max_retries,
+        )
         self.qm.task_added.connect(self._on_task_added)
+        self.qm.tasks_added.connect(self.download_model.add_tasks)
         self.qm.task_updated.connect(self._on_task_updated)
+        self.qm.task_info.connect(self._on_task_info)
+        self.qm.progress_batch.connect(self._on_progress_batch)
         self.qm.task_completed.connect(self._on_task_completed)
         self.qm.task_error.connect(self._on_task_error)
-        
-        self.qm.start()
+        self.qm.task_skipped.connect(self._on_task_skipped)
+        self._skipped = 0
+        # The queue is started by main.finish_startup once the history has
+        # been reconciled; tasks added before then wait in the queue
 
         self._build_ui()
         self._setup_tray()
@@ -224,6 +348,8 @@ class MainWindow(QWidget):
         main_layout = QVBoxLayout(self)
         self.tabs = QTabWidget()
         main_layout.addWidget(self.tabs)
+        self.status_bar = QStatusBar()
+        main_layout.addWidget(self.status_bar)
 
         # Tab 1: Downloader
         downloader_tab = QWidget()
@@ -231,8 +357,12 @@ class MainWindow(QWidget):
         self.tabs.addTab(downloader_tab, "Downloader")
 
         # Tab 2: History
-        self.history_tab = HistoryWidget()
+        self.history_tab = HistoryWidget(thumbnails=self.thumbnails)
         self.tabs.addTab(self.history_tab, "History")
+
+        # Tab 3: Stats (polls the engine only while shown)
+        self.stats_tab = StatsWidget(self.qm.metrics_snapshot)
+        self.tabs.addTab(self.stats_tab, "Stats")
         
         # Refresh history when tab is selected
         self.tabs.currentChanged.connect(self._on_tab_changed)
@@ -281,13 +411,23 @@ class MainWindow(QWidget):
         add_batch_btn = QPushButton("Add All to Queue")
         add_batch_btn.clicked.connect(self._on_batch_clicked)
         batch_btn_layout.addWidget(add_batch_btn)
+        import_btn = QPushButton("Import File...")
+        import_btn.setToolTip("Queue the URLs in a text, CSV or JSON-lines file")
+        import_btn.clicked.connect(self._on_import_clicked)
+        batch_btn_layout.addWidget(import_btn)
         batch_btn_layout.addStretch()
         layout.addLayout(batch_btn_layout)
 
         # Downloads list
         layout.addWidget(QLabel("Downloads:"))
-        self.download_list = QListWidget()
-        self.download_list.itemSelectionChanged.connect(self._on_selection_changed)
+        self.download_list = QListView()
+        self.download_list.setModel(self.download_model)
+        self.download_delegate = DownloadItemDelegate(self.download_list, thumbnails=self.thumbnails.enabled)
+        self.download_list.setItemDelegate(self.download_delegate)
+        # Uniform rows let the view skip per-row size queries on large queues
+        self.download_list.setUniformItemSizes(True)
+        self.download_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.download_list.selectionModel().selectionChanged.connect(self._on_selection_changed)
         layout.addWidget(self.download_list)
 
         # Control buttons
@@ -301,6 +441,16 @@ class MainWindow(QWidget):
         self.resume_btn.clicked.connect(self._on_resume_clicked)
         ctrl_layout.addWidget(self.resume_btn)
 
+        self.pause_sel_btn = QPushButton("Pause Selected")
+        self.pause_sel_btn.setEnabled(False)
+        self.pause_sel_btn.clicked.connect(lambda: self._for_selected(self.qm.pause_task))
+        ctrl_layout.addWidget(self.pause_sel_btn)
+
+        self.resume_sel_btn = QPushButton("Resume Selected")
+        self.resume_sel_btn.setEnabled(False)
+        self.resume_sel_btn.clicked.connect(lambda: self._for_selected(self.qm.resume_task))
+        ctrl_layout.addWidget(self.resume_sel_btn)
+
         self.cancel_btn = QPushButton("Cancel Selected")
         self.cancel_btn.setEnabled(False)
         self.cancel_btn.clicked.connect(self._on_cancel_clicked)
@@ -319,8 +469,10 @@ class MainWindow(QWidget):
             self.history_tab.refresh()
 
     def _on_selection_changed(self) -> None:
-        has_selection = len(self.download_list.selectedItems()) > 0
+        has_selection = self.download_list.selectionModel().hasSelection()
         self.cancel_btn.setEnabled(has_selection)
+        self.pause_sel_btn.setEnabled(has_selection)
+        self.resume_sel_btn.setEnabled(has_selection)
         
     def _on_pause_clicked(self) -> None:
         self.qm.pause()
@@ -335,21 +487,24 @@ class MainWindow(QWidget):
         self.pause_btn.setText("Pause Queue")
 
     def _on_cancel_clicked(self) -> None:
-        items = self.download_list.selectedItems()
-        if not items:
-            return
-        
-        for item in items:
-            task_id = item.data(Qt.ItemDataRole.UserRole)
+        self._for_selected(self.qm.cancel_task)
+
+    def _for_selected(self, action) -> None:
+        """Call ``action(task_id)`` for every selected download."""
+        for index in self.download_list.selectionModel().selectedIndexes():
+            task_id = index.data(TaskIdRole)
             if task_id:
-                self.qm.cancel_task(task_id)
+                action(task_id)
 
     def _on_download_clicked(self) -> None:
         url = self.url_input.text().strip()
         if not url:
             return
 
-        self._add_download(url)
+        self._skipped = 0
+        # Even one URL is checked against history (and, the first time,
+        # waits for yt-dlp's extractor table): keep that off the GUI thread
+        self._add_in_background([url])
         self.url_input.clear()
 
     def _on_batch_clicked(self) -> None:
@@ -358,72 +513,81 @@ class MainWindow(QWidget):
             return
 
         urls = [u.strip() for u in batch_text.split("\n") if u.strip()]
-        for url in urls:
-            self._add_download(url)
-
+        self._skipped = 0
+        self._add_in_background(urls)
         self.batch_input.clear()
 
-    def _add_download(self, url: str) -> None:
+    def _on_import_clicked(self) -> None:
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import URL List", "",
+            "URL lists (*.txt *.csv *.jsonl *.ndjson);;All files (*)",
+        )
+        if not path:
+            return
+        self._skipped = 0
+        self.status_bar.showMessage(f"Importing {Path(path).name}...", 5000)
+        self._add_in_background(read_urls(path))
+
+    def _add_in_background(self, urls) -> None:
+        """Queue ``urls`` from a worker thread; rows arrive through ``tasks_added``."""
+        opts = self._task_options()
+
+        def run() -> None:
+            try:
+                self.qm.add_tasks(urls, opts)
+            except (OSError, ValueError) as e:
+                logging.error(f"URL import failed: {e}")
+
+        threading.Thread(target=run, name="vidfetch-import", daemon=True).start()
+
+    def _task_options(self) -> dict:
         # Build yt-dlp options based on UI
-        ytdlp_opts = {}
-        
-        if self.audio_only_chk.isChecked():
-            ytdlp_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            })
-        else:
-            # Video quality logic could go here
-            pass
-            
-        if self.subs_chk.isChecked():
-            ytdlp_opts.update({
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'subtitleslangs': ['en', 'all'], # Default to English/Auto
-            })
-            
-        if self.thumb_chk.isChecked():
-            ytdlp_opts['writethumbnail'] = True
-
-        # Pass settings to the task
-        opts = {
-            "out_dir": self.settings.download_dir,
-            "quality": self.settings.default_quality,
-            "ytdlp_opts": ytdlp_opts
-        }
-        self.qm.add_task(url, opts)
+        return task_options(
+            self.settings.download_dir,
+            self.settings.default_quality,
+            audio_only=self.audio_only_chk.isChecked(),
+            subtitles=self.subs_chk.isChecked(),
+            thumbnail=self.thumb_chk.isChecked(),
+        )
 
     # --- Signal Handlers ---
 
     def _on_task_added(self, task_id: str, url: str) -> None:
-        widget = DownloadItemWidget(url, self)
-        item = QListWidgetItem()
-        item.setSizeHint(widget.sizeHint())
-        item.setData(Qt.ItemDataRole.UserRole, task_id)
-        self.download_list.addItem(item)
-        self.download_list.setItemWidget(item, widget)
-
-        self._downloads[task_id] = widget
+        self.download_model.add_task(task_id, url)
 
     def _on_task_updated(self, task_id: str, status: str, percent: int, data: dict) -> None:
-        if task_id in self._downloads:
-            self._downloads[task_id].set_status(status, percent)
+        message = None
+        if "total" in data:
+            # Playlist parent: show how far through its entries we are
+            status = f"{status} {data['done'] + data['failed']}/{data['total']}"
+        elif status == "retrying":
+            status = f"Retry {data['attempt']} in {data['delay']:.0f}s"
+            message = data["error"]
+        self.download_model.set_status(task_id, status, percent, message)
+
+    def _on_task_info(self, task_id: str, info: dict) -> None:
+        self.download_model.set_info(task_id, info["title"], info["thumbnail"])
+
+    def _on_progress_batch(self, updates: list) -> None:
+        self.download_model.update_many(
+            (u.task_id, u.status, u.percent, None) for u in updates
+        )
 
     def _on_task_completed(self, task_id: str) -> None:
-        if task_id in self._downloads:
-            self._downloads[task_id].set_status("Completed", 100)
+        self.download_model.set_status(task_id, "Completed", 100)
+        self.download_model.mark_finished(task_id)
 
     def _on_task_error(self, task_id: str, msg: str) -> None:
-        if task_id in self._downloads:
-            # Truncate error message if too long
-            short_msg = (msg[:25] + '..') if len(msg) > 25 else msg
-            self._downloads[task_id].set_status(f"Error: {short_msg}", 0)
-            self._downloads[task_id].setToolTip(msg)
+        # Truncate error message if too long; full text goes in the tooltip
+        short_msg = (msg[:25] + '..') if len(msg) > 25 else msg
+        self.download_model.set_status(task_id, f"Error: {short_msg}", 0, msg)
+        self.download_model.mark_finished(task_id)
+
+    def _on_task_skipped(self, url: str, existing_id: str, reason: str) -> None:
+        self._skipped += 1
+        self.status_bar.showMessage(
+            f"Skipped {self._skipped} URL(s), last: {url} ({reason})", 8000
+        )
 
     def _on_settings(self) -> None:
         dialog = SettingsDialog(self)
@@ -431,3 +595,19 @@ class MainWindow(QWidget):
             self.settings = load_settings()
             # Update concurrency on the fly
             self.qm.update_concurrency(self.settings.parallel_downloads)
+            self.qm.update_scheduling(self.settings.scheduling_policy, self.settings.per_host_limit)
+            self.qm.update_backend(self.settings.execution_backend)
+            self.qm.update_connections(self.settings.download_connections)
+            self.qm.update_retries(self.settings.max_retries)
+            self.qm.update_bandwidth(
+                self.settings.rate_limit_kib * 1024,
+                self.settings.per_task_rate_limit_kib * 1024,
+                self.settings.per_host_rate_limit_kib * 1024,
+            )
+            self.qm.update_metrics_export(self.settings.metrics_port, self.settings.metrics_file)
+            self.qm.update_retention(self.settings.finished_tasks_kept)
+            self.download_model.set_max_finished(self.settings.finished_tasks_kept)
+            self.thumbnails.set_max_bytes(self.settings.thumbnail_cache_mb * 1024 * 1024)
+            if self.download_delegate.thumbnails != self.thumbnails.enabled:
+                self.download_delegate.thumbnails = self.thumbnails.enabled
+                self.download_list.doItemsLayout()
@@ -0,0 +1,126 @@
+"""Widget showing live queue metrics and where finished tasks spent their time."""
+from typing import Any, Callable, Dict
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QGroupBox,
+    QLabel, QTableWidget, QTableWidgetItem, QHeaderView
+)
+
+
+# Gauge name -> row label
+GAUGES = [
+    ("vidfetch_queue_depth", "Queued"),
+    ("vidfetch_active_consumers", "Downloading"),
+    ("vidfetch_consumers", "Consumers"),
+    ("vidfetch_post_queue_depth", "Waiting for conversion"),
+    ("vidfetch_download_speed_bytes_per_second", "Speed"),
+    ("vidfetch_open_circuit_breakers", "Sites backed off"),
+]
+PHASES = ["queue_wait", "extraction", "transfer", "post_wait", "post_processing", "db", "total"]
+
+
+def _size(n: float) -> str:
+    if n < 1024:
+        return f"{n:.0f} B"
+    for unit in ("KiB", "MiB"):
+        n /= 1024
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+    return f"{n / 1024:.1f} GiB"
+
+
+class StatsWidget(QWidget):
+    REFRESH_MS = 1000
+
+    def __init__(self, source: Callable[[], Dict[str, Any]], parent=None):
+        """``source`` returns a ``Metrics.snapshot()``-shaped dict."""
+        super().__init__(parent)
+        self._source = source
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self._build_ui()
+
+    def _build_ui(self) -> None:
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+
+        live = QGroupBox("Now")
+        live_form = QFormLayout(live)
+        self._gauge_labels = {}
+        for name, label in GAUGES:
+            self._gauge_labels[name] = QLabel("-")
+            live_form.addRow(label + ":", self._gauge_labels[name])
+        top.addWidget(live)
+
+        totals = QGroupBox("Finished Tasks")
+        totals_form = QFormLayout(totals)
+        self._total_labels = {}
+        for outcome in ("completed", "error", "cancelled"):
+            self._total_labels[outcome] = QLabel("0")
+            totals_form.addRow(outcome.capitalize() + ":", self._total_labels[outcome])
+        self._bytes_label = QLabel("0 B")
+        totals_form.addRow("Downloaded:", self._bytes_label)
+        self._retries_label = QLabel("0")
+        totals_form.addRow("Retries:", self._retries_label)
+        top.addWidget(totals)
+        layout.addLayout(top)
+
+        self.phase_table = self._table(["Phase", "Mean (s)"])
+        self.phase_table.setRowCount(len(PHASES))
+        for row, phase in enumerate(PHASES):
+            self.phase_table.setItem(row, 0, QTableWidgetItem(phase.replace("_", " ")))
+            self.phase_table.setItem(row, 1, QTableWidgetItem("-"))
+        self.extractor_table = self._table(["Extractor", "Error Rate"])
+        tables = QHBoxLayout()
+        tables.addWidget(self.phase_table)
+        tables.addWidget(self.extractor_table)
+        layout.addLayout(tables)
+
+    @staticmethod
+    def _table(headers) -> QTableWidget:
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.verticalHeader().hide()
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        return table
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh()
+        self._timer.start()
+
+    def hideEvent(self, event) -> None:
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self) -> None:
+        snap = self._source()
+        gauges = snap["gauges"]
+        for name, label in self._gauge_labels.items():
+            value = gauges.get(name)
+            if value is None:
+                label.setText("-")
+            elif name.endswith("bytes_per_second"):
+                label.setText(_size(value) + "/s")
+            else:
+                label.setText(f"{value:g}")
+        for outcome, label in self._total_labels.items():
+            label.setText(f"{snap['tasks'].get(outcome, 0):g}")
+        self._bytes_label.setText(_size(snap["bytes"]))
+        retries = snap.get("retries", {})
+        self._retries_label.setText(f"{sum(retries.values()):g}")
+        self._retries_label.setToolTip(", ".join(f"{kind.replace('_', ' ')}: {n:g}" for kind, n in sorted(retries.items())))
+
+        means = snap["mean_phase_seconds"]
+        for row, phase in enumerate(PHASES):
+            mean = means.get(phase)
+            self.phase_table.item(row, 1).setText("-" if mean is None else f"{mean:.2f}")
+
+        rates = sorted(snap["error_rate_by_extractor"].items())
+        self.extractor_table.setRowCount(len(rates))
+        for row, (extractor, rate) in enumerate(rates):
+            self.extractor_table.setItem(row, 0, QTableWidgetItem(extractor))
+            self.extractor_table.setItem(row, 1, QTableWidgetItem(f"{rate:.0%}"))
@@ -0,0 +1,118 @@
+"""Loads row thumbnails on a thread pool, only for rows that get painted."""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from core.thumbnails import ThumbnailStore
+
+
+class _LoadSignals(QObject):
+    loaded = pyqtSignal(str, QImage)  # source url, preview (null if unavailable)
+
+
+class _Load(QRunnable):
+    """Fetches, downscales and decodes one preview off the GUI thread."""
+
+    def __init__(self, signals: _LoadSignals, store: ThumbnailStore, url: str) -> None:
+        super().__init__()
+        self._signals = signals
+        self._store = store
+        self._url = url
+
+    def run(self) -> None:
+        path = self._store.get(self._url)
+        image = QImage(path) if path else QImage()
+        # Stored at twice the size rows show them at: lay out at half, sharp on HiDPI
+        image.setDevicePixelRatio(2.0)
+        self._signals.loaded.emit(self._url, image)
+
+
+class ThumbnailLoader(QObject):
+    """Previews for the models' DecorationRole.
+
+    ``image(url)`` answers from a small in-memory cache or returns None and
+    queues a load; ``ready`` is emitted once it is available. Views only ask
+    for rows they paint, so only visible rows are loaded. When scrolling
+    outpaces the workers, the newest requests go first and the oldest are
+    dropped. A preview that could not be loaded is not asked for again
+    until ``RETRY_FAILED`` seconds have passed.
+    """
+
+    ready = pyqtSignal(str)  # source url
+
+    MAX_WORKERS = 3
+    MAX_WAITING = 64
+    MEMORY_ENTRIES = 400
+    FAILED_ENTRIES = 400
+    RETRY_FAILED = 300.0  # seconds
+
+    def __init__(self, store: ThumbnailStore, parent=None) -> None:
+        super().__init__(parent)
+        self.store = store
+        self.enabled = store.max_bytes > 0
+        self._memory: "OrderedDict[str, QImage]" = OrderedDict()
+        self._waiting: "OrderedDict[str, None]" = OrderedDict()
+        self._running: Set[str] = set()
+        self._failed: "OrderedDict[str, float]" = OrderedDict()  # url -> when, oldest first
+        self._signals = _LoadSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(self.MAX_WORKERS)
+
+    def image(self, url: Optional[str]) -> Optional[QImage]:
+        if not url or not self.enabled:
+            return None
+        image = self._memory.get(url)
+        if image is not None:
+            self._memory.move_to_end(url)
+            return image
+        if url not in self._running and not self._failed_recently(url):
+            self._waiting[url] = None
+            self._waiting.move_to_end(url)
+            while len(self._waiting) > self.MAX_WAITING:
+                self._waiting.popitem(last=False)  # scrolled past long ago
+            self._start_next()
+        return None
+
+    def _failed_recently(self, url: str) -> bool:
+        failed_at = self._failed.get(url)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < self.RETRY_FAILED:
+            return True
+        del self._failed[url]
+        return False
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """Resize the disk cache; 0 turns thumbnails off and empties it."""
+        self.enabled = max_bytes > 0
+        if not self.enabled:
+            self._waiting.clear()
+            self._memory.clear()
+        self._pool.start(lambda: self.store.set_max_bytes(max_bytes))
+
+    def _start_next(self) -> None:
+        while self._waiting and len(self._running) < self.MAX_WORKERS:
+            url, _ = self._waiting.popitem()  # newest first: what is on screen now
+            self._running.add(url)
+            self._pool.start(_Load(self._signals, self.store, url))
+
+    def _on_loaded(self, url: str, image: QImage) -> None:
+        self._running.discard(url)
+        if image.isNull():
+            self._failed[url] = time.monotonic()
+            self._failed.move_to_end(url)
+            while len(self._failed) > self.FAILED_ENTRIES:
+                self._failed.popitem(last=False)
+        elif self.enabled:
+            self._memory[url] = image
+            while len(self._memory) > self.MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        self._start_next()
+        if not image.isNull():
+            self.ready.emit(url)
@@ -1,23 +1,65 @@
-"""Entry point for VidFetch - launches the PyQt6 GUI."""
+"""Entry point for VidFetch - launches the PyQt6 GUI.
+
+Only what the window needs is done before it is shown. yt-dlp, aiohttp and
+ffmpeg are imported by the download engine's thread or on first use, the
+history tab queries the database when first opened, and the database and
+queue journal are brought up on a worker thread once the window is shown;
+the download queue starts after them.
+Set VIDFETCH_STARTUP_REPORT=1 to print how long each phase took.
+"""
+import logging
 import sys
+import threading
 from pathlib import Path
 
-from PyQt6.QtWidgets import QApplication
-
 # Add src to path so relative imports work
 SRC = Path(__file__).parent
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
+from utils.startup import StartupTimer
+
+timer = StartupTimer()
+
+from PyQt6.QtWidgets import QApplication
+
 from gui.main_window import MainWindow
-from utils.database import init_db
+from utils.database import init_db, reconcile_interrupted
+
+timer.mark("imports")
+
+
+def finish_startup(window: MainWindow) -> None:
+    """Bring up the database, resume the journaled queue, then start it.
+
+    Runs on a worker thread: restoring works out each journaled task's
+    media identity, which on first use waits about a second for yt-dlp's
+    extractor table. Restored rows reach the window through the queue's
+    signals. Downloads added in the window meanwhile stay queued until the
+    queue starts, so none of them is in the history yet to be mistaken for
+    a previous run's.
+    """
+    try:
+        init_db()
+        # Rows a crashed or force-quit run left as "downloading"
+        stale = reconcile_interrupted()
+        restored = window.qm.restore()
+        if stale or restored:
+            logging.info(f"Marked {stale} interrupted download(s); resumed {restored} queued task(s)")
+    finally:
+        window.qm.start()
+    timer.mark("database + journal")
+    timer.emit()
 
 
 def main() -> None:
-    init_db()
     app = QApplication(sys.argv)
+    timer.mark("QApplication")
     window = MainWindow()
+    timer.mark("main window")
     window.show()
+    timer.mark("shown")
+    threading.Thread(target=finish_startup, args=(window,), name="vidfetch-startup", daemon=True).start()
     sys.exit(app.exec())
 
 
@@ -14,6 +14,19 @@ class Settings:
     parallel_downloads: int = 2
     default_quality: str = "1080p"
     minimize_to_tray: bool = False
+    progress_hz: float = 10.0
+    scheduling_policy: str = "fifo"  # fifo | priority | sjf | round_robin
+    per_host_limit: int = 0  # 0 = unlimited
+    execution_backend: str = "thread"  # thread | process
+    download_connections: int = 4  # parallel Range requests per direct-HTTP file; 1 = off
+    rate_limit_kib: int = 0  # total KiB/s across all downloads; 0 = unlimited
+    per_task_rate_limit_kib: int = 0
+    per_host_rate_limit_kib: int = 0
+    max_retries: int = 4  # retries of a download that failed with a transient error; 0 = off
+    finished_tasks_kept: int = 500  # finished downloads kept in memory and in the list
+    metrics_port: int = 0  # serve Prometheus metrics on 127.0.0.1:<port>; 0 = off
+    metrics_file: str = ""  # also rewrite them to this file every 15 s; "" = off
+    thumbnail_cache_mb: int = 100  # disk kept for list previews; 0 = no thumbnails
 
 
 def config_path() -> Path:
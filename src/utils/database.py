@@ -1,72 +1,618 @@
-"""Simple sqlite3-based history storage."""
+"""sqlite3-based history storage with a single batched writer.
+
+All writes go through one long-lived WAL-mode connection owned by a
+``HistoryWriter`` thread. Callers enqueue statements from any thread (or
+``await`` them from asyncio code) and the writer commits them in groups, so
+a burst of status updates costs one fsync instead of one per row. Reads use
+per-thread connections, which WAL lets run alongside the writer.
+"""
 from __future__ import annotations
 
+import asyncio
+import atexit
+import json
+import logging
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from .config import config_path
 
 
+# Group commit: a batch is committed once it holds this many statements or
+# once the oldest statement in it has waited this long, whichever is first.
+BATCH_MAX_ROWS = 500
+BATCH_MAX_DELAY = 0.05  # seconds
+
+
+def _create_fts(conn: sqlite3.Connection) -> None:
+    """Full-text index over title and URL, kept in sync by triggers.
+
+    The trigram tokenizer gives substring matching like the old in-memory
+    filter did; older SQLite builds fall back to word tokens, and builds
+    without FTS5 at all are left to the LIKE path in ``search_history``.
+    """
+    for tokenizer in ("trigram", "unicode61"):
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE downloads_fts USING fts5("
+                f"title, url, content='downloads', content_rowid='id', tokenize='{tokenizer}')"
+            )
+            break
+        except sqlite3.OperationalError as e:
+            if "no such module" in str(e):
+                return
+    else:
+        return
+    _run_script(
+        conn,
+        """
+        CREATE TRIGGER downloads_fts_ai AFTER INSERT ON downloads BEGIN
+            INSERT INTO downloads_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+        END;
+        CREATE TRIGGER downloads_fts_ad AFTER DELETE ON downloads BEGIN
+            INSERT INTO downloads_fts(downloads_fts, rowid, title, url)
+            VALUES ('delete', old.id, old.title, old.url);
+        END;
+        CREATE TRIGGER downloads_fts_au AFTER UPDATE OF title, url ON downloads BEGIN
+            INSERT INTO downloads_fts(downloads_fts, rowid, title, url)
+            VALUES ('delete', old.id, old.title, old.url);
+            INSERT INTO downloads_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+        END;
+        INSERT INTO downloads_fts(downloads_fts) VALUES ('rebuild');
+        """
+    )
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is either a SQL script or a callable taking the connection; it
+# runs in one transaction with its user_version bump, so it must not commit
+# (no executescript).
+_MIGRATIONS: List[Union[str, Callable[[sqlite3.Connection], None]]] = [
+    """
+    CREATE TABLE IF NOT EXISTS downloads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT NOT NULL,
+        title TEXT,
+        status TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_downloads_created_at ON downloads(created_at, id);
+    """,
+    _create_fts,
+    # Identity of the media (see core.canonical) for duplicate suppression
+    """
+    ALTER TABLE downloads ADD COLUMN canonical_id TEXT;
+    CREATE INDEX IF NOT EXISTS idx_downloads_canonical ON downloads(canonical_id, status);
+    """,
+    # Durable copy of the download queue; a row lives from add until the
+    # task finishes, so a crash or forced quit can be resumed
+    """
+    CREATE TABLE IF NOT EXISTS queue_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id TEXT NOT NULL UNIQUE,
+        url TEXT NOT NULL,
+        options TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        size_hint INTEGER,
+        canonical_id TEXT,
+        parent_id TEXT,
+        db_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'queued',
+        downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+        total_bytes INTEGER,
+        filename TEXT
+    );
+    """,
+    # Where a finished download ended up, so the engine can forget the task
+    """
+    ALTER TABLE downloads ADD COLUMN file_path TEXT;
+    """,
+    # Preview image named in the extracted info (see core.thumbnails)
+    """
+    ALTER TABLE downloads ADD COLUMN thumbnail_url TEXT;
+    """,
+    # History sorted by another column pages through these (see search_history)
+    """
+    CREATE INDEX IF NOT EXISTS idx_downloads_status_sort ON downloads(COALESCE(status, ''), id);
+    CREATE INDEX IF NOT EXISTS idx_downloads_url_sort ON downloads(COALESCE(url, ''), id);
+    CREATE INDEX IF NOT EXISTS idx_downloads_title_sort ON downloads(COALESCE(title, ''), id);
+    """,
+]
+
+# Columns ``search_history`` can sort by besides newest first
+SORT_COLUMNS = ("created_at", "status", "url", "title")
+
+
 def db_path() -> Path:
     p = config_path().with_name("vidfetch.db")
     return p
 
 
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL only fsyncs at checkpoints; a power cut can lose the last
+    # few commits but never corrupts the database.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _run_script(conn: sqlite3.Connection, script: str) -> None:
+    """Run ``script`` statement by statement, inside the caller's
+    transaction (``executescript`` would commit first)."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for i, step in enumerate(_MIGRATIONS[version:], start=version + 1):
+        # A crash mid-step must not leave it half applied, to fail when it
+        # runs again (e.g. "duplicate column")
+        conn.execute("BEGIN")
+        try:
+            if callable(step):
+                step(conn)
+            else:
+                _run_script(conn, step)
+            conn.execute(f"PRAGMA user_version = {i}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+class _Write:
+    __slots__ = ("sql", "params", "many", "future", "queued_at")
+
+    def __init__(self, sql: str, params: Any, many: bool) -> None:
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class HistoryWriter:
+    """Single owner of the write connection, committing in groups.
+
+    ``submit`` returns a ``concurrent.futures.Future`` resolved with the
+    statement's ``lastrowid`` (or ``rowcount`` for updates) once the batch
+    containing it has been committed.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_rows: int = BATCH_MAX_ROWS,
+        max_delay: float = BATCH_MAX_DELAY,
+    ) -> None:
+        self.path = path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="vidfetch-db-writer", daemon=True)
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+        # Counters, read by the GUI/metrics without locking.
+        self.rows_written = 0
+        self.commits = 0
+
+    def start(self) -> None:
+        """Open the connection, apply migrations and start the writer thread."""
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, sql: str, params: Sequence[Any] = (), many: bool = False) -> Future:
+        """Queue a statement; ``many=True`` runs it with ``executemany``."""
+        w = _Write(sql, params, many)
+        self._queue.put(w)
+        return w.future
+
+    async def execute(self, sql: str, params: Sequence[Any] = (), many: bool = False) -> int:
+        """Await a queued statement's commit without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(sql, params, many))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until everything submitted so far has been committed."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            conn = _connect(self.path)
+            _migrate(conn)
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            batch: List[_Write] = []
+            waiters: List[threading.Event] = []
+            deadline = None
+
+            # Collect a group: stop at max_rows, at the deadline of the first
+            # statement, or when a flush/close marker arrives.
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                if isinstance(item, tuple) and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = item.queued_at + self.max_delay
+                if len(batch) >= self.max_rows:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    continue
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._commit(conn, batch)
+            for ev in waiters:
+                ev.set()
+
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]) -> None:
+        results: List[Any] = []
+        for w in batch:
+            try:
+                if w.many:
+                    cur = conn.executemany(w.sql, w.params)
+                    results.append(cur.rowcount)
+                else:
+                    cur = conn.execute(w.sql, w.params)
+                    is_insert = w.sql.lstrip()[:6].upper() == "INSERT"
+                    results.append(cur.lastrowid if is_insert else cur.rowcount)
+            except (sqlite3.Error, ValueError, OverflowError) as e:
+                # A failed statement only rolls back itself; the rest of the
+                # group is still committed. Parameters that can't be bound
+                # (an int over 64 bits, a lone surrogate) raise the builtin
+                # errors and must not kill the writer thread either.
+                logging.error(f"History write failed: {e}")
+                results.append(e)
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"History commit failed: {e}")
+            conn.rollback()
+            results = [e] * len(batch)
+        else:
+            self.commits += 1
+            self.rows_written += len(batch)
+
+        for w, r in zip(batch, results):
+            if not w.future.set_running_or_notify_cancel():
+                # The awaiting task was cancelled (e.g. by engine.stop());
+                # the write still happened, there is just no one to tell
+                continue
+            if isinstance(r, BaseException):
+                w.future.set_exception(r)
+            else:
+                w.future.set_result(r)
+
+
+_writer: Optional[HistoryWriter] = None
+_writer_lock = threading.Lock()
+_readers = threading.local()
+_reader_conns: List[sqlite3.Connection] = []
+_generation = 0
+
+
+def get_writer() -> HistoryWriter:
+    """Return the process-wide writer, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            w = HistoryWriter(db_path())
+            w.start()
+            _writer = w
+        return _writer
+
+
+def close_db() -> None:
+    """Flush pending writes and close every connection."""
+    global _writer, _generation
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        for conn in _reader_conns:
+            conn.close()
+        _reader_conns.clear()
+        _generation += 1
+
+
+atexit.register(close_db)
+
+
+def _reader() -> sqlite3.Connection:
+    """Per-thread read connection to the current database."""
+    writer = get_writer()
+    conn = getattr(_readers, "conn", None)
+    if conn is None or getattr(_readers, "generation", None) != _generation:
+        conn = _connect(writer.path)
+        conn.row_factory = sqlite3.Row
+        _readers.conn = conn
+        _readers.generation = _generation
+        with _writer_lock:
+            _reader_conns.append(conn)
+    return conn
+
+
 def init_db() -> None:
-    p = db_path()
-    conn = sqlite3.connect(p)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS downloads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT NOT NULL,
-            title TEXT,
-            status TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
+    get_writer()
 
 
-def add_download(url: str, title: str, status: str) -> int:
+def add_download(url: str, title: str, status: str, canonical_id: Optional[str] = None) -> int:
     """Add a new download record."""
-    conn = sqlite3.connect(db_path())
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
-        (url, title, status)
-    )
-    d_id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    d_id = get_writer().submit(
+        "INSERT INTO downloads (url, title, status, canonical_id) VALUES (?, ?, ?, ?)",
+        (url, title, status, canonical_id)
+    ).result()
     return d_id if d_id else -1
 
 
-def update_download_status(download_id: int, status: str) -> None:
-    """Update status of a download."""
-    conn = sqlite3.connect(db_path())
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE downloads SET status = ? WHERE id = ?",
-        (status, download_id)
+def update_download_status(download_id: int, status: str, file_path: Optional[str] = None) -> None:
+    """Update status of a download, and the file it produced if given."""
+    get_writer().submit(*_status_update(download_id, status, file_path)).result()
+
+
+def _status_update(download_id: int, status: str, file_path: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+    if file_path is None:
+        return "UPDATE downloads SET status = ? WHERE id = ?", (status, download_id)
+    return "UPDATE downloads SET status = ?, file_path = ? WHERE id = ?", (status, file_path, download_id)
+
+
+def set_download_info(download_id: int, title: str, thumbnail_url: Optional[str]) -> Future:
+    """Record the title and thumbnail found by extraction."""
+    return get_writer().submit(
+        "UPDATE downloads SET title = ?, thumbnail_url = ? WHERE id = ?",
+        (title, thumbnail_url, download_id)
     )
-    conn.commit()
-    conn.close()
+
+
+async def add_download_async(url: str, title: str, status: str, canonical_id: Optional[str] = None) -> int:
+    """Async variant of ``add_download``; awaits the group commit."""
+    d_id = await get_writer().execute(
+        "INSERT INTO downloads (url, title, status, canonical_id) VALUES (?, ?, ?, ?)",
+        (url, title, status, canonical_id)
+    )
+    return d_id if d_id else -1
+
+
+async def update_download_status_async(download_id: int, status: str, file_path: Optional[str] = None) -> None:
+    """Async variant of ``update_download_status``."""
+    await get_writer().execute(*_status_update(download_id, status, file_path))
 
 
 def get_history(limit: int = 50) -> List[Dict[str, Any]]:
     """Retrieve recent download history."""
-    conn = sqlite3.connect(db_path())
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
+    cur = _reader().execute(
         "SELECT * FROM downloads ORDER BY created_at DESC LIMIT ?",
         (limit,)
     )
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
\ No newline at end of file
+    return [dict(row) for row in cur.fetchall()]
+
+
+def find_completed_many(canonical_ids: Sequence[str]) -> set:
+    """The subset of ``canonical_ids`` that have a completed download."""
+    found = set()
+    conn = _reader()
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(canonical_ids), 500):
+        chunk = canonical_ids[i:i + 500]
+        found.update(r[0] for r in conn.execute(
+            "SELECT DISTINCT canonical_id FROM downloads WHERE status = 'completed' "
+            f"AND canonical_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ))
+    return found
+
+
+def find_completed(canonical_id: str) -> Optional[Dict[str, Any]]:
+    """Most recent completed download of the same media, if any."""
+    row = _reader().execute(
+        "SELECT * FROM downloads WHERE canonical_id = ? AND status = 'completed' "
+        "ORDER BY id DESC LIMIT 1",
+        (canonical_id,)
+    ).fetchone()
+    return dict(row) if row is not None else None
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Quote user text as a single FTS5 phrase, or None if FTS can't serve it."""
+    text = text.strip()
+    if len(text) < 3:  # below the trigram length; use LIKE instead
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'downloads_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def search_history(
+    query: str = "",
+    before_id: Optional[int] = None,
+    limit: int = 200,
+    sort: Optional[str] = None,
+    descending: bool = True,
+    after: Optional[Tuple[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """Return one page of history, newest first, optionally filtered.
+
+    Pages are keyed on ``id`` (assigned in insertion order), so fetching the
+    next page is an index seek regardless of how deep the user has scrolled.
+    Pass the last row's id as ``before_id`` to continue.
+
+    ``sort`` orders by one of ``SORT_COLUMNS`` instead (NULL as ""), with
+    ``id`` breaking ties, ``descending`` or not. Those pages are keyed on
+    ``(value, id)``, each with its own index; pass the last row's pair as
+    ``after`` to continue.
+    """
+    if sort is not None and sort not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort history by {sort!r}")
+    conn = _reader()
+    query = query.strip()
+    match = _fts_query(query) if query else None
+    where: List[str] = []
+    params: List[Any] = []
+
+    if match is not None and _has_fts(conn):
+        source = "downloads_fts f JOIN downloads d ON d.id = f.rowid"
+        key = "f.rowid"
+        where.append("downloads_fts MATCH ?")
+        params.append(match)
+    else:
+        source = "downloads d"
+        key = "d.id"
+        if query:
+            like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(d.title LIKE ? ESCAPE '\\' OR d.url LIKE ? ESCAPE '\\')")
+            params += [like, like]
+
+    if sort is None:
+        order = f"{key} DESC"
+        if before_id is not None:
+            where.append(f"{key} < ?")
+            params.append(before_id)
+    else:
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        # The expressions the sort indexes are on; created_at is never NULL
+        value = "d.created_at" if sort == "created_at" else f"COALESCE(d.{sort}, '')"
+        order = f"{value} {direction}, {key} {direction}"
+        if after is not None:
+            # Spelled out rather than as a row value, which SQLite would
+            # scan the expression index for instead of seeking in it
+            where.append(f"{value} {op}= ? AND ({value} {op} ? OR {key} {op} ?)")
+            params += [after[0], after[0], after[1]]
+
+    sql = f"SELECT d.* FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+# --- Queue journal ---------------------------------------------------------
+# Journal writes are fire-and-forget: they ride the writer's group commit
+# and never block the caller.
+
+def journal_add(task_id: str, url: str, options: Dict[str, Any], priority: int,
+                size_hint: Optional[int] = None, canonical_id: Optional[str] = None,
+                parent_id: Optional[str] = None) -> Future:
+    """Record a newly queued task."""
+    return get_writer().submit(
+        "INSERT OR REPLACE INTO queue_journal "
+        "(task_id, url, options, priority, size_hint, canonical_id, parent_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (task_id, url, json.dumps(options, default=str), int(priority),
+         size_hint, canonical_id, parent_id)
+    )
+
+
+def journal_add_many(rows: Sequence[Tuple[str, str, str, int, Optional[int], Optional[str], Optional[str]]]) -> Future:
+    """Record many queued tasks in one statement (one commit).
+
+    Rows are (task_id, url, options as JSON, priority, size_hint,
+    canonical_id, parent_id).
+    """
+    return get_writer().submit(
+        "INSERT OR REPLACE INTO queue_journal "
+        "(task_id, url, options, priority, size_hint, canonical_id, parent_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        list(rows), many=True
+    )
+
+
+def journal_started(task_id: str, db_id: Optional[int], status: str = "running") -> Future:
+    return get_writer().submit(
+        "UPDATE queue_journal SET status = ?, db_id = ? WHERE task_id = ?",
+        (status, db_id, task_id)
+    )
+
+
+def journal_progress(rows: Sequence[Tuple[int, Optional[int], Optional[str], str]]) -> Future:
+    """Batch-update (downloaded_bytes, total_bytes, filename, task_id) rows."""
+    return get_writer().submit(
+        "UPDATE queue_journal SET downloaded_bytes = ?, total_bytes = ?, "
+        "filename = COALESCE(?, filename) WHERE task_id = ?",
+        list(rows), many=True
+    )
+
+
+def journal_remove(task_ids: Sequence[str]) -> Future:
+    return get_writer().submit(
+        "DELETE FROM queue_journal WHERE task_id = ?",
+        [(t,) for t in task_ids], many=True
+    )
+
+
+def load_journal() -> List[Dict[str, Any]]:
+    """Journaled tasks in the order they were queued, options decoded."""
+    get_writer().flush()
+    rows = []
+    for row in _reader().execute("SELECT * FROM queue_journal ORDER BY seq"):
+        row = dict(row)
+        try:
+            row["options"] = json.loads(row["options"])
+        except ValueError:
+            row["options"] = {}
+        rows.append(row)
+    return rows
+
+
+def reconcile_interrupted() -> int:
+    """Mark rows left "downloading" by a previous run as "interrupted".
+
+    Tasks that are resumed from the journal flip their row back to
+    "downloading" when they start again. Returns the number of rows fixed.
+    """
+    return get_writer().submit(
+        "UPDATE downloads SET status = 'interrupted' WHERE status = 'downloading'"
+    ).result()
@@ -0,0 +1,40 @@
+"""Startup phase timing, reported once the window is up."""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
+from typing import List, Tuple
+
+
+# Set to print the report to stderr (it is always logged at INFO)
+REPORT_ENV = "VIDFETCH_STARTUP_REPORT"
+
+
+class StartupTimer:
+    """Records when each startup phase ended, relative to construction."""
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self._marks: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        self._marks.append((phase, time.perf_counter()))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def report(self) -> str:
+        lines = []
+        last = self._start
+        for phase, t in self._marks:
+            lines.append(f"  {phase:<20} {1000 * (t - last):7.1f} ms  (at {1000 * (t - self._start):7.1f} ms)")
+            last = t
+        return "Startup timing:\n" + "\n".join(lines)
+
+    def emit(self) -> None:
+        text = self.report()
+        logging.info(text)
+        if os.environ.get(REPORT_ENV):
+            print(text, file=sys.stderr)
@@ -0,0 +1,226 @@
+"""Headless entry point for VidFetch: download URL lists without the GUI.
+
+    python src/vidfetch.py URL [URL ...]
+    python src/vidfetch.py -i urls.txt -o ~/Videos --audio
+    python src/vidfetch.py -i export.csv -i more.jsonl
+    python src/vidfetch.py --daemon -i /run/vidfetch.fifo
+
+Settings (download dir, concurrency, rate limits...) come from the same
+settings file as the GUI; flags override them for this run. One line per
+finished task is printed to stdout: ``done``, ``error`` or ``skipped``,
+then the URL, tab-separated. The exit status is 1 if any task failed.
+
+Input files are plain text (one URL per line), CSV (a "url" column) or
+JSON lines, told apart by extension or ``--format``. They are streamed and
+queued in large batches, so lists of 100k URLs are fine.
+
+``--daemon`` keeps running after the input ends, reopening it if it is a
+FIFO so writers can come and go, until SIGINT/SIGTERM. Unfinished tasks
+stay journaled and are picked up by the next run with ``--resume``.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import stat
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Add src to path so relative imports work
+SRC = Path(__file__).parent
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from core.engine import DownloadEngine
+from core.options import task_options
+from core.url_import import FORMATS, read_urls
+from utils.config import load_settings
+from utils.database import init_db, reconcile_interrupted
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    settings = load_settings()
+    p = argparse.ArgumentParser(prog="vidfetch", description="Download media URLs without the GUI.")
+    p.add_argument("urls", nargs="*", metavar="URL")
+    p.add_argument("-i", "--input", action="append", default=[], metavar="FILE",
+                   help="read URLs from FILE ('-' for stdin); may be repeated")
+    p.add_argument("--format", choices=FORMATS,
+                   help="format of the input files (default: from the extension, txt for stdin)")
+    p.add_argument("-o", "--out-dir", default=settings.download_dir)
+    p.add_argument("-j", "--jobs", type=int, default=settings.parallel_downloads,
+                   help="parallel downloads")
+    p.add_argument("--audio", action="store_true", help="extract audio to mp3")
+    p.add_argument("--subs", action="store_true", help="download subtitles")
+    p.add_argument("--thumbnail", action="store_true", help="download the thumbnail")
+    p.add_argument("--policy", default=settings.scheduling_policy,
+                   choices=["fifo", "priority", "sjf", "round_robin"])
+    p.add_argument("--per-host-limit", type=int, default=settings.per_host_limit)
+    p.add_argument("--backend", default=settings.execution_backend, choices=["thread", "process"])
+    p.add_argument("--connections", type=int, default=settings.download_connections)
+    p.add_argument("--rate-limit", type=int, default=settings.rate_limit_kib, metavar="KIB",
+                   help="total KiB/s across all downloads (0 = unlimited)")
+    p.add_argument("--retries", type=int, default=settings.max_retries,
+                   help="retries of a download that hit a timeout, server error or rate limit")
+    p.add_argument("--resume", action="store_true", help="re-queue tasks left over by an earlier run")
+    p.add_argument("--daemon", action="store_true",
+                   help="keep running and reading input until SIGINT/SIGTERM (implies --resume)")
+    p.add_argument("--metrics-port", type=int, default=settings.metrics_port, metavar="PORT",
+                   help="serve Prometheus metrics on 127.0.0.1:PORT (0 = off)")
+    p.add_argument("--metrics-file", default=settings.metrics_file, metavar="FILE",
+                   help="rewrite Prometheus metrics to FILE every 15 s and on exit")
+    p.add_argument("-v", "--verbose", action="store_true")
+    args = p.parse_args(argv)
+    if not args.urls and not args.input and not sys.stdin.isatty():
+        args.input = ["-"]
+    if not args.urls and not args.input:
+        p.error("no URLs given")
+    args.settings = settings
+    return args
+
+
+def _is_fifo(path: str) -> bool:
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def iter_urls(args: argparse.Namespace) -> Iterator[str]:
+    yield from args.urls
+    for path in args.input:
+        yield from read_urls(path, args.format)
+    if args.daemon:
+        # Serve the last FIFO forever: each writer's EOF just means reopen
+        fifos = [p for p in args.input if p != "-" and _is_fifo(p)]
+        while fifos:
+            yield from read_urls(fifos[-1], args.format)
+
+
+async def run(args: argparse.Namespace) -> int:
+    settings = args.settings
+    engine = DownloadEngine(
+        concurrency=max(1, args.jobs),
+        progress_hz=1.0,
+        policy=args.policy,
+        per_host_limit=args.per_host_limit,
+        backend=args.backend,
+        connections=args.connections,
+        rate_limit=args.rate_limit * 1024,
+        per_task_rate_limit=settings.per_task_rate_limit_kib * 1024,
+        per_host_rate_limit=settings.per_host_rate_limit_kib * 1024,
+        metrics_port=args.metrics_port,
+        metrics_file=args.metrics_file,
+        max_retries=args.retries,
+    )
+    opts = task_options(
+        args.out_dir, settings.default_quality,
+        audio_only=args.audio, subtitles=args.subs, thumbnail=args.thumbnail,
+    )
+
+    loop = asyncio.get_running_loop()
+    urls: Dict[str, str] = {}
+    failed: List[str] = []
+    input_done = False
+    finished = asyncio.Event()
+
+    def check_done() -> None:
+        if input_done and not urls and not args.daemon:
+            finished.set()
+
+    def on_added(task_id: str, url: str) -> None:
+        urls[task_id] = url
+
+    def on_batch_added(pairs: list) -> None:
+        urls.update(pairs)
+
+    def on_completed(task_id: str) -> None:
+        print(f"done\t{urls.pop(task_id, task_id)}", flush=True)
+        check_done()
+
+    def on_error(task_id: str, message: str) -> None:
+        url = urls.pop(task_id, task_id)
+        failed.append(url)
+        print(f"error\t{url}\t{message}", flush=True)
+        check_done()
+
+    def on_skipped(url: str, existing_id: str, reason: str) -> None:
+        print(f"skipped\t{url}\t{reason}", flush=True)
+
+    def on_input_done() -> None:
+        nonlocal input_done
+        input_done = True
+        check_done()
+
+    # Events come from the engine's loop and from the feeder thread; handle
+    # them all here, in order
+    for event, handler in (("task_added", on_added), ("tasks_added", on_batch_added),
+                           ("task_completed", on_completed), ("task_error", on_error),
+                           ("task_skipped", on_skipped)):
+        engine.on(event, lambda *a, h=handler: loop.call_soon_threadsafe(h, *a))
+
+    if args.resume or args.daemon:
+        restored = await asyncio.to_thread(engine.restore)
+        if restored:
+            logging.info(f"Resumed {restored} queued task(s)")
+
+    def feed() -> None:
+        try:
+            if args.daemon:
+                # Queue each line as it arrives rather than waiting for a batch
+                for url in iter_urls(args):
+                    engine.add_task(url, dict(opts))
+            else:
+                engine.add_tasks(iter_urls(args), opts)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot read input: {e}")
+        finally:
+            loop.call_soon_threadsafe(on_input_done)
+
+    interrupted = False
+
+    def interrupt() -> None:
+        nonlocal interrupted
+        interrupted = True
+        finished.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, interrupt)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    runner = asyncio.create_task(engine.run())
+    # URL -> extractor matching is slow the first time; don't hold the loop
+    threading.Thread(target=feed, name="vidfetch-input", daemon=True).start()
+    try:
+        await finished.wait()
+    finally:
+        engine.stop()
+        await runner
+
+    if interrupted and urls:
+        logging.warning(f"Stopped with {len(urls)} task(s) unfinished; run again with --resume")
+    if interrupted and not args.daemon:
+        return 130
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    init_db()
+    # Rows a crashed or force-quit run left as "downloading"
+    stale = reconcile_interrupted()
+    if stale:
+        logging.info(f"Marked {stale} interrupted download(s)")
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
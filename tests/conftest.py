@@ -7,3 +7,29 @@ ROOT = os.path.dirname(os.path.dirname(__file__))
 SRC = os.path.join(ROOT, "src")
 if SRC not in sys.path:
     sys.path.insert(0, SRC)
+
+# Widgets need a platform plugin; don't depend on a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(tmp_path, monkeypatch):
+    """Point settings and the history DB at a throwaway directory."""
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+    from utils import database
+    database.close_db()
+    yield tmp_path
+    database.close_db()
+
+
+@pytest.fixture
+def app():
+    """The process-wide Qt application, for tests that need an event loop
+    or widgets."""
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance()
+    if not app:
+        app = QApplication(sys.argv)
+    return app
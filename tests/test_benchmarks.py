@@ -0,0 +1,44 @@
+import os
+import sys
+import urllib.request
+
+import pytest
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+if BENCH not in sys.path:
+    sys.path.insert(0, BENCH)
+
+import fake_site
+import run as bench
+
+
+def test_fake_site_serves_consistent_ranges():
+    with fake_site.FakeMediaSite() as site:
+        url = site.url("/file/300000/clip.mp4")
+        whole = urllib.request.urlopen(url).read()
+        assert len(whole) == 300000
+        with urllib.request.urlopen(urllib.request.Request(url, headers={"Range": "bytes=100-199"})) as r:
+            assert r.status == 206 and r.read() == whole[100:200]
+        playlist = urllib.request.urlopen(site.url("/hls/3/1000/clip.m3u8")).read().decode()
+        assert playlist.count("clip/seg") == 3
+
+
+@pytest.mark.parametrize("scenario", ["range", "hls"])
+def test_benchmark_scenarios_run_end_to_end(scenario):
+    # In its own process, as run.py does by default
+    result = bench._run_isolated(scenario, concurrency=2, scale=0.05, timeout=60)
+
+    assert result["errors"] == []
+    assert result["downloaded_bytes"] > 0
+    for metric in ("throughput_mib_s", "latency_p50_s", "latency_p95_s", "progress_batches_s",
+                   "db_rows_s", "peak_rss_mib"):
+        assert metric in result
+    assert result["db_rows_s"] > 0
+
+
+def test_compare_flags_regressions():
+    old = {"results": {"range@2": {"throughput_mib_s": 100.0, "latency_p50_s": 1.0}}}
+    new = {"results": {"range@2": {"throughput_mib_s": 50.0, "latency_p50_s": 1.05}}}
+    lines = bench.compare(new, old)
+    assert any("throughput_mib_s" in l and "REGRESSION" in l for l in lines)
+    assert any("latency_p50_s" in l and "REGRESSION" not in l for l in lines)
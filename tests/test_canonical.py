@@ -0,0 +1,25 @@
+from core.canonical import canonical_id, entry_canonical_id, normalize_url
+
+
+def test_url_forms_of_one_video_agree():
+    forms = [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://youtu.be/dQw4w9WgXcQ?si=abcdef",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+    ]
+    assert {canonical_id(u) for u in forms} == {"Youtube:dQw4w9WgXcQ"}
+    assert entry_canonical_id({"ie_key": "Youtube", "id": "dQw4w9WgXcQ"}, forms[0]) == "Youtube:dQw4w9WgXcQ"
+
+
+def test_generic_urls_drop_tracking_params():
+    assert normalize_url("HTTP://Example.COM/v.mp4?utm_source=x&id=3&fbclid=y#t=10") == "http://example.com/v.mp4?id=3"
+    assert canonical_id("http://example.com/v.mp4?id=3&utm_medium=m") == canonical_id("http://example.com/v.mp4?id=3")
+
+
+def test_site_specific_share_params_are_only_dropped_on_their_site():
+    assert normalize_url("https://www.youtube.com/playlist?list=PL1&si=x&pp=y&feature=shared") == \
+        "https://www.youtube.com/playlist?list=PL1"
+    assert normalize_url("https://open.spotify.com/episode/1?si=abc") == "https://open.spotify.com/episode/1"
+    # Elsewhere these may select what is served
+    kept = "https://media.example.org/watch?ref=main&feature=hd&pp=2&si=1"
+    assert normalize_url(kept) == kept
@@ -0,0 +1,55 @@
+import functools
+import os
+import subprocess
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "vidfetch.py")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / "site"
+    root.mkdir()
+    (root / "clip.mp4").write_bytes(os.urandom(300 * 1024))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", root
+    httpd.shutdown()
+
+
+def _vidfetch(tmp_path, *args, stdin=""):
+    env = dict(os.environ, XDG_CONFIG_HOME=str(tmp_path / "config"), XDG_CACHE_HOME=str(tmp_path / "cache"))
+    env.pop("QT_QPA_PLATFORM", None)
+    return subprocess.run(
+        [sys.executable, SCRIPT, *args], input=stdin, capture_output=True,
+        text=True, env=env, timeout=60,
+    )
+
+
+def test_cli_downloads_a_url_list_headless(site, tmp_path):
+    base, root = site
+    out = tmp_path / "out"
+    urls = tmp_path / "urls.txt"
+    urls.write_text(f"# list\n{base}/clip.mp4\n\n{base}/missing.mp4\n")
+
+    result = _vidfetch(tmp_path, "-i", str(urls), "-o", str(out))
+    lines = sorted(result.stdout.splitlines())
+    assert result.returncode == 1
+    assert lines[0] == f"done\t{base}/clip.mp4"
+    assert lines[1].startswith(f"error\t{base}/missing.mp4\t")
+    assert (out / "clip.mp4").read_bytes() == (root / "clip.mp4").read_bytes()
+
+    # Same history database: the finished URL is now a duplicate
+    again = _vidfetch(tmp_path, "-o", str(out), stdin=f"{base}/clip.mp4\n")
+    assert again.returncode == 0
+    assert again.stdout == f"skipped\t{base}/clip.mp4\talready downloaded\n"
@@ -0,0 +1,187 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils import database
+
+
+def test_writes_are_group_committed():
+    database.init_db()
+    writer = database.get_writer()
+    commits_before = writer.commits
+
+    futures = [
+        writer.submit(
+            "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
+            (f"https://example.com/{i}", "t", "queued"),
+        )
+        for i in range(200)
+    ]
+    ids = [f.result(timeout=5) for f in futures]
+
+    assert len(set(ids)) == 200
+    # 200 rows arriving together should need only a handful of commits
+    assert writer.commits - commits_before <= 3
+    assert len(database.get_history(limit=500)) == 200
+
+
+def test_async_api_and_wal_mode():
+    async def run():
+        d_id = await database.add_download_async("https://example.com/a", "a", "downloading")
+        await database.update_download_status_async(d_id, "completed")
+        return d_id
+
+    d_id = asyncio.run(run())
+    rows = database.get_history()
+    assert rows[0]["id"] == d_id
+    assert rows[0]["status"] == "completed"
+
+    conn = sqlite3.connect(database.db_path())
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_failed_statement_does_not_poison_batch():
+    writer = database.get_writer()
+    bad = writer.submit("INSERT INTO missing_table VALUES (1)")
+    good = writer.submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
+        ("https://example.com/b", "b", "queued"),
+    )
+    assert good.result(timeout=5) > 0
+    try:
+        bad.result(timeout=5)
+    except sqlite3.Error:
+        pass
+    else:
+        raise AssertionError("expected failure")
+
+
+def test_unbindable_parameter_fails_only_its_statement():
+    writer = database.get_writer()
+    bad = writer.submit("UPDATE downloads SET title = ? WHERE id = ?", ("x", 2 ** 70))
+    good = writer.submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
+        ("https://example.com/e", "e", "queued"),
+    )
+    assert good.result(timeout=5) > 0
+    try:
+        bad.result(timeout=5)
+    except OverflowError:
+        pass
+    else:
+        raise AssertionError("expected failure")
+    writer.flush(timeout=5)
+    assert writer._thread.is_alive()
+
+
+def test_cancelled_waiter_does_not_stop_the_writer():
+    writer = database.get_writer()
+
+    async def run():
+        write = asyncio.ensure_future(writer.execute(
+            "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)", ("https://example.com/c", "c", "queued")
+        ))
+        await asyncio.sleep(0)
+        write.cancel()  # as stopping the queue does to a task awaiting its write
+        try:
+            await write
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    write = writer.submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)", ("https://example.com/d", "d", "queued")
+    )
+    assert write.result(timeout=5) > 0
+    writer.flush(timeout=5)
+    assert writer._thread.is_alive()
+    # The cancelled write still happened
+    assert len(database.get_history()) == 2
+
+
+def test_search_history_pages_and_matches_substrings():
+    writer = database.get_writer()
+    writer.submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
+        [(f"https://example.com/watch?v=vid{i:04d}", f"Episode {i}", "completed") for i in range(500)],
+        many=True,
+    ).result(timeout=5)
+
+    first = database.search_history(limit=200)
+    second = database.search_history(before_id=first[-1]["id"], limit=200)
+    assert len(first) == len(second) == 200
+    assert first[0]["id"] > first[-1]["id"] > second[0]["id"]
+
+    hits = database.search_history("vid012")
+    assert {r["url"][-7:] for r in hits} == {f"vid012{i}" for i in range(10)}
+    assert [r["title"] for r in database.search_history("episode 499")] == ["Episode 499"]
+    # Short queries fall back to LIKE
+    assert len(database.search_history("7", limit=1000)) > 0
+
+
+def test_fts_index_follows_title_updates():
+    d_id = database.add_download("https://example.com/x", "placeholder", "completed")
+    database.get_writer().submit("UPDATE downloads SET title = ? WHERE id = ?", ("Renamed clip", d_id)).result()
+    assert [r["id"] for r in database.search_history("renamed")] == [d_id]
+    assert database.search_history("placeholder") == []
+
+
+def test_journal_round_trip_and_reconcile():
+    database.journal_add("t1", "http://a/1", {"out_dir": "/tmp"}, 1, 100, "Generic:1")
+    database.journal_add("t2", "http://a/2", {}, 2)
+    d_id = database.add_download("http://a/1", "one", "downloading")
+    database.journal_started("t1", d_id)
+    database.journal_progress([(40, 100, "/tmp/one.mp4", "t1")])
+
+    rows = database.load_journal()
+    assert [r["task_id"] for r in rows] == ["t1", "t2"]
+    assert rows[0]["options"] == {"out_dir": "/tmp"}
+    assert (rows[0]["status"], rows[0]["db_id"], rows[0]["downloaded_bytes"], rows[0]["filename"]) == \
+        ("running", d_id, 40, "/tmp/one.mp4")
+
+    database.journal_remove(["t1"]).result()
+    assert [r["task_id"] for r in database.load_journal()] == ["t2"]
+    assert database.reconcile_interrupted() == 1
+    assert database.get_history()[0]["status"] == "interrupted"
+
+
+def test_failed_migration_step_leaves_nothing_behind(tmp_path, monkeypatch):
+    conn = database._connect(tmp_path / "m.db")
+    first = "CREATE TABLE t (a TEXT);"
+    monkeypatch.setattr(database, "_MIGRATIONS", [first, "ALTER TABLE t ADD COLUMN b TEXT;\nSELECT no_such_function();"])
+    with pytest.raises(sqlite3.OperationalError):
+        database._migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    assert [row[1] for row in conn.execute("PRAGMA table_info(t)")] == ["a"]
+
+    # Fixed, the step applies cleanly on the next start
+    monkeypatch.setattr(database, "_MIGRATIONS", [first, "ALTER TABLE t ADD COLUMN b TEXT;"])
+    database._migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 2
+    assert [row[1] for row in conn.execute("PRAGMA table_info(t)")] == ["a", "b"]
+    conn.close()
+
+
+@pytest.mark.parametrize("sort", database.SORT_COLUMNS)
+@pytest.mark.parametrize("descending", [True, False])
+def test_sorted_history_pages_through_every_row_once(sort, descending):
+    rows = [(f"https://example.com/{i % 7}/{i}", None if i % 5 == 0 else f"Clip {i % 4}", ("completed", "error")[i % 2])
+            for i in range(60)]
+    database.get_writer().submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)", rows, many=True,
+    ).result(timeout=5)
+
+    pages, after = [], None
+    while True:
+        page = database.search_history(sort=sort, descending=descending, after=after, limit=7)
+        pages += page
+        if len(page) < 7:
+            break
+        after = (page[-1][sort] or "", page[-1]["id"])
+
+    expected = sorted(database.search_history(limit=100), key=lambda r: (r[sort] or "", r["id"]), reverse=descending)
+    assert [r["id"] for r in pages] == [r["id"] for r in expected]
+    # Filters still apply
+    assert {r["title"] for r in database.search_history("Clip 3", sort=sort, descending=descending)} == {"Clip 3"}
@@ -0,0 +1,49 @@
+import pytest
+
+from gui.download_model import DownloadListModel, PercentRole, StatusRole, TaskIdRole
+
+
+def test_rows_are_inserted_in_one_batch(app):
+    model = DownloadListModel()
+    inserts = []
+    model.rowsInserted.connect(lambda parent, first, last: inserts.append((first, last)))
+
+    for i in range(50_000):
+        model.add_task(f"t{i}", f"https://example.com/{i}")
+    app.processEvents()
+
+    assert model.rowCount() == 50_000
+    assert inserts == [(0, 49_999)]
+    assert model.data(model.index(123), TaskIdRole) == "t123"
+
+
+def test_batched_updates_emit_single_range(app):
+    model = DownloadListModel()
+    for i in range(100):
+        model.add_task(f"t{i}", f"https://example.com/{i}")
+    changes = []
+    model.dataChanged.connect(lambda tl, br, roles: changes.append((tl.row(), br.row())))
+
+    model.update_many([(f"t{i}", "downloading", i, None) for i in (10, 20, 30)] + [("gone", "x", 0, None)])
+
+    assert changes == [(10, 30)]
+    assert model.data(model.index(20), PercentRole) == 20
+    assert model.data(model.index(20), StatusRole) == "downloading"
+
+
+def test_old_finished_rows_are_pruned(app):
+    model = DownloadListModel(max_finished=20)
+    for i in range(100):
+        model.add_task(f"t{i}", f"https://example.com/{i}")
+    app.processEvents()
+    for i in range(0, 100, 2):  # every other task finishes
+        model.mark_finished(f"t{i}")
+
+    # The 37th finish (cap 20 + slack 16) pruned back to 20; 13 more since
+    assert model.rowCount() == 50 + 33
+    model.set_max_finished(10)
+    assert model.rowCount() == 60
+    assert [model.data(model.index(i), TaskIdRole) for i in range(3)] == ["t1", "t3", "t5"]
+    assert [model.data(model.index(i), TaskIdRole) for i in (57, 58, 59)] == ["t97", "t98", "t99"]
+    model.update_many([("t99", "downloading", 5, None)])
+    assert model.data(model.index(59), PercentRole) == 5
@@ -29,3 +29,27 @@ def test_extract_info_calls_yt_dlp(monkeypatch):
     info = d._extract_info('https://youtube.com/watch?v=abc')
     assert info['title'] == 'dummy'
     assert called['url'].endswith('abc')
+
+
+@pytest.mark.parametrize("kind", ["on_demand", "in_advance"])
+def test_paged_playlist_entries_are_fetched_as_they_are_taken(kind):
+    from yt_dlp.utils import InAdvancePagedList, OnDemandPagedList
+
+    from core.downloader import YTDLPDownloader
+
+    fetched = []
+
+    def page(n):
+        fetched.append(n)
+        return [{"id": str(i)} for i in range(n * 20, min(n * 20 + 20, 130))]
+
+    entries = OnDemandPagedList(page, 20) if kind == "on_demand" else InAdvancePagedList(page, 7, 20)
+    closed = []
+    ydl = type("YDL", (), {"close": lambda self: closed.append(True)})()
+    it = YTDLPDownloader._iter_entries(ydl, entries)
+
+    assert [next(it)["id"] for _ in range(5)] == ["0", "1", "2", "3", "4"]
+    assert fetched == [0, 1, 2]  # the first chunk of 50, not the whole list
+    rest = list(it)
+    assert [e["id"] for e in rest] == [str(i) for i in range(5, 130)]
+    assert sorted(set(fetched)) == fetched == list(range(7)) and closed
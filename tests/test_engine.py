@@ -0,0 +1,226 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from core.engine import DownloadEngine
+
+
+class QuickDownloader:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        progress_callback({"status": "downloading", "downloaded_bytes": 50, "total_bytes": 100})
+        await asyncio.sleep(0.05)
+        if url.endswith("/bad"):
+            raise RuntimeError("boom")
+
+
+def test_engine_reports_through_callbacks_without_qt():
+    """The engine runs on its own thread and reports via plain callbacks."""
+    events = []
+    done = threading.Event()
+
+    def record(name):
+        def callback(*args):
+            events.append((name, args))
+            if sum(e[0] in ("task_completed", "task_error") for e in events) == 2:
+                done.set()
+        return callback
+
+    with patch("core.engine.YTDLPDownloader", QuickDownloader):
+        engine = DownloadEngine(concurrency=2, progress_hz=50)
+        for name in ("task_added", "task_updated", "task_completed", "task_error"):
+            engine.on(name, record(name))
+        engine.on("task_added", lambda *a: 1 / 0)  # a broken listener is contained
+        good = engine.add_task("http://test.url/good")  # queued before the loop runs
+        engine.start()
+        bad = engine.add_task("http://test.url/bad")
+        assert done.wait(5)
+        engine.stop()
+
+    assert ("task_completed", (good,)) in events
+    assert ("task_error", (bad, "boom")) in events
+    assert ("task_updated", (good, "downloading", 0, {})) in events
+    assert engine._thread is None and engine._loop is None
+
+
+def test_engine_can_be_awaited_in_an_existing_loop():
+    completed = []
+
+    async def main():
+        engine = DownloadEngine(concurrency=1)
+        engine.on("task_completed", lambda tid: (completed.append(tid), engine.stop()))
+        tid = engine.add_task("http://test.url/awaited")
+        await asyncio.wait_for(engine.run(), 5)
+        return tid
+
+    with patch("core.engine.YTDLPDownloader", QuickDownloader):
+        tid = asyncio.run(main())
+    assert completed == [tid]
+
+
+def test_cancelled_queued_tasks_leave_the_queue_at_once():
+    errors = []
+
+    async def main():
+        engine = DownloadEngine(concurrency=1, keep_finished=2)
+        engine.on("task_error", lambda tid, msg: errors.append((tid, msg)))
+        ids = [engine.add_task(f"http://test.url/queued/{i}") for i in range(6)]
+        engine.cancel_task(ids[5])  # before the loop runs
+        runner = asyncio.create_task(engine.run())
+        await asyncio.sleep(0.01)  # ids[0] is running, the rest are queued
+        engine.cancel_task(ids[3])
+        await asyncio.sleep(0.01)
+        assert engine._queue.qsize() == 3
+        assert engine.get_task(ids[3]).cancelled and ids[3] not in engine._active_tasks
+        while engine._active_tasks:
+            await asyncio.sleep(0.01)
+        engine.stop()
+        await runner
+        return engine, ids
+
+    with patch("core.engine.YTDLPDownloader", QuickDownloader):
+        engine, ids = asyncio.run(main())
+    assert errors == [(ids[5], "Cancelled by user"), (ids[3], "Cancelled by user")]
+    # Only the last two finished tasks are kept in memory
+    assert list(engine._finished) == [ids[2], ids[4]]
+    assert engine.get_task(ids[0]) is None
+    assert not engine._inflight
+
+
+class ResumableDownloader:
+    """Downloads 10 chunks per URL, continuing from the chunks already "on disk"."""
+
+    on_disk = {}
+    starts = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        self.starts.append((url, self.on_disk.get(url, 0)))
+        while self.on_disk.get(url, 0) < 10:
+            await asyncio.sleep(0.02)
+            self.on_disk[url] = self.on_disk.get(url, 0) + 1
+            progress_callback({"status": "downloading", "downloaded_bytes": self.on_disk[url], "total_bytes": 10})
+
+
+def test_pause_stops_running_downloads_and_resume_continues_them():
+    statuses = []
+    on_disk = ResumableDownloader.on_disk
+
+    async def until(condition):
+        for _ in range(250):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError("timed out")
+
+    async def main():
+        engine = DownloadEngine(concurrency=1, progress_hz=50)
+        done = asyncio.Event()
+        engine.on("task_updated", lambda tid, status, pct, data: statuses.append((tid, status)))
+        completed = []
+        engine.on("task_completed", lambda tid: (completed.append(tid), len(completed) == 2 and done.set()))
+        a = engine.add_task("http://test.url/resumable/a")
+        b = engine.add_task("http://test.url/resumable/b")
+        runner = asyncio.create_task(engine.run())
+
+        await until(lambda: on_disk.get("http://test.url/resumable/a", 0) >= 2)
+        engine.pause_task(a)
+        # a gives up the only slot, so b runs
+        await until(lambda: on_disk.get("http://test.url/resumable/b", 0) >= 2)
+        assert a in engine._held and on_disk["http://test.url/resumable/a"] < 10
+
+        engine.pause()  # the whole queue, b included
+        await until(lambda: b in engine._held)
+        assert not engine._busy
+        engine.resume()  # b continues; a stays paused on its own
+        await until(lambda: b not in engine._held)
+        assert a in engine._held
+        engine.resume_task(a)
+        await asyncio.wait_for(done.wait(), 5)
+        engine.stop()
+        await runner
+        return a, b
+
+    ResumableDownloader.on_disk.clear()
+    ResumableDownloader.starts.clear()
+    with patch("core.engine.YTDLPDownloader", ResumableDownloader):
+        a, b = asyncio.run(main())
+
+    urls = {a: "http://test.url/resumable/a", b: "http://test.url/resumable/b"}
+    starts = {tid: [n for u, n in ResumableDownloader.starts if u == url] for tid, url in urls.items()}
+    # Each download ran twice, the second time from where it stopped
+    assert len(starts[a]) == 2 and starts[a][0] == 0 and 0 < starts[a][1] < 10
+    assert len(starts[b]) == 2 and starts[b][0] == 0 and 0 < starts[b][1] < 10
+    assert (a, "paused") in statuses and (b, "paused") in statuses
+
+
+def test_add_tasks_queues_a_large_list_in_batches():
+    from core.canonical import cache_key
+    from utils import database
+
+    database.add_download("http://cdn.qzxv.example/v/3", "done", "completed", cache_key("http://cdn.qzxv.example/v/3")[0])
+    batches, skipped = [], []
+    urls = [f"http://cdn.qzxv.example/v/{i}" for i in range(20000)]
+    urls[10:10] = ["not a url", "http://cdn.qzxv.example/v/5"]
+
+    async def main():
+        engine = DownloadEngine(concurrency=4)
+        engine.on("tasks_added", batches.append)
+        engine.on("task_skipped", lambda *a: skipped.append(a))
+        existing = engine.add_task("http://cdn.qzxv.example/v/7")
+        singles = []
+        engine.on("task_added", lambda *a: singles.append(a))
+        ids = engine.add_tasks(iter(urls), {"quality": "720p"}, batch_size=8000)
+        assert not singles
+        assert [len(b) for b in batches] == [7996, 8000, 4002] and len(ids) == 19998
+        assert {(url, reason) for url, _, reason in skipped} == {
+            ("http://cdn.qzxv.example/v/3", "already downloaded"),
+            ("http://cdn.qzxv.example/v/7", "already in queue"),
+            ("not a url", "not a URL"),
+            ("http://cdn.qzxv.example/v/5", "repeated in the list"),
+        }
+        assert (existing, "already in queue") in {(tid, reason) for _, tid, reason in skipped}
+        assert len(engine._pending_tasks) == 19999
+        runner = asyncio.create_task(engine.run())
+        await asyncio.sleep(0.01)
+        late = engine.add_tasks(["test.url/late"])  # straight into the running queue
+        assert engine.get_task(late[0]).url == "https://test.url/late"
+        assert not engine._pending_tasks
+        engine.stop()
+        await runner
+        return ids
+
+    with patch("core.engine.YTDLPDownloader", QuickDownloader):
+        ids = asyncio.run(main())
+    journal = {row["task_id"]: row for row in database.load_journal()}
+    assert set(ids) <= set(journal)
+    assert journal[ids[-1]]["options"] == {"quality": "720p"}
+
+
+def test_stop_before_the_loop_starts_does_not_hang():
+    engine = DownloadEngine()
+    engine.start()
+    engine.stop()
+    assert engine._thread is None
+
+
+def test_core_does_not_import_qt():
+    code = "import sys; import core.engine, core.options; print(any(m.startswith('PyQt6') for m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"), check=True).stdout
+    assert out.strip() == "False"
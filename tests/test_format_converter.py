@@ -0,0 +1,180 @@
+import asyncio
+import io
+import math
+import os
+import struct
+import threading
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core import format_converter
+from core.downloader import YTDLPDownloader
+from core.engine import DownloadEngine
+from core.metadata_cache import MetadataCache
+from core.segmented import SegmentedDownloader
+
+
+needs_ffmpeg = pytest.mark.skipif(not format_converter.have_ffmpeg(), reason="ffmpeg not installed")
+
+
+def _wav(seconds=2, rate=22050):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / rate)))
+            for i in range(seconds * rate)
+        ))
+    return buf.getvalue()
+
+
+WAV = _wav()
+
+
+class WavHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(WAV)))
+        self.end_headers()
+        self.wfile.write(WAV)
+
+    do_HEAD = None
+
+    def log_message(self, *args):
+        pass
+
+
+async def _chunks(data, size=4096):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@needs_ffmpeg
+def test_stream_from_local_bytes_writes_only_the_mp3(tmp_path):
+    out = tmp_path / "tone.mp3"
+    asyncio.run(format_converter.stream_extract_audio(_chunks(WAV), str(out), "mp3", "128"))
+
+    assert out.read_bytes()[:3] in (b"ID3", b"\xff\xfb", b"\xff\xf3")
+    assert [p.name for p in tmp_path.iterdir()] == ["tone.mp3"]
+
+
+@needs_ffmpeg
+def test_bad_input_fails_and_leaves_nothing(tmp_path):
+    out = tmp_path / "bad.mp3"
+    with pytest.raises(RuntimeError, match="ffmpeg failed"):
+        asyncio.run(format_converter.stream_extract_audio(_chunks(b"not audio" * 1000), str(out)))
+    assert list(tmp_path.iterdir()) == []
+
+
+@needs_ffmpeg
+def test_downloader_pipes_http_audio_into_ffmpeg(tmp_path):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), WavHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    cache = MetadataCache(tmp_path / "cache.db")
+    segmented = SegmentedDownloader()
+    downloader = YTDLPDownloader(cache=cache, segmented=segmented)
+    events = []
+
+    async def run():
+        try:
+            return await downloader.stream_audio(
+                f"http://127.0.0.1:{httpd.server_address[1]}/tone.wav", str(tmp_path / "out"),
+                "mp3", "128", events.append, {"quiet": True},
+            )
+        finally:
+            await segmented.close()
+    try:
+        path = asyncio.run(run())
+    finally:
+        httpd.shutdown()
+        cache.close()
+
+    assert path == str(tmp_path / "out" / "tone.mp3")
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["tone.mp3"]
+    assert events[-1]["status"] == "finished"
+    assert events[-1]["downloaded_bytes"] == len(WAV)
+
+
+def test_engine_streams_audio_with_a_single_connection(tmp_path, monkeypatch):
+    # Streaming only needs the HTTP session, not segmented downloads
+    fed = []
+
+    async def fake_encoder(chunks, output_path, codec="mp3", quality="192"):
+        data = b"".join([chunk async for chunk in chunks])
+        fed.append((codec, quality))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(data)
+
+    monkeypatch.setattr(format_converter, "have_ffmpeg", lambda: True)
+    monkeypatch.setattr(format_converter, "stream_extract_audio", fake_encoder)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), WavHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    results = []
+
+    async def main():
+        engine = DownloadEngine(connections=1)
+        done = asyncio.Event()
+        engine.on("task_completed", lambda task_id: (results.append("ok"), done.set()))
+        engine.on("task_error", lambda task_id, error: (results.append(error), done.set()))
+        engine.add_task(f"http://127.0.0.1:{httpd.server_address[1]}/tone.wav", {
+            "out_dir": str(tmp_path / "out"),
+            "ytdlp_opts": {
+                "quiet": True, "no_warnings": True,
+                "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "128"}],
+            },
+        })
+        runner = asyncio.create_task(engine.run())
+        try:
+            await asyncio.wait_for(done.wait(), 30)
+        finally:
+            engine.stop()
+            await runner
+    try:
+        asyncio.run(main())
+    finally:
+        httpd.shutdown()
+
+    assert results == ["ok"]
+    assert fed == [("mp3", "128")]
+    assert [p.name for p in (tmp_path / "out").iterdir()] == ["tone.mp3"]
+    assert (tmp_path / "out" / "tone.mp3").read_bytes() == WAV
+
+
+@pytest.mark.parametrize("sidecar", ["writesubtitles", "writethumbnail"])
+def test_sidecar_files_keep_audio_off_the_stream_path(tmp_path, monkeypatch, sidecar):
+    # Streaming skips yt-dlp's processing, so it would drop the extra files
+    fed = []
+
+    async def fake_encoder(chunks, output_path, codec="mp3", quality="192"):
+        fed.append(output_path)
+
+    monkeypatch.setattr(format_converter, "have_ffmpeg", lambda: True)
+    monkeypatch.setattr(format_converter, "stream_extract_audio", fake_encoder)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), WavHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    cache = MetadataCache(tmp_path / "cache.db")
+    segmented = SegmentedDownloader()
+    downloader = YTDLPDownloader(cache=cache, segmented=segmented)
+
+    async def run():
+        try:
+            return await downloader.stream_audio(
+                f"http://127.0.0.1:{httpd.server_address[1]}/tone.wav", str(tmp_path / "out"),
+                "mp3", "128", None, {"quiet": True, sidecar: True},
+            )
+        finally:
+            await segmented.close()
+    try:
+        path = asyncio.run(run())
+    finally:
+        httpd.shutdown()
+        cache.close()
+
+    assert path is None and fed == []
+    assert not (tmp_path / "out").exists()
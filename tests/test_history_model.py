@@ -0,0 +1,42 @@
+import time
+
+from PyQt6.QtCore import Qt
+
+from gui.history_model import HistoryTableModel
+from gui.history_widget import HistoryWidget
+from utils import database
+
+
+def _settle(app, model, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if model.rowCount() >= count and not model._loading:
+            return
+        if model.canFetchMore():
+            model.fetchMore()
+        time.sleep(0.01)
+
+
+def test_sorting_by_a_column_pages_in_that_order(app, monkeypatch):
+    monkeypatch.setattr(HistoryTableModel, "PAGE_SIZE", 4)
+    titles = ["delta", "alpha", None, "charlie", "bravo", "alpha", "echo", "foxtrot", "golf", "hotel"]
+    database.get_writer().submit(
+        "INSERT INTO downloads (url, title, status) VALUES (?, ?, ?)",
+        [(f"https://example.com/{i}", t, "completed") for i, t in enumerate(titles)], many=True,
+    ).result(timeout=5)
+
+    widget = HistoryWidget()
+    model = widget.model
+    # Enabling sorting must not query before the tab is shown
+    assert not model._loading and model._generation == 0
+    widget.table.sortByColumn(3, Qt.SortOrder.AscendingOrder)
+    _settle(app, model, len(titles))
+
+    shown = [model.data(model.index(i, 3)) for i in range(model.rowCount())]
+    assert shown == sorted(t or "" for t in titles)
+
+    widget.table.sortByColumn(0, Qt.SortOrder.DescendingOrder)
+    _settle(app, model, len(titles))
+    assert [model.data(model.index(i, 2)) for i in range(model.rowCount())] == \
+        [f"https://example.com/{i}" for i in reversed(range(len(titles)))]
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from gui.main_window import MainWindow
+from utils import database
+
+
+def test_skipped_urls_are_reported_in_the_status_bar(app):
+    window = MainWindow()
+    try:
+        window._on_task_skipped("https://youtu.be/dQw4w9WgXcQ", "", "already downloaded")
+        window._on_task_skipped("https://youtu.be/jNQXAC9IVRw", "t1", "already in queue")
+        message = window.status_bar.currentMessage()
+        assert message.startswith("Skipped 2 URL(s)")
+        assert "jNQXAC9IVRw (already in queue)" in message
+    finally:
+        window.qm.stop()
+
+
+def test_download_button_queues_off_the_gui_thread(app, monkeypatch):
+    window = MainWindow()
+    calls = []
+    done = threading.Event()
+
+    def add_tasks(urls, options=None, priority=0):
+        calls.append((list(urls), threading.current_thread()))
+        done.set()
+        return []
+
+    try:
+        monkeypatch.setattr(window.qm.engine, "add_tasks", add_tasks)
+        window.url_input.setText("  https://youtu.be/dQw4w9WgXcQ ")
+        window._on_download_clicked()
+        assert window.url_input.text() == ""
+        assert done.wait(5)
+        urls, thread = calls[0]
+        assert urls == ["https://youtu.be/dQw4w9WgXcQ"]
+        assert thread is not threading.main_thread()
+    finally:
+        window.qm.stop()
+
+
+class HeldDownloader:
+    """Stays "downloading" until ``release`` is set."""
+    release = threading.Event()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        await asyncio.to_thread(self.release.wait, 5)
+        progress_callback({"status": "finished", "filename": "/tmp/held.mp4", "downloaded_bytes": 1, "total_bytes": 1})
+
+
+def _status(db_id):
+    return next(r["status"] for r in database.get_history() if r["id"] == db_id)
+
+
+def test_startup_reconciles_only_the_previous_runs_downloads(app):
+    import main
+
+    stale = database.add_download("http://test.url/old", "old", "downloading")
+    HeldDownloader.release.clear()
+    with patch("core.engine.YTDLPDownloader", HeldDownloader):
+        window = MainWindow()
+        try:
+            # Added while the window is up but startup hasn't finished
+            task_id = window.qm.add_task("http://test.url/new", {"out_dir": "/tmp"})
+            time.sleep(0.3)
+            main.finish_startup(window)
+
+            task = window.qm.engine.get_task(task_id)
+            deadline = time.monotonic() + 5
+            while not task.db_id and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert _status(stale) == "interrupted"
+            assert _status(task.db_id) == "downloading"
+        finally:
+            HeldDownloader.release.set()
+            window.qm.stop()
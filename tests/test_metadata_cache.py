@@ -0,0 +1,63 @@
+import os
+import time
+
+from core import metadata_cache
+from core.metadata_cache import MetadataCache
+
+
+def test_url_variants_share_an_entry_and_survive_restart(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = MetadataCache(path)
+    cache.put("https://www.youtube.com/watch?v=dQw4w9WgXcQ", {"id": "dQw4w9WgXcQ", "extractor_key": "Youtube"})
+
+    got = cache.get("https://youtu.be/dQw4w9WgXcQ")
+    assert got["id"] == "dQw4w9WgXcQ"
+    got["mutated"] = True
+    assert "mutated" not in cache.get("https://youtu.be/dQw4w9WgXcQ")
+    assert cache.stats()["memory_hits"] == 2
+    cache.close()
+
+    reopened = MetadataCache(path)
+    assert reopened.get("https://www.youtube.com/watch?v=dQw4w9WgXcQ")["id"] == "dQw4w9WgXcQ"
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened.get("https://youtu.be/aaaaaaaaaaa") is None
+    assert reopened.stats()["misses"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    monkeypatch.setitem(metadata_cache.EXTRACTOR_TTLS, "Generic", 0.05)
+    cache = MetadataCache(tmp_path / "cache.db")
+    cache.put("http://127.0.0.1/a.mp4", {"id": "a"})
+    assert cache.get("http://127.0.0.1/a.mp4") is not None
+    time.sleep(0.1)
+    assert cache.get("http://127.0.0.1/a.mp4") is None
+
+
+def test_disk_tier_is_size_bounded(tmp_path):
+    cache = MetadataCache(tmp_path / "cache.db", max_memory_entries=2, max_disk_bytes=4000)
+    for i in range(50):
+        cache.put(f"http://127.0.0.1/{i}.mp4", {"id": str(i), "blob": os.urandom(500).hex()})
+    total = cache._conn.execute("SELECT SUM(size) FROM info_cache").fetchone()[0]
+    assert total <= 4000
+    assert len(cache._memory) == 2
+    assert cache.get("http://127.0.0.1/49.mp4") is not None
+    assert cache.get("http://127.0.0.1/0.mp4") is None
+
+
+def test_reads_batch_their_access_times(tmp_path):
+    cache = MetadataCache(tmp_path / "cache.db", max_memory_entries=1, max_disk_bytes=10**6)
+    for i in range(3):
+        cache.put(f"http://127.0.0.1/{i}.mp4", {"id": str(i)})
+    changes = cache._conn.total_changes
+    for _ in range(metadata_cache.ACCESS_BATCH - 1):
+        assert cache.get("http://127.0.0.1/0.mp4") is not None
+    assert cache._conn.total_changes == changes  # no write per read
+    assert not cache._conn.in_transaction
+
+    # The pending access time counts when the next put trims the disk tier
+    cache.max_disk_bytes = cache._conn.execute("SELECT SUM(size) FROM info_cache").fetchone()[0]
+    cache.put("http://127.0.0.1/3.mp4", {"id": "3"})
+    keys = {row[0] for row in cache._conn.execute("SELECT key FROM info_cache")}
+    assert len(keys) == 3 and not any(key.endswith("/1.mp4") for key in keys)
+    assert cache.get("http://127.0.0.1/0.mp4") is not None
+    cache.close()
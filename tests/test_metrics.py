@@ -0,0 +1,112 @@
+import asyncio
+import time
+import urllib.request
+from unittest.mock import patch
+
+from core.engine import DownloadEngine
+from core.metrics import Metrics, MetricsFileExporter, MetricsServer, TaskSpans
+
+
+class TwoFileDownloader:
+    """Reports a video and an audio file, like a merged yt-dlp format."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        await asyncio.sleep(0.02)
+        if url.endswith("/bad"):
+            raise RuntimeError("boom")
+        for size in (300, 100):
+            progress_callback({"status": "downloading", "downloaded_bytes": size // 2, "total_bytes": size})
+            await asyncio.sleep(0.02)
+            progress_callback({"status": "finished", "downloaded_bytes": size, "total_bytes": size})
+
+
+def test_spans_derive_phase_durations():
+    spans = TaskSpans()
+    # Fixed marks: offsets from an arbitrary monotonic reading don't subtract exactly
+    spans.marks.update(queued=1000.0, started=1001.0, transfer=1003.0, downloaded=1007.0, finished=1007.5)
+    spans.bytes = 400
+    durations = spans.durations()
+    assert durations == {"queue_wait": 1, "extraction": 2, "transfer": 4, "total": 7.5}
+    assert spans.throughput() == 100
+
+
+def test_render_prometheus_text():
+    m = Metrics()
+    m.describe("vidfetch_tasks_total", "Finished tasks.")
+    m.inc("vidfetch_tasks_total", outcome="error", extractor='Odd"Name')
+    m.observe("vidfetch_task_phase_seconds", 0.3, phase="transfer")
+    m.observe("vidfetch_task_phase_seconds", 7, phase="transfer")
+    m.gauge("vidfetch_queue_depth", lambda: 3)
+    m.gauge("vidfetch_broken", lambda: 1 / 0)
+    text = m.render()
+    assert "# HELP vidfetch_tasks_total Finished tasks.\n# TYPE vidfetch_tasks_total counter" in text
+    assert 'vidfetch_tasks_total{extractor="Odd\\"Name",outcome="error"} 1' in text
+    assert 'vidfetch_task_phase_seconds_bucket{phase="transfer",le="0.25"} 0' in text
+    assert 'vidfetch_task_phase_seconds_bucket{phase="transfer",le="0.5"} 1' in text
+    assert 'vidfetch_task_phase_seconds_bucket{phase="transfer",le="+Inf"} 2' in text
+    assert 'vidfetch_task_phase_seconds_count{phase="transfer"} 2' in text
+    assert "vidfetch_queue_depth 3" in text
+    assert "vidfetch_broken" not in text
+
+
+def test_engine_records_spans_and_outcomes():
+    async def main():
+        engine = DownloadEngine(concurrency=2, progress_hz=50)
+        done = asyncio.Event()
+        finished = []
+
+        def on_finished(task_id, *args):
+            finished.append(task_id)
+            if len(finished) == 2:
+                done.set()
+
+        engine.on("task_completed", on_finished)
+        engine.on("task_error", on_finished)
+        good = engine.add_task("http://test.url/good")
+        engine.add_task("http://test.url/bad")
+        runner = asyncio.create_task(engine.run())
+        await asyncio.wait_for(done.wait(), 5)
+        engine.stop()
+        await runner
+        return engine, engine.get_task(good)
+
+    with patch("core.engine.YTDLPDownloader", TwoFileDownloader):
+        engine, task = asyncio.run(main())
+
+    assert task.spans.bytes == 400
+    assert {"queued", "started", "transfer", "downloaded", "finished"} <= set(task.spans.marks)
+    assert task.spans.db_seconds > 0
+    snap = engine.metrics.snapshot()
+    assert snap["tasks"] == {"completed": 1, "error": 1}
+    assert snap["bytes"] == 400
+    assert snap["error_rate_by_extractor"] == {"Generic": 0.5}
+    assert {"queue_wait", "extraction", "transfer", "db", "total"} <= set(snap["mean_phase_seconds"])
+    assert snap["gauges"]["vidfetch_queue_depth"] == 0
+
+
+def test_metrics_served_over_http_and_written_to_file(tmp_path):
+    m = Metrics()
+    m.inc("vidfetch_tasks_total", outcome="completed", extractor="Generic")
+    server = MetricsServer(m, 0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as r:
+            assert r.headers["Content-Type"].startswith("text/plain")
+            assert 'vidfetch_tasks_total{extractor="Generic",outcome="completed"} 1' in r.read().decode()
+    finally:
+        server.close()
+
+    path = tmp_path / "vidfetch.prom"
+    exporter = MetricsFileExporter(m, str(path), interval=0.05)
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    m.inc("vidfetch_tasks_total", outcome="completed", extractor="Generic")
+    exporter.close()  # writes once more on the way out
+    assert 'outcome="completed"} 2' in path.read_text()
+    assert not (tmp_path / "vidfetch.prom.tmp").exists()
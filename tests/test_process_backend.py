@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.downloader import DownloadCancelled
+from core.process_backend import ProcessPool
+from core.retry import ErrorKind, Failure, WorkerError, classify
+
+
+PAYLOAD = os.urandom(256 * 1024)
+
+
+class SlowMediaHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD as video/mp4, in small chunks with a delay between
+    them; paths with "limited" in them answer 429 with a Retry-After."""
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        self._headers()
+        if "limited" in self.path:
+            return
+        delay = 0.02 if "slow" in self.path else 0
+        for i in range(0, len(PAYLOAD), 16 * 1024):
+            try:
+                self.wfile.write(PAYLOAD[i:i + 16 * 1024])
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            time.sleep(delay)
+
+    def _headers(self):
+        if "limited" in self.path:
+            self.send_response(429)
+            self.send_header("Retry-After", "30")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SlowMediaHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def pool():
+    p = ProcessPool(max_workers=1)
+    yield p
+    p.close()
+
+
+def test_download_runs_in_worker_process_and_streams_progress(server, pool, tmp_path):
+    events = []
+    pool.run(f"{server}/clip.mp4", str(tmp_path), events.append, {"quiet": True, "noprogress": True})
+
+    assert (tmp_path / "clip.mp4").read_bytes() == PAYLOAD
+    assert events[-1]["status"] == "finished"
+    assert all("info_dict" not in e for e in events)
+
+    # The same worker process serves the next job
+    pid = pool._workers[0].process.pid
+    pool.run(f"{server}/clip.mp4", str(tmp_path / "again"), None, {"quiet": True, "noprogress": True})
+    assert pool._workers[0].process.pid == pid
+
+
+def test_callback_cancellation_stops_worker(server, pool, tmp_path):
+    def cancel(d):
+        if d.get("downloaded_bytes", 0) > 0:
+            raise DownloadCancelled("Cancelled by user")
+
+    with pytest.raises(DownloadCancelled):
+        pool.run(f"{server}/slow.mp4", str(tmp_path), cancel, {"quiet": True, "noprogress": True})
+    assert not (tmp_path / "slow.mp4").exists()
+    # The worker survives and is reused
+    pool.run(f"{server}/clip.mp4", str(tmp_path), None, {"quiet": True, "noprogress": True})
+    assert (tmp_path / "clip.mp4").exists()
+
+
+def test_worker_errors_keep_what_retrying_needs(server, pool, tmp_path):
+    with pytest.raises(WorkerError) as info:
+        pool.run(f"{server}/limited.mp4", str(tmp_path), None, {"quiet": True, "noprogress": True})
+
+    assert classify(info.value) == Failure(ErrorKind.RATE_LIMITED, 429, 30.0)
+    # The message alone has lost the Retry-After header
+    assert classify(RuntimeError(str(info.value))) == Failure(ErrorKind.RATE_LIMITED, 429)
+    assert info.value.types[0] == "DownloadError" and "HTTPError" in info.value.types
@@ -0,0 +1,27 @@
+from core.progress import ProgressAggregator, ProgressUpdate
+
+
+def test_from_status_uses_estimate_when_total_unknown():
+    u = ProgressUpdate.from_status("t", {
+        "status": "downloading",
+        "downloaded_bytes": 25,
+        "total_bytes_estimate": 100,
+        "speed": 10.0,
+    })
+    assert u.percent == 25
+    assert u.total_bytes == 100
+    assert u.speed == 10.0
+
+
+def test_aggregator_keeps_latest_per_task():
+    agg = ProgressAggregator()
+    for n in range(1000):
+        agg.push("a", {"downloaded_bytes": n, "total_bytes": 1000})
+    agg.push("b", {"downloaded_bytes": 1, "total_bytes": 2})
+    agg.push("c", {"downloaded_bytes": 1, "total_bytes": 2})
+    agg.discard("c")
+
+    updates = {u.task_id: u for u in agg.drain()}
+    assert set(updates) == {"a", "b"}
+    assert updates["a"].downloaded_bytes == 999
+    assert agg.drain() == []
@@ -1,33 +1,35 @@
 
-import sys
+import sqlite3
+import threading
+import time
 import asyncio
 import pytest
-from PyQt6.QtCore import QCoreApplication, QTimer
+from PyQt6.QtCore import QTimer
 from unittest.mock import MagicMock, patch
 
+from src.core.downloader import YTDLPDownloader
 from src.core.queue_manager import QueueManager
 
 # Mock downloader to avoid real network calls
 class MockDownloader:
-    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
         if progress_callback:
             progress_callback({"status": "downloading", "downloaded_bytes": 50, "total_bytes": 100})
         await asyncio.sleep(0.1)
         if progress_callback:
             progress_callback({"status": "finished", "downloaded_bytes": 100, "total_bytes": 100})
 
-@pytest.fixture
-def app():
-    app = QCoreApplication.instance()
-    if not app:
-        app = QCoreApplication(sys.argv)
-    return app
-
 def test_queue_manager_flow(app):
     """Test that QueueManager processes a task and emits signals."""
     
-    with patch("src.core.queue_manager.YTDLPDownloader", side_effect=MockDownloader):
-        qm = QueueManager(concurrency=1)
+    with patch("src.core.engine.YTDLPDownloader", side_effect=MockDownloader):
+        qm = QueueManager(concurrency=1, progress_hz=50)
         
         # Track signals
         signals_received = {
@@ -39,32 +41,330 @@ def test_queue_manager_flow(app):
         def on_added(tid, url):
             signals_received["added"] = True
             
-        def on_progress(tid, status, percent, data):
-            if percent > 0:
+        def on_progress(updates):
+            if any(u.percent > 0 for u in updates):
                 signals_received["progress"] = True
                 
         def on_completed(tid):
             signals_received["completed"] = True
-            app.quit() # Stop the event loop
 
         def on_error(tid, msg):
             print(f"Task Error: {msg}")
             
         qm.task_added.connect(on_added)
-        qm.task_updated.connect(on_progress)
+        qm.progress_batch.connect(on_progress)
         qm.task_completed.connect(on_completed)
         qm.task_error.connect(on_error)
         
         qm.start()
         qm.add_task("http://test.url")
         
-        # Timeout safety
-        QTimer.singleShot(2000, app.quit)
-        
-        app.exec()
+        # Pump events rather than app.exec() with a quit timer: a timer
+        # still pending after this test would end a later test's wait
+        deadline = time.monotonic() + 2
+        while not signals_received["completed"] and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
         
         qm.stop()
         
         assert signals_received["added"], "Task Added signal missing"
         assert signals_received["progress"], "Task Progress signal missing"
         assert signals_received["completed"], "Task Completed signal missing"
+
+
+class SlowDownloader:
+    running = 0
+    peak = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        SlowDownloader.running += 1
+        SlowDownloader.peak = max(SlowDownloader.peak, SlowDownloader.running)
+        try:
+            await asyncio.sleep(0.3)
+        finally:
+            SlowDownloader.running -= 1
+
+
+def test_consumer_pool_resizes_live(app):
+    """Growing starts consumers at once; shrinking never interrupts a task."""
+    with patch("src.core.engine.YTDLPDownloader", side_effect=SlowDownloader):
+        qm = QueueManager(concurrency=1)
+        completed, errors = [], []
+        qm.task_completed.connect(completed.append)
+        qm.task_error.connect(lambda tid, msg: errors.append(msg))
+
+        qm.start()
+        for i in range(8):
+            qm.add_task(f"http://test.url/{i}")
+
+        QTimer.singleShot(100, lambda: qm.update_concurrency(4))
+        QTimer.singleShot(500, lambda: qm.update_concurrency(1))
+        deadline = time.monotonic() + 5
+        while len(completed) < 8 and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+        assert SlowDownloader.peak == 4
+        assert errors == []
+        assert len(completed) == 8
+        assert len(qm.engine._consumers) == 0  # torn down on stop
+
+
+class PlaylistDownloader:
+    downloaded = []
+    take = staticmethod(YTDLPDownloader.take)
+    entry_url = staticmethod(YTDLPDownloader.entry_url)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        if not url.endswith("/playlist"):
+            return None
+
+        def entries():
+            for i in range(120):
+                yield {"url": f"http://test.url/video/{i}"}
+
+        return {"title": "A playlist"}, entries()
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        PlaylistDownloader.downloaded.append(url)
+        if url.endswith("/7"):
+            raise RuntimeError("broken entry")
+
+
+def test_playlist_expands_into_entry_tasks(app):
+    """Entries become tasks of their own; the parent reports the aggregate."""
+    with patch("src.core.engine.YTDLPDownloader", PlaylistDownloader):
+        qm = QueueManager(concurrency=4)
+        added, errors = [], {}
+        qm.task_added.connect(lambda tid, url: added.append(tid))
+        qm.task_error.connect(lambda tid, msg: errors.__setitem__(tid, msg))
+
+        qm.start()
+        parent = qm.add_task("http://test.url/playlist")
+        deadline = time.monotonic() + 10
+        while parent not in errors and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+        assert len(added) == 121
+        assert len(PlaylistDownloader.downloaded) == 120
+        assert errors[parent] == "1 of 120 entries failed"
+        assert qm.engine._groups == {}
+
+
+def test_playlist_entries_are_checked_against_history_per_batch(app):
+    """One history query per batch of entries, none per entry."""
+    from src.core.canonical import canonical_id
+    from utils import database
+
+    for i in (3, 60):
+        url = f"http://test.url/video/{i}"
+        database.add_download(url, "done", "completed", canonical_id=canonical_id(url))
+    PlaylistDownloader.downloaded = []
+    lookups = []
+
+    def find_completed_many(keys):
+        lookups.append(len(keys))
+        return database.find_completed_many(keys)
+
+    with patch("src.core.engine.YTDLPDownloader", PlaylistDownloader), \
+            patch("src.core.engine.find_completed_many", find_completed_many), \
+            patch("src.core.engine.find_completed", side_effect=AssertionError("per-entry lookup")):
+        qm = QueueManager(concurrency=4)
+        skipped, errors = [], {}
+        qm.task_skipped.connect(lambda url, existing, reason: skipped.append((url, reason)))
+        qm.task_error.connect(lambda tid, msg: errors.__setitem__(tid, msg))
+
+        qm.start()
+        [parent] = qm.add_tasks(["http://test.url/playlist"])
+        deadline = time.monotonic() + 10
+        while parent not in errors and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+    assert lookups == [1, 50, 50, 20]  # the playlist URL itself, then its entries
+    assert sorted(skipped) == [
+        ("http://test.url/video/3", "already downloaded"),
+        ("http://test.url/video/60", "already downloaded"),
+    ]
+    assert len(PlaylistDownloader.downloaded) == 118
+    assert errors[parent] == "1 of 118 entries failed"
+
+
+def test_duplicates_are_merged_or_skipped(app):
+    """In-flight duplicates merge into the running task; finished media is skipped."""
+    with patch("src.core.engine.YTDLPDownloader", side_effect=MockDownloader):
+        qm = QueueManager(concurrency=1)
+        skipped, completed = [], []
+        qm.task_skipped.connect(lambda url, existing, reason: skipped.append((existing, reason)))
+        qm.task_completed.connect(completed.append)
+
+        first = qm.add_task("http://example.com/clip.mp4?utm_source=feed")
+        assert qm.add_task("http://EXAMPLE.com/clip.mp4#t=3") == first
+        assert skipped == [(first, "already in queue")]
+
+        qm.start()
+        deadline = time.monotonic() + 5
+        while not completed and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+        assert completed == [first]
+        assert qm.engine._inflight == {}
+        assert qm.add_task("http://example.com/clip.mp4") is None
+        assert skipped[-1] == ("", "already downloaded")
+        assert qm.add_task("http://example.com/clip.mp4", {"allow_duplicates": True})
+
+
+def test_queue_survives_a_crash(app):
+    """Tasks left in the journal are re-queued, running ones first."""
+    crashed = QueueManager()  # never started: stands in for a killed process
+    first = crashed.add_task("http://test.url/journal/1", {"out_dir": "/tmp"})
+    second = crashed.add_task("http://test.url/journal/2")
+    from utils.database import journal_started
+    journal_started(second, None)
+
+    with patch("src.core.engine.YTDLPDownloader", side_effect=MockDownloader):
+        qm = QueueManager(concurrency=1)
+        completed = []
+        qm.task_completed.connect(completed.append)
+        assert qm.restore() == 2
+        assert [t.id for t in qm.engine._pending_tasks] == [second, first]
+        assert qm.engine._active_tasks[first].options == {"out_dir": "/tmp"}
+
+        qm.start()
+        deadline = time.monotonic() + 5
+        while len(completed) < 2 and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+    assert completed == [second, first]
+    assert QueueManager().restore() == 0
+
+
+class FileDownloader:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def resolve(self, url):
+        return None
+
+    async def stream_audio(self, *args, **kwargs):
+        return None  # as without ffmpeg: fall back to download + convert
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        assert "postprocessors" not in ytdlp_opts  # the stage runs them, not yt-dlp
+        await asyncio.sleep(0.05)
+        progress_callback({"status": "finished", "filename": f"/tmp/{url.rsplit('/', 1)[1]}.webm",
+                           "downloaded_bytes": 10, "total_bytes": 10})
+
+
+EXTRACT_AUDIO = {"ytdlp_opts": {"format": "bestaudio/best", "postprocessors": [
+    {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"}]}}
+
+
+def test_conversion_runs_in_its_own_stage(app):
+    """Downloads move on while ffmpeg work runs in parallel in the post stage."""
+    converting = []
+    done = {}
+    # A conversion returns only once all four are running at the same
+    # time; converting in line with the single download slot would break it
+    together = threading.Barrier(4, timeout=5)
+
+    def slow_convert(path, steps):
+        converting.append(path)
+        together.wait()
+        return path.replace(".webm", ".mp3")
+
+    opts = EXTRACT_AUDIO
+    with patch("src.core.engine.YTDLPDownloader", side_effect=FileDownloader), \
+         patch("src.core.engine.run_steps", slow_convert):
+        qm = QueueManager(concurrency=1, post_workers=4)
+        statuses = []
+        qm.task_updated.connect(lambda tid, status, pct, data: statuses.append(status))
+        qm.task_completed.connect(lambda tid: done.__setitem__(tid, qm.engine.get_task(tid).output_path))
+
+        qm.start()
+        ids = [qm.add_task(f"http://test.url/convert/{i}", dict(opts)) for i in range(4)]
+        deadline = time.monotonic() + 10
+        while len(done) < 4 and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+    assert statuses.count("converting") == 4
+    # One download slot, yet the four conversions overlapped
+    assert [done[i] for i in ids] == [f"/tmp/{i}.mp3" for i in range(4)]
+
+
+class NamelessDownloader(FileDownloader):
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        progress_callback({"status": "finished", "downloaded_bytes": 10, "total_bytes": 10})
+
+
+def test_conversion_of_an_unreported_file_fails_the_task(app):
+    """A finished download with no file name can't be converted; it must
+    not be reported as completed either."""
+    with patch("src.core.engine.YTDLPDownloader", side_effect=NamelessDownloader), \
+         patch("src.core.engine.run_steps", side_effect=AssertionError("nothing to convert")):
+        qm = QueueManager(concurrency=1)
+        errors, completed = {}, []
+        qm.task_error.connect(lambda tid, msg: errors.__setitem__(tid, msg))
+        qm.task_completed.connect(completed.append)
+
+        qm.start()
+        task_id = qm.add_task("http://test.url/convert/nameless", dict(EXTRACT_AUDIO))
+        deadline = time.monotonic() + 5
+        while task_id not in errors and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+    assert completed == []
+    assert "did not report the downloaded file" in errors[task_id]
+
+
+def test_a_failed_finish_does_not_stop_the_conversion_stage(app):
+    """One conversion worker: if finishing a task fails, the next is still converted."""
+    from utils.database import update_download_status_async
+
+    failures = []
+
+    async def flaky_status(download_id, status, file_path=None):
+        if status == "completed" and not failures:
+            failures.append(download_id)
+            raise sqlite3.OperationalError("disk I/O error")
+        await update_download_status_async(download_id, status, file_path)
+
+    with patch("src.core.engine.YTDLPDownloader", side_effect=FileDownloader), \
+         patch("src.core.engine.run_steps", lambda path, steps: path.replace(".webm", ".mp3")), \
+         patch("src.core.engine.update_download_status_async", flaky_status):
+        qm = QueueManager(concurrency=1, post_workers=1)
+        completed = []
+        qm.task_completed.connect(completed.append)
+
+        qm.start()
+        ids = [qm.add_task(f"http://test.url/convert/finish-{i}", dict(EXTRACT_AUDIO)) for i in range(2)]
+        deadline = time.monotonic() + 5
+        while ids[1] not in completed and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        qm.stop()
+
+    assert len(failures) == 1
+    assert completed == [ids[1]]
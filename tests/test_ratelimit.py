@@ -0,0 +1,69 @@
+import threading
+import time
+
+from core.ratelimit import BandwidthLimiter, ByteMeter, TokenBucket
+
+
+def _drain(limiter, task_id, host, chunks, size=16 * 1024):
+    for _ in range(chunks):
+        delay = limiter.reserve(task_id, host, size)
+        if delay:
+            time.sleep(delay)
+
+
+def test_global_cap_holds_across_threads():
+    limiter = BandwidthLimiter(global_rate=1024 * 1024)
+    threads = [
+        threading.Thread(target=_drain, args=(limiter, f"t{i}", "example.com", 16))
+        for i in range(4)
+    ]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+    # 1 MiB total at 1 MiB/s, less the 256 KiB burst allowance
+    assert elapsed >= 0.6
+
+
+def test_per_task_cap_and_runtime_change():
+    limiter = BandwidthLimiter(per_task_rate=512 * 1024)
+    start = time.monotonic()
+    _drain(limiter, "slow", "a", 32)  # 512 KiB at 512 KiB/s, less a 128 KiB burst
+    assert time.monotonic() - start >= 0.6
+
+    limiter.configure(0, 0, 0)
+    start = time.monotonic()
+    _drain(limiter, "slow", "a", 64)
+    assert time.monotonic() - start < 0.1
+
+
+def test_idle_budget_is_not_hoarded():
+    bucket = TokenBucket(1024 * 1024)
+    time.sleep(0.5)
+    # Only a short burst is saved up while idle
+    assert bucket.reserve(512 * 1024) > 0.1
+
+
+def test_byte_meter_restarts_on_new_file():
+    meter = ByteMeter()
+    assert meter.update({"tmpfilename": "v.part", "downloaded_bytes": 100}) == 100
+    assert meter.update({"tmpfilename": "v.part", "downloaded_bytes": 250}) == 150
+    assert meter.update({"tmpfilename": "a.part", "downloaded_bytes": 40}) == 40
+
+
+def test_host_buckets_go_with_their_last_task():
+    limiter = BandwidthLimiter(per_host_rate=1024 * 1024)
+    for i in range(1000):
+        limiter.reserve(f"t{i}", f"host{i}.example", 1024)
+        limiter.release(f"t{i}")
+    assert limiter._hosts == {} and limiter._tasks == {}
+
+    limiter.reserve("a", "shared.example", 1024)
+    limiter.reserve("b", "shared.example", 1024)
+    limiter.release("a")
+    assert list(limiter._hosts) == ["shared.example"]  # b still draws on it
+    limiter.release("b")
+    limiter.release("b")  # e.g. cancelled, then finished
+    assert limiter._hosts == {} and limiter._host_users == {}
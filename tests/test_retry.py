@@ -0,0 +1,210 @@
+import asyncio
+import os
+import random
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+if BENCH not in sys.path:
+    sys.path.insert(0, BENCH)
+
+import fake_site
+from core.engine import DownloadEngine
+from core.retry import ErrorKind, Failure, HostBreakers, RetryPolicy, classify, parse_retry_after
+from core.segmented import SegmentedDownloader
+
+
+@pytest.fixture
+def site():
+    with fake_site.FakeMediaSite() as site:
+        yield site
+
+
+def test_classify_errors_from_real_clients(site, tmp_path):
+    async def fetch(path, name):
+        segmented = SegmentedDownloader(4)
+        try:
+            await segmented.fetch(site.url(path), str(tmp_path / name))
+        except Exception as e:
+            return e
+        finally:
+            await segmented.close()
+
+    def error(path):
+        return asyncio.run(fetch(path, os.path.basename(path)))
+
+    site.retry_after = 7
+    assert classify(error("/fail/429/1/300000/a.mp4")) == Failure(ErrorKind.RATE_LIMITED, 429, 7.0)
+    assert classify(error("/fail/500/1/300000/b.mp4")) == Failure(ErrorKind.TRANSIENT, 500)
+    assert classify(error("/fail/403/1/300000/c.mp4")) == Failure(ErrorKind.PERMANENT, 403)
+    # A body cut off more often than the downloader's own retries; the inner
+    # error's "code" is not an HTTP status
+    assert classify(error("/cut/10/1500000/d.mp4")) == Failure(ErrorKind.TRANSIENT)
+
+    with pytest.raises(urllib.error.HTTPError) as info:
+        urllib.request.urlopen(site.url("/fail/503/1/1000/e.mp4"))
+    assert classify(info.value) == Failure(ErrorKind.RATE_LIMITED, 503, 7.0)  # 503 with Retry-After
+    site.retry_after = None
+    with pytest.raises(urllib.error.HTTPError) as info:
+        urllib.request.urlopen(site.url("/fail/503/1/1000/f.mp4"))
+    assert classify(info.value) == Failure(ErrorKind.TRANSIENT, 503)
+
+    # Errors that only survive as text
+    assert classify(RuntimeError("ERROR: unable to download video data: HTTP Error 502: Bad Gateway")).kind is ErrorKind.TRANSIENT
+    assert classify(RuntimeError("Read timed out.")).kind is ErrorKind.TRANSIENT
+    assert classify(RuntimeError("Unsupported URL: https://example.com")).kind is ErrorKind.PERMANENT
+    assert classify(OSError(28, "No space left on device")).kind is ErrorKind.PERMANENT
+    assert classify(ConnectionResetError()).kind is ErrorKind.TRANSIENT
+
+
+def test_classify_looks_through_yt_dlp_wrappers(site):
+    from yt_dlp.utils import DownloadError, ExtractorError
+
+    def wrapped(path):
+        try:
+            urllib.request.urlopen(site.url(path))
+        except urllib.error.HTTPError as e:
+            inner = ExtractorError("Unable to download webpage", cause=e, expected=True)
+            return DownloadError(f"ERROR: {inner}", exc_info=(type(inner), inner, None))
+
+    site.retry_after = 0
+    assert classify(wrapped("/fail/429/1/1000/a.mp4")) == Failure(ErrorKind.RATE_LIMITED, 429, 0.0)
+    assert classify(wrapped("/fail/404/1/1000/b.mp4")) == Failure(ErrorKind.PERMANENT, 404)
+    private = ExtractorError("Private video", expected=True)
+    assert classify(DownloadError("ERROR: Private video", exc_info=(type(private), private, None))).kind is ErrorKind.PERMANENT
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412480.0) == 30.0
+    assert parse_retry_after("soon") is None and parse_retry_after(None) is None
+
+
+def test_backoff_is_exponential_jittered_and_bounded():
+    policy = RetryPolicy(max_retries=5, base_delay=2.0, max_delay=10.0, rng=random.Random(1))
+    transient = Failure(ErrorKind.TRANSIENT)
+    for attempt, step in ((1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (5, 10.0)):
+        delays = {policy.delay(attempt, transient) for _ in range(50)}
+        assert all(step / 2 <= d <= step for d in delays) and len(delays) > 1
+    assert policy.delay(6, transient) is None
+    assert policy.delay(1, Failure(ErrorKind.PERMANENT, 404)) is None
+    assert policy.delay(1, Failure(ErrorKind.RATE_LIMITED, 429, 60.0)) == 60.0
+
+
+def test_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breakers = HostBreakers(threshold=3, cooldown=10.0, clock=lambda: now[0])
+    transient = Failure(ErrorKind.TRANSIENT)
+
+    breakers.record_failure("a.com", Failure(ErrorKind.PERMANENT, 404))  # says nothing about the host
+    for _ in range(2):
+        breakers.record_failure("a.com", transient)
+    assert breakers.allow("a.com")
+    breakers.record_failure("a.com", transient)
+    assert breakers.state("a.com") == "open" and not breakers.allow("a.com")
+    assert breakers.allow("b.com") and breakers.next_change() == 10.0
+
+    now[0] = 10.0
+    assert breakers.state("a.com") == "half_open" and breakers.allow("a.com")
+    breakers.started("a.com", "probe")
+    assert not breakers.allow("a.com")  # one probe at a time
+    breakers.record_failure("a.com", transient)
+    assert breakers.state("a.com") == "open" and breakers.next_change() == 30.0  # cooldown doubled
+
+    now[0] = 30.0
+    breakers.started("a.com", "probe2")
+    breakers.finished("a.com", "probe2")  # e.g. paused: someone else may probe
+    assert breakers.allow("a.com")
+    breakers.started("a.com", "probe3")
+    breakers.record_success("a.com")
+    assert breakers.state("a.com") == "closed" and breakers.open_hosts() == 0
+
+    # A rate-limit answer opens it at once, for at least its Retry-After
+    breakers.record_failure("a.com", Failure(ErrorKind.RATE_LIMITED, 429, 120.0))
+    assert breakers.state("a.com") == "open" and breakers.next_change() == 150.0
+
+
+def run_engine(urls, out_dir, wait_for=None, breakers=None, timeout=30, **kwargs):
+    """Run a real engine until every URL in ``wait_for`` (default: all)
+    has finished; returns (url -> "ok" or error, [(url, retry kind)], engine)."""
+    wait_for = set(urls if wait_for is None else wait_for)
+    results, retries = {}, []
+
+    async def main():
+        engine = DownloadEngine(progress_hz=50, **kwargs)
+        if breakers is not None:
+            engine.breakers = breakers
+        done = asyncio.Event()
+        urls_by_id = {}
+
+        def finished(task_id, error=None):
+            results[urls_by_id[task_id]] = error or "ok"
+            if wait_for <= results.keys():
+                done.set()
+
+        def updated(task_id, status, percent, data):
+            if status == "retrying":
+                retries.append((urls_by_id[task_id], data["kind"]))
+
+        engine.on("task_completed", finished)
+        engine.on("task_error", finished)
+        engine.on("task_updated", updated)
+        options = {"out_dir": out_dir, "ytdlp_opts": {"quiet": True, "no_warnings": True}}
+        for url in urls:
+            urls_by_id[engine.add_task(url, options)] = url
+        runner = asyncio.create_task(engine.run())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        finally:
+            engine.stop()
+            await runner
+        return engine
+
+    engine = asyncio.run(main())
+    return results, retries, engine
+
+
+def test_engine_retries_transient_and_rate_limited_failures(site, tmp_path):
+    site.retry_after = 0
+    urls = {
+        "transient": site.url("/fail/500/2/300000/transient.mp4"),
+        "limited": site.url("/fail/429/1/300000/limited.mp4"),
+        "missing": site.url("/fail/404/1/300000/missing.mp4"),
+        # Cut more often than the segmented downloader retries by itself
+        "cut": site.url("/cut/5/1500000/cut.mp4"),
+    }
+
+    results, retries, engine = run_engine(
+        list(urls.values()), str(tmp_path), breakers=HostBreakers(threshold=10, cooldown=0.05),
+        concurrency=2, retry_delay=0.05,
+    )
+
+    assert results[urls["transient"]] == results[urls["limited"]] == results[urls["cut"]] == "ok"
+    assert "404" in results[urls["missing"]]
+    assert retries.count((urls["transient"], "transient")) == 2
+    assert retries.count((urls["limited"], "rate_limited")) == 1
+    assert (urls["cut"], "transient") in retries
+    assert site.stats["fail:/fail/404/1/300000/missing.mp4"] == 1  # not retried
+    assert os.path.getsize(tmp_path / "cut.mp4") == 1500000
+    assert engine.metrics.snapshot()["retries"] == {"transient": 3, "rate_limited": 1}
+
+
+def test_breaker_parks_a_failing_host_while_others_download(site, tmp_path):
+    site.retry_after = None  # plain 503s: transient
+    port = site.server_address[1]
+    dead = [f"http://localhost:{port}/fail/503/1000/1000/dead-{i}.mp4" for i in range(6)]
+    healthy = [site.url(f"/file/200000/ok-{i}.mp4") for i in range(6)]
+
+    results, retries, engine = run_engine(
+        dead[:3] + healthy + dead[3:], str(tmp_path), wait_for=healthy,
+        breakers=HostBreakers(threshold=2, cooldown=60), concurrency=1, retry_delay=0.01,
+    )
+
+    assert all(results[url] == "ok" for url in healthy)
+    # Two failures opened the breaker; the rest of that host's tasks never ran
+    assert sum(n for key, n in site.stats.items() if key.startswith("fail:")) == 2
+    assert engine.breakers.state("localhost") == "open"
+    assert not any(url in results for url in dead)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from core.retry import ErrorKind, Failure, HostBreakers
+from core.scheduler import POLICIES, Priority, Scheduler, host_of
+
+
+def make(url, priority=Priority.NORMAL, size=None):
+    return SimpleNamespace(id=url, url=url, host=host_of(url), priority=priority, size_hint=size)
+
+
+def drain(policy, tasks, per_host_limit=0):
+    async def run():
+        s = Scheduler(policy, per_host_limit)
+        for t in tasks:
+            s.put(t)
+        out = []
+        while s.qsize():
+            t = await s.get()
+            out.append(t.url)
+            s.task_done(t)
+        return out
+    return asyncio.run(run())
+
+
+def test_host_of_ignores_www_and_port():
+    assert host_of("https://www.youtube.com/watch?v=x") == "youtube.com"
+    assert host_of("http://127.0.0.1:8000/a.mp4") == "127.0.0.1"
+
+
+def test_priority_and_sjf_ordering():
+    tasks = [
+        make("https://a.com/1", Priority.LOW, 300),
+        make("https://a.com/2", Priority.HIGH, None),
+        make("https://a.com/3", Priority.NORMAL, 100),
+    ]
+    assert drain("priority", tasks) == ["https://a.com/2", "https://a.com/3", "https://a.com/1"]
+    assert drain("sjf", tasks) == ["https://a.com/3", "https://a.com/1", "https://a.com/2"]
+    assert drain("fifo", tasks) == [t.url for t in tasks]
+
+
+def test_round_robin_interleaves_hosts():
+    tasks = [make(f"https://big.com/{i}") for i in range(3)] + [make("https://small.com/1")]
+    assert drain("round_robin", tasks) == [
+        "https://big.com/0", "https://small.com/1", "https://big.com/1", "https://big.com/2",
+    ]
+
+
+def test_per_host_limit_blocks_until_task_done():
+    async def run():
+        s = Scheduler("fifo", per_host_limit=1)
+        a1, a2, b1 = make("https://a.com/1"), make("https://a.com/2"), make("https://b.com/1")
+        for t in (a1, a2, b1):
+            s.put(t)
+        assert await s.get() is a1
+        # a.com is at its cap, so b.com jumps ahead
+        assert await s.get() is b1
+        waiter = asyncio.create_task(s.get())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        s.task_done(a1)
+        assert await asyncio.wait_for(waiter, 1) is a2
+    asyncio.run(run())
+
+
+def test_parked_hosts_are_passed_over_without_scanning_their_tasks():
+    for name in ("fifo", "priority", "sjf"):
+        policy = POLICIES[name]()
+        for i in range(1000):
+            policy.push(make(f"https://busy.com/{i}", size=i))
+        policy.push(make("https://idle.com/1", size=5000))
+        asked = []
+
+        def can_run(task):
+            asked.append(task.host)
+            return task.host != "busy.com"
+
+        assert policy.pop(can_run).url == "https://idle.com/1"
+        assert sorted(asked) == ["busy.com", "idle.com"]  # one look per host
+        assert len(policy) == 1000
+        assert policy.pop(lambda task: True).url == "https://busy.com/0"
+
+
+def test_switching_policy_keeps_queued_tasks():
+    async def run():
+        s = Scheduler("fifo")
+        low, high = make("https://a.com/1", Priority.LOW), make("https://a.com/2", Priority.HIGH)
+        s.put(low)
+        s.put(high)
+        s.set_policy("priority")
+        assert s.qsize() == 2
+        assert await s.get() is high
+        assert s.remove(low) and s.qsize() == 0
+    asyncio.run(run())
+
+
+def test_put_later_holds_a_task_back_until_due():
+    async def run():
+        s = Scheduler("fifo")
+        retry, fresh = make("https://a.com/1"), make("https://a.com/2")
+        s.put_later(retry, 0.1)
+        s.put(fresh)
+        assert s.qsize() == 2
+        assert await s.get() is fresh
+        start = time.monotonic()
+        assert await asyncio.wait_for(s.get(), 1) is retry
+        assert time.monotonic() - start >= 0.09
+
+        s.put_later(retry, 10)
+        assert s.remove(retry) and s.qsize() == 0
+    asyncio.run(run())
+
+
+def test_open_breaker_parks_its_host_until_cooldown():
+    async def run():
+        breakers = HostBreakers(threshold=1, cooldown=0.1)
+        s = Scheduler("fifo", breakers=breakers)
+        a1, a2, b1 = make("https://a.com/1"), make("https://a.com/2"), make("https://b.com/1")
+        breakers.record_failure("a.com", Failure(ErrorKind.TRANSIENT))
+        for t in (a1, a2, b1):
+            s.put(t)
+        assert await s.get() is b1
+        # Half-open after the cooldown: one probe, and no more until it reports
+        assert await asyncio.wait_for(s.get(), 1) is a1
+        waiter = asyncio.create_task(s.get())
+        await asyncio.sleep(0.02)
+        assert not waiter.done()
+        breakers.record_success("a.com")
+        s.task_done(a1)
+        assert await asyncio.wait_for(waiter, 1) is a2
+    asyncio.run(run())
@@ -0,0 +1,284 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.downloader import DownloadCancelled, DownloadPaused, YTDLPDownloader
+from core.metadata_cache import MetadataCache
+from core.segmented import SegmentedDownloader
+
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support (unless the path says "norange")."""
+
+    protocol_version = "HTTP/1.1"
+    served = 0
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_HEAD(self):
+        self._send(0, len(PAYLOAD), 200, body=False)
+
+    def do_GET(self):
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if m and "norange" not in self.path:
+            start = int(m.group(1))
+            end = int(m.group(2)) + 1 if m.group(2) else len(PAYLOAD)
+            self._send(start, min(end, len(PAYLOAD)), 206)
+        else:
+            self._send(0, len(PAYLOAD), 200)
+
+    def _send(self, start, end, code, body=True):
+        self.send_response(code)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start))
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_header("Accept-Ranges", "none" if "norange" in self.path else "bytes")
+        self.end_headers()
+        if not body:
+            return
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            for i in range(start, end, 64 * 1024):
+                chunk = PAYLOAD[i:min(end, i + 64 * 1024)]
+                self.wfile.write(chunk)
+                with cls.lock:
+                    cls.served += len(chunk)
+                time.sleep(0.002)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RangeHandler.served = RangeHandler.active = RangeHandler.peak = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def _fetch(dl, url, dest, cb=None):
+    async def run():
+        try:
+            await dl.fetch(url, str(dest), cb)
+        finally:
+            await dl.close()
+    asyncio.run(run())
+
+
+def test_segments_are_fetched_in_parallel_into_one_file(server, tmp_path):
+    events = []
+    dest = tmp_path / "clip.mp4"
+    _fetch(SegmentedDownloader(connections=4, min_segment=256 * 1024), f"{server}/clip.mp4", dest, events.append)
+
+    assert dest.read_bytes() == PAYLOAD
+    assert not (tmp_path / "clip.mp4.segpart").exists()
+    assert RangeHandler.peak > 1
+    done = [e["downloaded_bytes"] for e in events]
+    assert done == sorted(done) and done[-1] == len(PAYLOAD)
+    assert events[-1]["status"] == "finished"
+
+
+def test_disk_writes_stay_off_the_event_loop(server, tmp_path, monkeypatch):
+    from core import segmented
+
+    threads = set()
+    write_at = segmented._write_at
+
+    def recording_write_at(fd, data, offset):
+        threads.add(threading.current_thread())
+        write_at(fd, data, offset)
+
+    monkeypatch.setattr(segmented, "_write_at", recording_write_at)
+    dest = tmp_path / "clip.mp4"
+    _fetch(SegmentedDownloader(connections=4, min_segment=256 * 1024), f"{server}/clip.mp4", dest)
+
+    assert dest.read_bytes() == PAYLOAD
+    assert threads and threading.main_thread() not in threads
+
+
+def test_server_without_ranges_uses_one_connection(server, tmp_path):
+    dest = tmp_path / "clip.mp4"
+    _fetch(SegmentedDownloader(connections=4, min_segment=256 * 1024), f"{server}/norange/clip.mp4", dest)
+
+    assert dest.read_bytes() == PAYLOAD
+    assert RangeHandler.peak == 1
+
+
+def test_cancelled_download_resumes_from_finished_segments(server, tmp_path):
+    dest = tmp_path / "clip.mp4"
+
+    def cancel_halfway(d):
+        if d["downloaded_bytes"] > len(PAYLOAD) // 2:
+            raise DownloadCancelled("Cancelled by user")
+
+    dl = SegmentedDownloader(connections=2, min_segment=256 * 1024, max_segment=256 * 1024)
+    with pytest.raises(DownloadCancelled):
+        _fetch(dl, f"{server}/clip.mp4", dest, cancel_halfway)
+    assert (tmp_path / "clip.mp4.segpart").exists()
+    assert (tmp_path / "clip.mp4.segpart.segments").exists()
+
+    RangeHandler.served = 0
+    _fetch(dl, f"{server}/clip.mp4", dest)
+    assert dest.read_bytes() == PAYLOAD
+    assert RangeHandler.served < len(PAYLOAD) * 0.75
+    assert not (tmp_path / "clip.mp4.segpart.segments").exists()
+
+
+def test_ytdlp_fallback_ignores_an_interrupted_segmented_file(server, tmp_path):
+    """yt-dlp continues "<file>.part"; the preallocated segmented file must
+    not look like one, or it is "completed" with holes in it."""
+    def cancel_halfway(d):
+        if d["downloaded_bytes"] > len(PAYLOAD) // 2:
+            raise DownloadCancelled("Cancelled by user")
+
+    dl = SegmentedDownloader(connections=2, min_segment=256 * 1024, max_segment=256 * 1024)
+    with pytest.raises(DownloadCancelled):
+        _fetch(dl, f"{server}/clip.mp4", tmp_path / "clip.mp4", cancel_halfway)
+    assert not (tmp_path / "clip.mp4.part").exists()
+
+    # e.g. connections set back to 1: the same file now goes through yt-dlp
+    asyncio.run(YTDLPDownloader().download(f"{server}/clip.mp4", str(tmp_path), None, {"quiet": True}))
+    assert (tmp_path / "clip.mp4").read_bytes() == PAYLOAD
+
+
+def test_paused_download_continues_from_the_byte_it_stopped_at(server, tmp_path):
+    """Partly fetched segments count too, not only finished ones."""
+    dest = tmp_path / "clip.mp4"
+
+    def pause_at_a_third(d):
+        if d["downloaded_bytes"] > len(PAYLOAD) // 3:
+            raise DownloadPaused("Paused")
+
+    # Two 1 MiB segments in flight, neither finished when the pause hits
+    dl = SegmentedDownloader(connections=2, min_segment=1024 * 1024, max_segment=1024 * 1024)
+    with pytest.raises(DownloadPaused):
+        _fetch(dl, f"{server}/clip.mp4", dest, pause_at_a_third)
+
+    RangeHandler.served = 0
+    _fetch(dl, f"{server}/clip.mp4", dest)
+    assert dest.read_bytes() == PAYLOAD
+    assert RangeHandler.served < len(PAYLOAD) - len(PAYLOAD) // 3 + 2 * 64 * 1024
+
+
+def test_ytdlp_downloader_hands_direct_files_to_segmented_backend(server, tmp_path):
+    cache = MetadataCache(tmp_path / "cache.db")
+    segmented = SegmentedDownloader(connections=4, min_segment=256 * 1024)
+    downloader = YTDLPDownloader(cache=cache, segmented=segmented)
+
+    async def run():
+        try:
+            await downloader.download(f"{server}/clip.mp4", str(tmp_path), None, {"quiet": True})
+        finally:
+            await segmented.close()
+    asyncio.run(run())
+    cache.close()
+
+    assert (tmp_path / "clip.mp4").read_bytes() == PAYLOAD
+    assert RangeHandler.peak > 1
+
+
+def test_subtitles_keep_the_download_with_ytdlp(server, tmp_path, monkeypatch):
+    """Only yt-dlp writes the sidecar files the options ask for."""
+    from core.options import task_options
+
+    cache = MetadataCache(tmp_path / "cache.db")
+    segmented = SegmentedDownloader(connections=4, min_segment=256 * 1024)
+    fetched = []
+    monkeypatch.setattr(segmented, "fetch", lambda *args: fetched.append(args))
+    downloader = YTDLPDownloader(cache=cache, segmented=segmented)
+    opts = dict(task_options(str(tmp_path), subtitles=True)["ytdlp_opts"], quiet=True)
+
+    async def run():
+        try:
+            await downloader.download(f"{server}/clip.mp4", str(tmp_path), None, opts)
+        finally:
+            await segmented.close()
+    asyncio.run(run())
+    cache.close()
+
+    assert fetched == []
+    assert (tmp_path / "clip.mp4").read_bytes() == PAYLOAD
+    assert RangeHandler.peak == 1
+
+
+def test_existing_file_is_reported_as_finished(server, tmp_path):
+    """Nothing to fetch, but the caller still needs the file's name."""
+    (tmp_path / "clip.mp4").write_bytes(PAYLOAD)
+    cache = MetadataCache(tmp_path / "cache.db")
+    segmented = SegmentedDownloader(connections=4)
+    downloader = YTDLPDownloader(cache=cache, segmented=segmented)
+    events = []
+
+    async def run():
+        try:
+            await downloader.download(f"{server}/clip.mp4", str(tmp_path), events.append, {"quiet": True})
+        finally:
+            await segmented.close()
+    asyncio.run(run())
+    cache.close()
+
+    assert RangeHandler.served < len(PAYLOAD)  # only the extractor's look at the file
+    assert events == [{
+        "status": "finished", "filename": str(tmp_path / "clip.mp4"),
+        "downloaded_bytes": len(PAYLOAD), "total_bytes": len(PAYLOAD),
+    }]
+
+
+def test_small_file_resumes_on_one_connection(server, tmp_path):
+    dest = tmp_path / "clip.mp4"
+
+    def pause_at_a_third(d):
+        if d["downloaded_bytes"] > len(PAYLOAD) // 3:
+            raise DownloadPaused("Paused")
+
+    # Too small to split: one connection, still fetched as ranges
+    dl = SegmentedDownloader(connections=4, min_segment=4 * 1024 * 1024)
+    with pytest.raises(DownloadPaused):
+        _fetch(dl, f"{server}/clip.mp4", dest, pause_at_a_third)
+
+    RangeHandler.served = 0
+    events = []
+    _fetch(dl, f"{server}/clip.mp4", dest, events.append)
+    assert dest.read_bytes() == PAYLOAD
+    assert events[0]["downloaded_bytes"] > len(PAYLOAD) // 3
+    assert RangeHandler.served < len(PAYLOAD) - len(PAYLOAD) // 3 + 2 * 64 * 1024
+
+
+def test_throttle_paces_all_connections(server, tmp_path):
+    from core.ratelimit import BandwidthLimiter
+
+    limiter = BandwidthLimiter(global_rate=2 * 1024 * 1024)
+    dest = tmp_path / "clip.mp4"
+    dl = SegmentedDownloader(connections=4, min_segment=256 * 1024)
+
+    async def run():
+        try:
+            await dl.fetch(f"{server}/clip.mp4", str(dest), None, None, limiter.throttle_for("t", "127.0.0.1"))
+        finally:
+            await dl.close()
+    start = time.monotonic()
+    asyncio.run(run())
+
+    assert dest.read_bytes() == PAYLOAD
+    assert time.monotonic() - start >= 1.0  # 3 MiB at 2 MiB/s, less a 0.5 MiB burst
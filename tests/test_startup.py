@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+from utils.startup import StartupTimer
+
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+# Modules that must stay out of the GUI's startup path
+HEAVY = ("yt_dlp", "aiohttp", "ffmpeg")
+
+# Generous ceiling for importing the GUI (PyQt6 included); a regression that
+# pulls yt-dlp back in costs several times this on a cold start
+IMPORT_BUDGET = 1.5
+
+
+def _import_in_fresh_interpreter(module):
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "t = time.perf_counter() - t\n"
+        "print(json.dumps({'seconds': t, 'modules': sorted(sys.modules)}))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=SRC, check=True, env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+    return json.loads(out.stdout)
+
+
+def test_gui_import_defers_heavy_dependencies():
+    result = _import_in_fresh_interpreter("gui.main_window")
+    loaded = {m.split(".")[0] for m in result["modules"]}
+    assert not loaded & set(HEAVY)
+    assert result["seconds"] < IMPORT_BUDGET
+
+
+def test_engine_loads_them_on_first_use():
+    result = _import_in_fresh_interpreter("core.engine")
+    assert not {m.split(".")[0] for m in result["modules"]} & set(HEAVY)
+
+    from core import canonical
+    canonical.warm()
+    assert "yt_dlp.extractor" in sys.modules
+
+
+def test_startup_report_lists_phases_in_order():
+    timer = StartupTimer()
+    timer.mark("imports")
+    timer.mark("shown")
+    lines = timer.report().splitlines()
+    assert lines[0] == "Startup timing:"
+    assert [l.split()[0] for l in lines[1:]] == ["imports", "shown"]
@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+from PyQt6.QtCore import Qt
+
+from core.engine import DownloadEngine
+from core.thumbnails import ThumbnailStore, best_thumbnail
+from gui.download_model import DownloadListModel
+from gui.thumbnail_loader import ThumbnailLoader
+from utils import database
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def images(tmp_path):
+    root = tmp_path / "img"
+    root.mkdir()
+    # Noise, so the JPEG is as large as a real full-size thumbnail
+    Image.frombytes("RGB", (1280, 720), os.urandom(1280 * 720 * 3)).save(root / "big.jpg", quality=95)
+    Image.new("RGBA", (300, 300), (0, 128, 255, 100)).save(root / "square.png")
+    (root / "broken.jpg").write_bytes(b"not an image")
+    for i in range(20):
+        Image.frombytes("RGB", (160, 90), os.urandom(160 * 90 * 3)).save(root / f"{i}.jpg")
+    CountingHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(CountingHandler, directory=str(root)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_best_thumbnail_prefers_the_smallest_that_covers_the_preview():
+    info = {
+        "thumbnail": "https://i.ytimg.com/vi/x/maxresdefault.jpg",
+        "thumbnails": [
+            {"url": "https://i.ytimg.com/vi/x/default.jpg", "width": 120},
+            {"url": "https://i.ytimg.com/vi/x/mqdefault.jpg", "width": 320},
+            {"url": "https://i.ytimg.com/vi/x/hqdefault.jpg", "width": 480},
+            {"url": "https://i.ytimg.com/vi/x/maxresdefault.jpg"},
+        ],
+    }
+    assert best_thumbnail(info) == "https://i.ytimg.com/vi/x/mqdefault.jpg"
+    assert best_thumbnail({"thumbnail": "https://a/t.jpg"}) == "https://a/t.jpg"
+    assert best_thumbnail({"thumbnails": [{"url": "https://a/1.jpg"}, {"url": "https://a/2.jpg"}]}) == "https://a/2.jpg"
+    assert best_thumbnail({"thumbnail": "data:image/png;base64,xx"}) is None
+
+
+def test_store_downscales_and_serves_hits_from_disk(images, tmp_path):
+    store = ThumbnailStore(tmp_path / "thumbs")
+    path = store.get(f"{images}/big.jpg")
+    with Image.open(path) as img:
+        assert img.format == "JPEG" and img.size == (128, 72)
+    assert os.path.getsize(path) < 10_000
+    with Image.open(store.get(f"{images}/square.png")) as img:
+        assert img.size == (72, 72) and img.mode == "RGB"
+    assert store.get(f"{images}/broken.jpg") is None
+    assert store.get(f"{images}/missing.jpg") is None
+
+    assert store.get(f"{images}/big.jpg") == path
+    assert CountingHandler.requests.count("/big.jpg") == 1
+    assert store.stats()["hits"] == 1
+
+    # A new store (next run) finds what is on disk
+    assert ThumbnailStore(tmp_path / "thumbs").cached(f"{images}/big.jpg") == path
+
+
+def test_store_stays_within_its_budget_evicting_least_recently_used(images, tmp_path):
+    store = ThumbnailStore(tmp_path / "thumbs", max_bytes=10 ** 9)
+    sizes = [os.path.getsize(store.get(f"{images}/{i}.jpg")) for i in range(20)]
+    store.set_max_bytes(sum(sizes[-5:]) + 1)
+    assert store.stats()["files"] <= 5
+    time.sleep(0.01)
+    store.get(f"{images}/15.jpg")  # used again: now the most recent
+
+    store.get(f"{images}/big.jpg")
+    stats = store.stats()
+    assert stats["bytes"] <= store.max_bytes
+    assert stats["bytes"] == sum(p.stat().st_size for p in (tmp_path / "thumbs").glob("*.jpg"))
+    assert store.cached(f"{images}/15.jpg") is not None
+    assert store.cached(f"{images}/16.jpg") is None
+
+    # Recency order survives a restart
+    reopened = ThumbnailStore(tmp_path / "thumbs", max_bytes=store.max_bytes)
+    reopened.set_max_bytes(os.path.getsize(store.cached(f"{images}/15.jpg")) + os.path.getsize(store.cached(f"{images}/big.jpg")))
+    assert reopened.cached(f"{images}/15.jpg") is not None
+    assert reopened.cached(f"{images}/19.jpg") is None
+
+
+def test_model_loads_previews_only_when_asked(images, tmp_path, app):
+    loader = ThumbnailLoader(ThumbnailStore(tmp_path / "thumbs"))
+    model = DownloadListModel(thumbnails=loader)
+    for i in range(20):
+        model.add_task(f"t{i}", f"https://example.com/{i}")
+        model.set_info(f"t{i}", f"Video {i}", f"{images}/{i}.jpg")
+    changed = []
+    model.dataChanged.connect(lambda tl, br, roles: changed.append(tl.row()))
+
+    assert model.data(model.index(3), Qt.ItemDataRole.DisplayRole) == "Video 3"
+    assert model.data(model.index(3), Qt.ItemDataRole.DecorationRole) is None  # queued
+    deadline = time.monotonic() + 5
+    while not changed and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+    assert changed == [3]
+    image = model.data(model.index(3), Qt.ItemDataRole.DecorationRole)
+    assert image.deviceIndependentSize().toSize().width() == 64
+    assert CountingHandler.requests == ["/3.jpg"]
+
+
+class InfoDownloader:
+    def __init__(self, *args, on_info=None, **kwargs):
+        self.on_info = on_info
+
+    async def resolve(self, url):
+        return None
+
+    async def download(self, url, out_dir=None, progress_callback=None, ytdlp_opts=None, **kwargs):
+        for _ in range(2):  # e.g. planned, then downloaded by yt-dlp
+            await asyncio.to_thread(self.on_info, {
+                "title": "A Video",
+                "thumbnails": [{"url": "https://i.example/t.jpg", "width": 320}],
+            })
+
+
+def test_engine_reports_title_and_thumbnail_once(tmp_path):
+    infos, threads = [], set()
+
+    def on_info(*args):
+        infos.append(args)
+        threads.add(threading.current_thread())
+
+    async def main():
+        engine = DownloadEngine(concurrency=1)
+        engine.on("task_info", on_info)
+        done = asyncio.Event()
+        engine.on("task_completed", lambda *a: done.set())
+        task_id = engine.add_task("http://test.url/video")
+        runner = asyncio.create_task(engine.run())
+        await asyncio.wait_for(done.wait(), 5)
+        engine.stop()
+        await runner
+        return task_id
+
+    with patch("core.engine.YTDLPDownloader", InfoDownloader):
+        task_id = asyncio.run(main())
+    assert infos == [(task_id, {"title": "A Video", "thumbnail": "https://i.example/t.jpg"})]
+    assert threads == {threading.main_thread()}  # the loop's, not extraction's
+    row = database.get_history()[0]
+    assert (row["title"], row["thumbnail_url"]) == ("A Video", "https://i.example/t.jpg")
+
+
+def test_failed_previews_are_remembered_within_bounds(tmp_path, app, monkeypatch):
+    from PyQt6.QtGui import QImage
+
+    loader = ThumbnailLoader(ThumbnailStore(tmp_path / "thumbs"))
+    monkeypatch.setattr(loader, "_start_next", lambda: None)
+    monkeypatch.setattr(ThumbnailLoader, "FAILED_ENTRIES", 10)
+    for i in range(50):
+        loader._on_loaded(f"https://i.example/{i}.jpg", QImage())
+    assert list(loader._failed) == [f"https://i.example/{i}.jpg" for i in range(40, 50)]
+
+    assert loader.image("https://i.example/49.jpg") is None
+    assert "https://i.example/49.jpg" not in loader._waiting  # not retried yet
+    monkeypatch.setattr(ThumbnailLoader, "RETRY_FAILED", 0.0)
+    loader.image("https://i.example/49.jpg")
+    assert "https://i.example/49.jpg" in loader._waiting
+    assert "https://i.example/49.jpg" not in loader._failed
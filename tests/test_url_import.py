@@ -0,0 +1,48 @@
+import io
+import json
+
+import pytest
+
+from core.url_import import clean_url, read_urls
+
+
+def test_clean_url():
+    assert clean_url("  https://example.com/watch?v=1 ") == "https://example.com/watch?v=1"
+    assert clean_url("youtu.be/abc") == "https://youtu.be/abc"
+    assert clean_url("ytsearch5:some song") is None  # whitespace inside
+    assert clean_url("ytsearch:song") == "ytsearch:song"
+    for bad in ("", "   ", "hello", "http://", "https:///path", "two words.com"):
+        assert clean_url(bad) is None
+
+
+def test_read_text_csv_and_jsonl(tmp_path):
+    txt = tmp_path / "list.txt"
+    txt.write_text("﻿# saved links\nhttp://a/1\n\n  http://a/2  \n", encoding="utf-8")
+    assert list(read_urls(str(txt))) == ["http://a/1", "http://a/2"]
+
+    csv_file = tmp_path / "export.csv"
+    csv_file.write_text('title,URL\n"Hello, world",http://a/1\nno link,\n', encoding="utf-8")
+    assert list(read_urls(str(csv_file))) == ["http://a/1"]
+    headerless = tmp_path / "plain.csv"
+    headerless.write_text("http://a/1,first\nhttp://a/2,second\n", encoding="utf-8")
+    assert list(read_urls(str(headerless))) == ["http://a/1", "http://a/2"]
+
+    jsonl = tmp_path / "items.jsonl"
+    jsonl.write_text("\n".join([
+        json.dumps({"webpage_url": "http://a/1", "title": "x"}),
+        json.dumps("http://a/2"),
+        "{broken",
+        json.dumps({"id": 3}),
+    ]), encoding="utf-8")
+    assert list(read_urls(str(jsonl))) == ["http://a/1", "http://a/2"]
+    # The extension is only a default
+    assert list(read_urls(str(jsonl), "txt"))[1] == '"http://a/2"'
+
+
+def test_read_urls_is_lazy_and_reads_stdin(monkeypatch, tmp_path):
+    monkeypatch.setattr("sys.stdin", io.StringIO("http://a/1\nhttp://a/2\n"))
+    entries = read_urls("-")
+    assert next(entries) == "http://a/1"
+    assert list(entries) == ["http://a/2"]
+    with pytest.raises(ValueError):
+        list(read_urls(str(tmp_path / "x.txt"), "xml"))
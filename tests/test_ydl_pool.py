@@ -0,0 +1,75 @@
+import pytest
+
+from core.ydl_pool import YDLPool, fingerprint
+
+
+class DummyYDL:
+    instances = []
+
+    def __init__(self, opts=None):
+        self.params = opts
+        self.closed = False
+        self._num_downloads = 0
+        DummyYDL.instances.append(self)
+
+    def download(self, urls):
+        self._num_downloads += 1
+        for hook in self.params["progress_hooks"]:
+            hook({"status": "downloading", "url": urls[0]})
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def dummy_ydl(monkeypatch):
+    DummyYDL.instances = []
+    monkeypatch.setattr("yt_dlp.YoutubeDL", DummyYDL)
+
+
+def test_same_options_reuse_instance_and_route_hooks():
+    pool = YDLPool()
+    seen_a, seen_b = [], []
+
+    with pool.lease({"outtmpl": "x"}, seen_a.append) as ydl:
+        ydl.download(["a"])
+    with pool.lease({"outtmpl": "x"}, seen_b.append) as ydl2:
+        assert ydl2._num_downloads == 0  # reset between leases
+        ydl2.download(["b"])
+
+    assert ydl is ydl2
+    assert [d["url"] for d in seen_a] == ["a"]
+    assert [d["url"] for d in seen_b] == ["b"]
+    assert (pool.created, pool.reused) == (1, 1)
+
+
+def test_different_options_and_failures_get_fresh_instances():
+    pool = YDLPool()
+    with pool.lease({"format": "best"}) as a:
+        pass
+    with pool.lease({"format": "bestaudio"}) as b:
+        pass
+    assert a is not b
+
+    with pytest.raises(RuntimeError):
+        with pool.lease({"format": "best"}) as c:
+            raise RuntimeError("boom")
+    assert c is a and c.closed
+    with pool.lease({"format": "best"}) as d:
+        pass
+    assert d is not a
+
+
+def test_fingerprint_ignores_hooks_and_key_order():
+    assert fingerprint({"a": 1, "b": 2, "progress_hooks": [print]}) == fingerprint({"b": 2, "a": 1})
+
+
+def test_close_releases_idle_instances():
+    pool = YDLPool(max_idle_per_key=1)
+    with pool.lease({}) as a:
+        with pool.lease({}) as b:
+            pass
+    # Only one idle slot per key: the second returned instance is closed
+    assert sum(i.closed for i in DummyYDL.instances) == 1
+    pool.close()
+    assert a.closed and b.closed and pool.idle_count() == 0